@@ -1,20 +1,51 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request
 from app import db
-from models import Person, Expense, ExpenseSplit, SplitMethod
-from settlement_calculator import SettlementCalculator
+from models import Group, Person, Expense, Payment
+from settlement_calculator import SETTLEMENT_MODES, SettlementCalculator
+from settlement_cache import SettlementCache
+from expense_listing import fetch_expense_dicts, parse_listing_args
+from bulk_import import MAX_BULK_ROWS, insert_expenses, read_bulk_rows
+from expense_service import ExpenseService
+from payment_service import PaymentService
+from balance_ledger import BalanceLedger
+from ledger_events import LedgerEvents
+from serializers import dumps, person_dicts
+from sqlalchemy import select
 from decimal import Decimal, InvalidOperation
 import logging
 
 api = Blueprint('api', __name__)
 
-def create_response(success=True, data=None, message="", status_code=200):
-    """Create standardized API response"""
+def create_response(success=True, data=None, message="", status_code=200, meta=None, etag=None, headers=None):
+    """Create standardized API response, optionally carrying a strong ETag"""
     response = {
         'success': success,
         'data': data,
         'message': message
     }
-    return jsonify(response), status_code
+    if meta is not None:
+        response['meta'] = meta
+    response = Response(dumps(response), mimetype='application/json')
+    if etag is not None:
+        response.set_etag(etag)
+        # Clients may keep the body but must revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+    if headers:
+        response.headers.update(headers)
+    return response, status_code
+
+def ledger_etag(version):
+    """ETag for a response derived from expenses; every expense write changes the ledger version"""
+    return f"ledger-{version}"
+
+def not_modified(etag):
+    """Return a 304 response when the request's If-None-Match already holds etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 def validate_expense_data(data):
     """Validate expense data"""
@@ -112,9 +143,57 @@ def validate_splits(splits, split_method, total_amount):
     
     return errors
 
+def validate_payment_data(data):
+    """Validate a payment from one person to another"""
+    errors = []
+    
+    try:
+        amount = Decimal(str(data.get('amount')))
+        if not amount.is_finite() or amount < Decimal('0.01'):
+            errors.append("Amount must be at least 0.01")
+    except (InvalidOperation, ValueError):
+        errors.append("Amount must be a valid number")
+    
+    names = []
+    for field in ('from', 'to'):
+        name = data.get(field)
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"{field} is required and cannot be empty")
+        else:
+            names.append(name.strip())
+    if len(names) == 2 and names[0] == names[1]:
+        errors.append("from and to must be different people")
+    
+    return errors
+
+def validate_bulk_expense_data(data):
+    """Validate one row of a bulk import, which must carry everything its splits need"""
+    if not isinstance(data, dict):
+        return ["Each expense must be an object"]
+    
+    try:
+        errors = validate_expense_data(data)
+    except (AttributeError, TypeError):
+        return ["amount must be a number; description and paid_by must be strings"]
+    
+    split_method = data.get('split_method', 'equal')
+    if split_method in ['exact', 'percentage'] and 'splits' not in data:
+        errors.append(f"splits array is required for {split_method} split method")
+    
+    participants = data.get('participants')
+    if split_method == 'equal' and participants is not None:
+        if not isinstance(participants, list) or not all(isinstance(name, str) and name.strip() for name in participants):
+            errors.append("participants must be an array of non-empty names")
+    
+    return errors
+
 @api.route('/expenses', methods=['POST'])
 def create_expense():
     """Create a new expense"""
+    return _create_expense()
+
+def _create_expense(group_id=None):
+    """Create an expense from the request body, optionally inside a group"""
     try:
         data = request.get_json()
         if not data:
@@ -125,39 +204,7 @@ def create_expense():
         if errors:
             return create_response(False, None, "; ".join(errors), 400)
         
-        # Get or create the person who paid
-        paid_by_name = data['paid_by'].strip()
-        person = Person.query.filter_by(name=paid_by_name).first()
-        if not person:
-            person = Person(name=paid_by_name)
-            db.session.add(person)
-            db.session.flush()  # Get the ID
-        
-        # Determine split method
-        split_method_str = data.get('split_method', 'equal')
-        split_method = SplitMethod(split_method_str)
-        
-        # Create the expense
-        expense = Expense(
-            amount=Decimal(str(data['amount'])),
-            description=data['description'].strip(),
-            paid_by_id=person.id,
-            split_method=split_method
-        )
-        db.session.add(expense)
-        db.session.flush()  # Get the expense ID
-        
-        # Create splits based on method
-        if split_method_str == 'equal':
-            # Get all people for equal split (or use participants if provided)
-            participants = data.get('participants', [paid_by_name])
-            if paid_by_name not in participants:
-                participants.append(paid_by_name)
-            SettlementCalculator.create_equal_splits(expense.id, participants)
-        elif split_method_str in ['exact', 'percentage']:
-            # Create custom splits
-            SettlementCalculator.create_custom_splits(expense.id, data['splits'], split_method_str)
-        
+        expense = ExpenseService.create_expense(data, group_id)
         db.session.commit()
         
         return create_response(True, expense.to_dict(), "Expense created successfully", 201)
@@ -167,14 +214,83 @@ def create_expense():
         logging.error(f"Error creating expense: {str(e)}")
         return create_response(False, None, f"Internal server error: {str(e)}", 500)
 
+@api.route('/expenses/bulk', methods=['POST'])
+def bulk_create_expenses():
+    """
+    Create many expenses from a JSON array, NDJSON or CSV body. Answers 201 when
+    every row was created, 207 Multi-Status with success false when only some
+    were, and 400 when none were; the per-row report is in data either way.
+    """
+    return _bulk_create_expenses()
+
+def _bulk_create_expenses(group_id=None):
+    """Validate every row, insert the valid ones in one transaction and report per row"""
+    try:
+        try:
+            rows = read_bulk_rows(request)
+        except ValueError as e:
+            return create_response(False, None, str(e), 400)
+        
+        if len(rows) > MAX_BULK_ROWS:
+            return create_response(False, None, f"A bulk import is limited to {MAX_BULK_ROWS} expenses", 413)
+        
+        results = []
+        valid_rows = []
+        for row_number, (data, parse_error) in enumerate(rows, start=1):
+            errors = [parse_error] if parse_error else validate_bulk_expense_data(data)
+            if errors:
+                results.append({'row': row_number, 'success': False, 'errors': errors})
+            else:
+                valid_rows.append((row_number, data))
+        
+        expense_ids = insert_expenses([data for _, data in valid_rows], group_id)
+        db.session.commit()
+        
+        for (row_number, _), expense_id in zip(valid_rows, expense_ids):
+            results.append({'row': row_number, 'success': True, 'id': expense_id})
+        results.sort(key=lambda result: result['row'])
+        
+        created, failed = len(expense_ids), len(rows) - len(expense_ids)
+        report = {'created': created, 'failed': failed, 'results': results}
+        message = f"Created {created} expenses, {failed} rows failed validation"
+        if not created:
+            status_code = 400
+        elif failed:
+            status_code = 207
+        else:
+            status_code = 201
+        return create_response(failed == 0, report, message, status_code)
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error importing expenses: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
 @api.route('/expenses', methods=['GET'])
 def get_expenses():
     """Get all expenses"""
+    return _get_expenses()
+
+def _get_expenses(group_id=None):
+    """List one page of expenses, newest first, optionally limited to one group"""
     try:
-        expenses = Expense.query.order_by(Expense.created_at.desc()).all()
-        expenses_data = [expense.to_dict() for expense in expenses]
+        try:
+            options = parse_listing_args(request.args)
+        except ValueError as e:
+            return create_response(False, None, str(e), 400)
         
-        return create_response(True, expenses_data, "Expenses retrieved successfully")
+        etag = ledger_etag(BalanceLedger.version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        expenses_data, next_cursor = fetch_expense_dicts(group_id=group_id, **options)
+        meta = {
+            'limit': options['limit'],
+            'next_cursor': next_cursor
+        }
+        
+        return create_response(True, expenses_data, "Expenses retrieved successfully", meta=meta, etag=etag)
         
     except Exception as e:
         logging.error(f"Error retrieving expenses: {str(e)}")
@@ -205,37 +321,7 @@ def update_expense(expense_id):
             if errors:
                 return create_response(False, None, "; ".join(errors), 400)
         
-        # Update fields if provided
-        if 'amount' in data:
-            expense.amount = Decimal(str(data['amount']))
-        
-        if 'description' in data:
-            expense.description = data['description'].strip()
-        
-        if 'split_method' in data:
-            expense.split_method = SplitMethod(data['split_method'])
-        
-        if 'paid_by' in data:
-            paid_by_name = data['paid_by'].strip()
-            person = Person.query.filter_by(name=paid_by_name).first()
-            if not person:
-                person = Person(name=paid_by_name)
-                db.session.add(person)
-                db.session.flush()
-            expense.paid_by_id = person.id
-        
-        # If amount changed or split method/participants changed, recreate splits
-        if 'amount' in data or 'participants' in data or 'split_method' in data or 'splits' in data:
-            split_method_str = data.get('split_method', expense.split_method.value)
-            
-            if split_method_str == 'equal':
-                participants = data.get('participants', [expense.payer.name])
-                if expense.payer.name not in participants:
-                    participants.append(expense.payer.name)
-                SettlementCalculator.create_equal_splits(expense.id, participants)
-            elif split_method_str in ['exact', 'percentage'] and 'splits' in data:
-                SettlementCalculator.create_custom_splits(expense.id, data['splits'], split_method_str)
-        
+        ExpenseService.update_expense(expense, data)
         db.session.commit()
         
         return create_response(True, expense.to_dict(), "Expense updated successfully")
@@ -253,7 +339,7 @@ def delete_expense(expense_id):
         if not expense:
             return create_response(False, None, "Expense not found", 404)
         
-        db.session.delete(expense)
+        ExpenseService.delete_expense(expense)
         db.session.commit()
         
         return create_response(True, None, "Expense deleted successfully")
@@ -267,10 +353,16 @@ def delete_expense(expense_id):
 def get_people():
     """Get all people"""
     try:
-        people = Person.query.order_by(Person.name).all()
-        people_data = [person.to_dict() for person in people]
+        # People are only ever created by expense writes
+        etag = ledger_etag(BalanceLedger.version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        return create_response(True, people_data, "People retrieved successfully")
+        people = db.session.execute(select(Person.id, Person.name, Person.created_at).order_by(Person.name))
+        people_data = person_dicts(people)
+        
+        return create_response(True, people_data, "People retrieved successfully", etag=etag)
         
     except Exception as e:
         logging.error(f"Error retrieving people: {str(e)}")
@@ -279,28 +371,274 @@ def get_people():
 @api.route('/balances', methods=['GET'])
 def get_balances():
     """Get current balances for all people"""
+    return _get_balances()
+
+def _get_balances(group_id=None):
+    """Calculate balances, optionally limited to one group or as of a past moment (?as_of=)"""
     try:
-        balances = SettlementCalculator.calculate_balances()
+        as_of = request.args.get('as_of')
+        if as_of is not None and group_id is not None:
+            return create_response(False, None, "as_of is only supported for balances across all groups", 400)
+        if as_of is not None:
+            try:
+                as_of = LedgerEvents.parse_as_of(as_of)
+            except ValueError as e:
+                return create_response(False, None, str(e), 400)
+        
+        version = BalanceLedger.version()
+        etag = ledger_etag(version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        if as_of is not None:
+            return _balances_as_of(as_of, etag)
+        
+        balances = SettlementCache.balances(group_id, version)
         balances_list = list(balances.values())
         
-        return create_response(True, balances_list, "Balances calculated successfully")
+        return create_response(True, balances_list, "Balances calculated successfully", etag=etag)
         
     except Exception as e:
         logging.error(f"Error calculating balances: {str(e)}")
         return create_response(False, None, f"Internal server error: {str(e)}", 500)
 
+def _balances_as_of(as_of, etag):
+    """Balances at a past moment: the nearest earlier checkpoint plus the events logged after it"""
+    checkpoint, rows = LedgerEvents.balance_rows_as_of(as_of)
+    if checkpoint is None:
+        start = db.session.execute(LedgerEvents.history_start_query()).scalar()
+        return create_response(False, None, f"Balance history starts at {start.isoformat()}", 400)
+    
+    aggregates = SettlementCalculator.aggregates_from_rows(rows)
+    balances_list = list(SettlementCalculator.calculate_balances(aggregates=aggregates).values())
+    meta = {
+        'as_of': as_of.isoformat(),
+        'checkpoint_at': checkpoint.taken_at.isoformat()
+    }
+    
+    return create_response(True, balances_list, "Balances calculated successfully", meta=meta, etag=etag)
+
 @api.route('/settlements', methods=['GET'])
 def get_settlements():
     """Get optimal settlements to balance all debts"""
+    return _get_settlements()
+
+def _get_settlements(group_id=None):
+    """Calculate settlements with the requested mode, optionally limited to one group"""
     try:
-        settlements = SettlementCalculator.calculate_settlements()
+        mode = request.args.get('mode', 'greedy')
+        if mode not in SETTLEMENT_MODES:
+            return create_response(False, None, f"mode must be one of: {', '.join(SETTLEMENT_MODES)}", 400)
+        
+        version = BalanceLedger.version()
+        etag = ledger_etag(version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        return create_response(True, settlements, "Settlements calculated successfully")
+        result = SettlementCache.settlements(mode, group_id, version)
+        meta = {
+            'mode': result['mode'],
+            'solver': result['solver'],
+            'fallback': result['fallback'],
+            'components': result['components']
+        }
+        # Reported as headers: a strong ETag promises the same body on a hit and a miss,
+        # and from every worker, while the solve time differs between processes
+        headers = {'X-Cache': 'HIT' if result['cached'] else 'MISS',
+                   'X-Solve-Time-Ms': str(result['elapsed_ms'])}
+        
+        return create_response(True, result['settlements'], "Settlements calculated successfully",
+                               meta=meta, etag=etag, headers=headers)
         
     except Exception as e:
         logging.error(f"Error calculating settlements: {str(e)}")
         return create_response(False, None, f"Internal server error: {str(e)}", 500)
 
+@api.route('/debts', methods=['GET'])
+def get_debts():
+    """Get who owes whom before settlement, netted per pair of people"""
+    return _get_debts()
+
+def _get_debts(group_id=None):
+    """List pairwise debts, optionally limited to one group"""
+    try:
+        version = BalanceLedger.version()
+        etag = ledger_etag(version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        debts = SettlementCache.debts(group_id, version)
+        
+        return create_response(True, debts, "Debts calculated successfully", etag=etag)
+        
+    except Exception as e:
+        logging.error(f"Error calculating debts: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/payments', methods=['POST'])
+def create_payment():
+    """Record that one person paid another, e.g. a suggested settlement"""
+    return _create_payment()
+
+def _create_payment(group_id=None):
+    """Create a payment from the request body, optionally inside a group"""
+    try:
+        data = request.get_json()
+        if not data:
+            return create_response(False, None, "Request body is required", 400)
+        
+        errors = validate_payment_data(data)
+        if errors:
+            return create_response(False, None, "; ".join(errors), 400)
+        
+        try:
+            payment = PaymentService.create_payment(data, group_id)
+        except ValueError as e:
+            db.session.rollback()
+            return create_response(False, None, str(e), 400)
+        db.session.commit()
+        
+        return create_response(True, payment.to_dict(), "Payment recorded successfully", 201)
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error recording payment: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/payments', methods=['GET'])
+def get_payments():
+    """Get all recorded payments"""
+    return _get_payments()
+
+def _get_payments(group_id=None):
+    """List payments that have not been compacted, newest first, optionally limited to one group"""
+    try:
+        etag = ledger_etag(BalanceLedger.version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        payments_data = PaymentService.payment_dicts(group_id)
+        
+        return create_response(True, payments_data, "Payments retrieved successfully", etag=etag)
+        
+    except Exception as e:
+        logging.error(f"Error retrieving payments: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/payments/<int:payment_id>', methods=['DELETE'])
+def delete_payment(payment_id):
+    """Delete a payment recorded by mistake"""
+    try:
+        payment = db.session.get(Payment, payment_id)
+        if not payment:
+            return create_response(False, None, "Payment not found", 404)
+        
+        PaymentService.delete_payment(payment)
+        db.session.commit()
+        
+        return create_response(True, None, "Payment deleted successfully")
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error deleting payment: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/groups', methods=['POST'])
+def create_group():
+    """Create a new group"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('name'), str) or not data['name'].strip():
+            return create_response(False, None, "name is required and cannot be empty", 400)
+        
+        name = data['name'].strip()
+        if Group.query.filter_by(name=name).first():
+            return create_response(False, None, f"Group '{name}' already exists", 409)
+        
+        group = Group(name=name)
+        db.session.add(group)
+        db.session.commit()
+        
+        return create_response(True, group.to_dict(), "Group created successfully", 201)
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error creating group: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/groups', methods=['GET'])
+def get_groups():
+    """Get all groups"""
+    try:
+        groups = Group.query.order_by(Group.name).all()
+        groups_data = [group.to_dict() for group in groups]
+        
+        return create_response(True, groups_data, "Groups retrieved successfully")
+        
+    except Exception as e:
+        logging.error(f"Error retrieving groups: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+@api.route('/groups/<int:group_id>/expenses', methods=['POST'])
+def create_group_expense(group_id):
+    """Create a new expense in a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _create_expense(group_id)
+
+@api.route('/groups/<int:group_id>/expenses/bulk', methods=['POST'])
+def bulk_create_group_expenses(group_id):
+    """Create many expenses in a group, answering like bulk_create_expenses"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _bulk_create_expenses(group_id)
+
+@api.route('/groups/<int:group_id>/expenses', methods=['GET'])
+def get_group_expenses(group_id):
+    """Get all expenses in a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _get_expenses(group_id)
+
+@api.route('/groups/<int:group_id>/balances', methods=['GET'])
+def get_group_balances(group_id):
+    """Get balances for the members of a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _get_balances(group_id)
+
+@api.route('/groups/<int:group_id>/settlements', methods=['GET'])
+def get_group_settlements(group_id):
+    """Get settlements that balance the debts within a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _get_settlements(group_id)
+
+@api.route('/groups/<int:group_id>/debts', methods=['GET'])
+def get_group_debts(group_id):
+    """Get pairwise debts within a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _get_debts(group_id)
+
+@api.route('/groups/<int:group_id>/payments', methods=['POST'])
+def create_group_payment(group_id):
+    """Record a payment within a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _create_payment(group_id)
+
+@api.route('/groups/<int:group_id>/payments', methods=['GET'])
+def get_group_payments(group_id):
+    """Get the payments recorded in a group"""
+    if not db.session.get(Group, group_id):
+        return create_response(False, None, "Group not found", 404)
+    return _get_payments(group_id)
+
 # Health check endpoint
 @api.route('/health', methods=['GET'])
 def health_check():
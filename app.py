@@ -4,6 +4,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+import db_instrumentation
+import metrics
+from db_config import engine_options, install_idle_ping
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -20,26 +23,49 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Pool size, pre-ping strategy and statement timeout come from the environment (see db_config.py)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(os.environ.get("DATABASE_URL"))
 
 # Initialize the app with the extension
 db.init_app(app)
 
+# Query count, DB time and pool wait per request in the Server-Timing header
+db_instrumentation.init_app(app)
+
+# Request latency histograms and settlement phase timings, served at /metrics
+metrics.init_app(app)
+
 # Import routes
 from api_routes import api
 from web_routes import web
+from export_routes import export
+from stream_routes import stream
+from metrics_routes import metrics as metrics_blueprint
 
 # Register blueprints
 app.register_blueprint(api, url_prefix='/api')
 app.register_blueprint(web)
+app.register_blueprint(export, url_prefix='/api/export')
+app.register_blueprint(stream, url_prefix='/api/stream')
+app.register_blueprint(metrics_blueprint)
 
 with app.app_context():
+    install_idle_ping(db.engine)
+
     # Make sure to import the models here or their tables won't be created
     import models  # noqa: F401
-    db.create_all()
+    import migrations
+    from balance_ledger import BalanceLedger
+
+    # Every worker runs this on boot; the lock lets only one at a time touch the schema
+    with migrations.schema_lock():
+        db.create_all()
+
+        # Bring tables created by earlier releases up to date
+        migrations.upgrade()
+
+        # Populate the balance ledger for databases created before it existed
+        BalanceLedger.ensure_initialized()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,313 @@
+"""
+ASGI serving mode for Split App
+Serves the read endpoints of the api blueprint natively on an async SQLAlchemy
+engine (asyncpg for PostgreSQL, aiosqlite for SQLite), so a request waiting on
+the database no longer holds a worker. Every other route (writes, the web UI,
+exports and the balance stream) is handed to the Flask app in a thread pool,
+so one server process runs the whole app:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+
+Needs the optional packages starlette, uvicorn, a2wsgi and asyncpg or aiosqlite.
+Models, queries, SettlementCalculator and SettlementCache are shared with the
+sync app, so both modes return the same bodies and ETags for the same URL.
+"""
+
+import contextlib
+import logging
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from app import app as flask_app
+from balance_ledger import BalanceLedger
+from db_config import engine_options, install_idle_ping
+from db_instrumentation import ServerTimingMiddleware
+from metrics import MetricsMiddleware, observe_phase
+from ledger_events import LedgerEvents
+from expense_listing import expense_page_query, expense_row_query, parse_listing_args, split_page, split_row_query
+from models import Group, LedgerVersion, Person
+from settlement_cache import SettlementCache
+from serializers import dumps, expense_dicts, person_dicts, split_dicts
+from settlement_calculator import SETTLEMENT_MODES, SettlementCalculator
+
+# Async drivers substituted for the sync ones in DATABASE_URL
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# Threads serving the Flask routes; open balance streams each hold one
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+
+
+def async_database_url(url: str):
+    """Return DATABASE_URL with its driver swapped for the async equivalent"""
+    url = make_url(url)
+    backend = url.drivername.split('+')[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+ASYNC_DATABASE_URL = async_database_url(os.environ.get("DATABASE_URL"))
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+install_idle_ping(engine.sync_engine)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def create_response(success=True, data=None, message="", status_code=200, meta=None, etag=None, headers=None):
+    """Create the same standardized API response as api_routes.create_response"""
+    body = {
+        'success': success,
+        'data': data,
+        'message': message
+    }
+    if meta is not None:
+        body['meta'] = meta
+    # Same encoder as the Flask routes so both modes return identical bytes
+    response = Response(dumps(body), status_code=status_code, media_type='application/json', headers=headers)
+    if etag is not None:
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def ledger_etag(version):
+    """ETag for a response derived from expenses; matches api_routes.ledger_etag"""
+    return f"ledger-{version}"
+
+
+def not_modified(request, etag):
+    """Return a 304 response when If-None-Match already holds etag, else None"""
+    tags = [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+    if '*' not in tags and not any(tag.removeprefix('W/') == f'"{etag}"' for tag in tags):
+        return None
+    return Response(status_code=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+
+async def _ledger_version(session):
+    return (await session.execute(select(LedgerVersion.version).where(LedgerVersion.id == 1))).scalar() or 0
+
+
+async def _group_exists(session, group_id):
+    return group_id is None or await session.get(Group, group_id) is not None
+
+
+async def _aggregates(session, group_id):
+    started = time.perf_counter()
+    rows = await session.execute(SettlementCalculator.aggregate_query(group_id))
+    aggregates = SettlementCalculator.aggregates_from_rows(rows)
+    observe_phase('aggregate', started)
+    return aggregates
+
+
+async def _balances_as_of(session, as_of, etag):
+    """Balances at a past moment: the nearest earlier checkpoint plus the events logged after it"""
+    checkpoint = (await session.execute(LedgerEvents.checkpoint_query(as_of))).first()
+    if checkpoint is None:
+        start = (await session.execute(LedgerEvents.history_start_query())).scalar()
+        return create_response(False, None, f"Balance history starts at {start.isoformat()}", 400)
+
+    rows = await session.execute(LedgerEvents.balance_query(checkpoint.id, checkpoint.last_event_id, as_of))
+    aggregates = SettlementCalculator.aggregates_from_rows(rows)
+    balances = SettlementCalculator.calculate_balances(aggregates=aggregates)
+    meta = {'as_of': as_of.isoformat(), 'checkpoint_at': checkpoint.taken_at.isoformat()}
+    return create_response(True, list(balances.values()), "Balances calculated successfully", meta=meta, etag=etag)
+
+
+async def get_balances(request):
+    """Calculate balances, optionally limited to one group or as of a past moment (?as_of=)"""
+    group_id = request.path_params.get('group_id')
+    as_of = request.query_params.get('as_of')
+    if as_of is not None and group_id is not None:
+        return create_response(False, None, "as_of is only supported for balances across all groups", 400)
+    if as_of is not None:
+        try:
+            as_of = LedgerEvents.parse_as_of(as_of)
+        except ValueError as e:
+            return create_response(False, None, str(e), 400)
+    try:
+        async with Session() as session:
+            if not await _group_exists(session, group_id):
+                return create_response(False, None, "Group not found", 404)
+
+            version = await _ledger_version(session)
+            etag = ledger_etag(version)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+
+            if as_of is not None:
+                return await _balances_as_of(session, as_of, etag)
+
+            key = SettlementCache.balances_key(group_id)
+            balances = SettlementCache.lookup(key, version)
+            if balances is None:
+                aggregates = await _aggregates(session, group_id)
+                balances = SettlementCalculator.calculate_balances(group_id, aggregates)
+                SettlementCache.store(key, version, balances)
+
+        return create_response(True, list(balances.values()), "Balances calculated successfully", etag=etag)
+
+    except Exception as e:
+        logging.error(f"Error calculating balances: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+
+async def get_settlements(request):
+    """Calculate settlements with the requested mode, optionally limited to one group"""
+    group_id = request.path_params.get('group_id')
+    try:
+        mode = request.query_params.get('mode', 'greedy')
+        if mode not in SETTLEMENT_MODES:
+            return create_response(False, None, f"mode must be one of: {', '.join(SETTLEMENT_MODES)}", 400)
+
+        async with Session() as session:
+            if not await _group_exists(session, group_id):
+                return create_response(False, None, "Group not found", 404)
+
+            version = await _ledger_version(session)
+            etag = ledger_etag(version)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+
+            key = SettlementCache.settlements_key(mode, group_id)
+            result = SettlementCache.lookup(key, version)
+            hit = result is not None
+            if not hit:
+                aggregates = await _aggregates(session, group_id)
+                components = SettlementCalculator.labels_from_rows(
+                    await session.execute(BalanceLedger.component_query()))
+                # The optimal solver can run for seconds; keep it off the event loop
+                result = await run_in_threadpool(SettlementCalculator.solve_settlements, mode, group_id,
+                                                 aggregates, components)
+                SettlementCache.store(key, version, result)
+
+        meta = {
+            'mode': result['mode'],
+            'solver': result['solver'],
+            'fallback': result['fallback'],
+            'components': result['components']
+        }
+        # Reported as headers: a strong ETag promises the same body from every worker
+        headers = {'X-Cache': 'HIT' if hit else 'MISS', 'X-Solve-Time-Ms': str(result['elapsed_ms'])}
+
+        return create_response(True, result['settlements'], "Settlements calculated successfully",
+                               meta=meta, etag=etag, headers=headers)
+
+    except Exception as e:
+        logging.error(f"Error calculating settlements: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+
+async def get_expenses(request):
+    """List one page of expenses, newest first, optionally limited to one group"""
+    group_id = request.path_params.get('group_id')
+    try:
+        try:
+            options = parse_listing_args(request.query_params)
+        except ValueError as e:
+            return create_response(False, None, str(e), 400)
+
+        async with Session() as session:
+            if not await _group_exists(session, group_id):
+                return create_response(False, None, "Group not found", 404)
+
+            etag = ledger_etag(await _ledger_version(session))
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+
+            fields, money, limit = options.pop('fields'), options.pop('money'), options['limit']
+            query = expense_row_query(expense_page_query(group_id=group_id, **options), fields)
+            rows, next_cursor = split_page((await session.execute(query)).all(), limit)
+            splits = None
+            if rows and (fields is None or 'splits' in fields):
+                splits = split_dicts(await session.execute(split_row_query([row.id for row in rows])), money)
+            expenses_data = expense_dicts(rows, splits, fields, money)
+
+        meta = {
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
+        return create_response(True, expenses_data, "Expenses retrieved successfully", meta=meta, etag=etag)
+
+    except Exception as e:
+        logging.error(f"Error retrieving expenses: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+
+async def get_people(request):
+    """Get all people"""
+    try:
+        async with Session() as session:
+            etag = ledger_etag(await _ledger_version(session))
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+
+            people = await session.execute(select(Person.id, Person.name, Person.created_at).order_by(Person.name))
+            people_data = person_dicts(people)
+
+        return create_response(True, people_data, "People retrieved successfully", etag=etag)
+
+    except Exception as e:
+        logging.error(f"Error retrieving people: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+
+async def get_groups(request):
+    """Get all groups"""
+    try:
+        async with Session() as session:
+            groups = (await session.execute(select(Group).order_by(Group.name))).scalars()
+            groups_data = [group.to_dict() for group in groups]
+
+        return create_response(True, groups_data, "Groups retrieved successfully")
+
+    except Exception as e:
+        logging.error(f"Error retrieving groups: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return create_response(True, {"status": "healthy"}, "Service is running")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+routes = [
+    Route('/api/expenses', get_expenses, methods=['GET']),
+    Route('/api/people', get_people, methods=['GET']),
+    Route('/api/balances', get_balances, methods=['GET']),
+    Route('/api/settlements', get_settlements, methods=['GET']),
+    Route('/api/groups', get_groups, methods=['GET']),
+    Route('/api/groups/{group_id:int}/expenses', get_expenses, methods=['GET']),
+    Route('/api/groups/{group_id:int}/balances', get_balances, methods=['GET']),
+    Route('/api/groups/{group_id:int}/settlements', get_settlements, methods=['GET']),
+    Route('/api/health', health_check, methods=['GET']),
+    # Anything not served natively above, including other methods on the same paths
+    Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan, middleware=[
+    Middleware(ServerTimingMiddleware),
+    Middleware(MetricsMiddleware),
+])
@@ -0,0 +1,362 @@
+"""
+Materialized per-person balance ledger for Split App
+Keeps total_paid and fair_share per person in the person_balances table,
+updated by deltas inside the same transaction as the expense and payment
+writes, and a ledger version that every write bumps so readers can cache by
+version. Each row also carries the person's debt graph component, merged as
+expenses and payments link people together.
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import bindparam, func, insert, select, union, update
+
+from app import db
+from db_utils import dialect_insert
+from ledger_events import LedgerEvents
+from models import Expense, ExpenseSplit, LedgerEventKind, LedgerVersion, Payment, Person, PersonBalance
+from settlement_solver import UnionFind
+
+ZERO = Decimal('0')
+
+# Person ids per IN (...) lookup when linking components
+LINK_CHUNK_SIZE = 1000
+
+
+def _upsert_statement():
+    """Return an INSERT ... ON CONFLICT DO UPDATE that adds to the stored totals, if supported."""
+    stmt = dialect_insert(PersonBalance)
+    if stmt is None:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=[PersonBalance.person_id],
+        set_={
+            'total_paid': PersonBalance.total_paid + stmt.excluded.total_paid,
+            'fair_share': PersonBalance.fair_share + stmt.excluded.fair_share,
+        }
+    )
+
+
+class BalanceLedger:
+    """
+    Applies balance deltas to the person_balances table and reads balances from it.
+    Callers are responsible for committing; deltas join the caller's transaction.
+    """
+
+    @staticmethod
+    def expense_deltas(expense: Expense, sign: int = 1) -> List[Tuple[int, Decimal, Decimal]]:
+        """
+        Return the (person_id, paid_delta, share_delta) rows an expense contributes.
+        Use sign=-1 to retract an expense that is being deleted.
+        """
+        deltas = [(expense.paid_by_id, sign * expense.amount, ZERO)]
+        for split in expense.splits:
+            deltas.append((split.person_id, ZERO, sign * split.amount))
+        return deltas
+
+    @staticmethod
+    def payment_deltas(payment: Payment, sign: int = 1) -> List[Tuple[int, Decimal, Decimal]]:
+        """
+        Return the (person_id, paid_delta, share_delta) rows a payment contributes:
+        the payer has paid the amount and the payee has received it, which counts
+        against their fair share. Use sign=-1 to retract a payment that is being deleted.
+        """
+        return [(payment.payer_id, sign * payment.amount, ZERO), (payment.payee_id, ZERO, sign * payment.amount)]
+
+    @staticmethod
+    def expense_people(expense: Expense) -> Set[int]:
+        """Return the ids of the payer and everyone sharing an expense"""
+        return {expense.paid_by_id, *(split.person_id for split in expense.splits)}
+
+    @staticmethod
+    def apply(deltas: Iterable[Tuple[int, Decimal, Decimal]]) -> None:
+        """
+        Add (person_id, paid_delta, share_delta) rows to the ledger.
+        Deltas for the same person are merged so each person is touched once.
+        Every call is an expense write and bumps the ledger version, even without deltas.
+        """
+        BalanceLedger.bump_version()
+
+        merged: Dict[int, List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+        for person_id, paid_delta, share_delta in deltas:
+            merged[person_id][0] += Decimal(paid_delta)
+            merged[person_id][1] += Decimal(share_delta)
+
+        rows = [
+            {'person_id': person_id, 'total_paid': paid, 'fair_share': share}
+            for person_id, (paid, share) in merged.items()
+            if paid or share
+        ]
+        if not rows:
+            return
+
+        upsert = _upsert_statement()
+        if upsert is not None:
+            db.session.execute(upsert, rows)
+            return
+
+        # Portable fallback: update in place, insert the rows that did not exist yet
+        for row in rows:
+            result = db.session.execute(
+                update(PersonBalance)
+                .where(PersonBalance.person_id == row['person_id'])
+                .values(total_paid=PersonBalance.total_paid + row['total_paid'],
+                        fair_share=PersonBalance.fair_share + row['fair_share'])
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(PersonBalance), [row])
+
+    @staticmethod
+    def link(groups: Iterable[Iterable[int]]) -> None:
+        """
+        Merge the debt graph components of each group of person ids (the people of
+        one expense). Call after apply, in the same transaction: apply locks the
+        version row, so concurrent writers merge components one at a time.
+        Components are only ever merged here; when an update or delete unlinks
+        people they stay together, which keeps settlements correct, until rebuild
+        or rebuild_components recomputes the exact components.
+        """
+        groups = [set(group) for group in groups]
+        person_ids = sorted(set().union(*groups))
+        labels = {}
+        for start in range(0, len(person_ids), LINK_CHUNK_SIZE):
+            chunk = person_ids[start:start + LINK_CHUNK_SIZE]
+            labels.update(db.session.execute(
+                select(PersonBalance.person_id, PersonBalance.component_id)
+                .where(PersonBalance.person_id.in_(chunk))
+            ).all())
+
+        # Union current labels, standing in a person's own id for a missing one.
+        # A label is the smallest person id of its component, so ids and labels never collide.
+        components = UnionFind()
+        for group in groups:
+            components.union_all(labels[person_id] or person_id for person_id in group if person_id in labels)
+
+        relabelled, assigned = [], []
+        for nodes in components.sets():
+            label = min(nodes)
+            relabelled.extend({'old_label': node, 'new_label': label} for node in nodes if node != label)
+            assigned.extend({'member': node, 'new_label': label} for node in nodes)
+
+        table = PersonBalance.__table__
+        if relabelled:
+            db.session.execute(
+                update(table).where(table.c.component_id == bindparam('old_label'))
+                .values(component_id=bindparam('new_label')),
+                relabelled
+            )
+        # People labelled for the first time (and, harmlessly, each label's own holder)
+        db.session.execute(
+            update(table).where(table.c.person_id == bindparam('member'), table.c.component_id.is_(None))
+            .values(component_id=bindparam('new_label')),
+            assigned
+        )
+
+    @staticmethod
+    def bump_version() -> None:
+        """
+        Increment the ledger version in the caller's transaction.
+        The version row stays locked until commit, so concurrent writers commit
+        their versions in order and a committed version never goes backwards.
+        """
+        db.session.execute(
+            update(LedgerVersion)
+            .where(LedgerVersion.id == 1)
+            .values(version=LedgerVersion.version + 1)
+        )
+        # Lets after_commit listeners react to ledger writes made by this process
+        db.session.info['ledger_written'] = True
+
+    @staticmethod
+    def version() -> int:
+        """Return the current ledger version; it changes whenever any expense changes."""
+        return db.session.execute(select(LedgerVersion.version).where(LedgerVersion.id == 1)).scalar() or 0
+
+    @staticmethod
+    def record_expense(expense: Expense) -> None:
+        """Add an expense's payment and splits to the ledger, link its people and log the event."""
+        deltas = BalanceLedger.expense_deltas(expense)
+        BalanceLedger.apply(deltas)
+        BalanceLedger.link([BalanceLedger.expense_people(expense)])
+        LedgerEvents.record(LedgerEventKind.CREATED, expense, deltas)
+
+    @staticmethod
+    def amend_expense(expense: Expense, retracted: List[Tuple[int, Decimal, Decimal]]) -> None:
+        """
+        Replace an expense's old contribution (expense_deltas with sign=-1, taken
+        before the change) with its current one, link its people and log the event.
+        """
+        deltas = retracted + BalanceLedger.expense_deltas(expense)
+        BalanceLedger.apply(deltas)
+        BalanceLedger.link([BalanceLedger.expense_people(expense)])
+        LedgerEvents.record(LedgerEventKind.AMENDED, expense, deltas)
+
+    @staticmethod
+    def retract_expense(expense: Expense) -> None:
+        """Remove an expense's payment and splits from the ledger and log the event."""
+        deltas = BalanceLedger.expense_deltas(expense, sign=-1)
+        BalanceLedger.apply(deltas)
+        LedgerEvents.record(LedgerEventKind.DELETED, expense, deltas)
+
+    @staticmethod
+    def record_payment(payment: Payment) -> None:
+        """Add a payment to the ledger, link its payer and payee and log the event."""
+        deltas = BalanceLedger.payment_deltas(payment)
+        BalanceLedger.apply(deltas)
+        BalanceLedger.link([{payment.payer_id, payment.payee_id}])
+        LedgerEvents.record_payment(LedgerEventKind.CREATED, payment, deltas)
+
+    @staticmethod
+    def retract_payment(payment: Payment) -> None:
+        """Remove a payment from the ledger and log the event."""
+        deltas = BalanceLedger.payment_deltas(payment, sign=-1)
+        BalanceLedger.apply(deltas)
+        LedgerEvents.record_payment(LedgerEventKind.DELETED, payment, deltas)
+
+    @staticmethod
+    def balance_query():
+        """Build the query returning (person_id, name, total_paid, fair_share) from the ledger."""
+        return (
+            select(Person.id, Person.name,
+                   func.coalesce(PersonBalance.total_paid, 0).label('total_paid'),
+                   func.coalesce(PersonBalance.fair_share, 0).label('fair_share'))
+            .outerjoin(PersonBalance, PersonBalance.person_id == Person.id)
+            .order_by(Person.id)
+        )
+
+    @staticmethod
+    def component_query():
+        """Build the query returning (name, component_id) for everyone in the ledger."""
+        return select(Person.name, PersonBalance.component_id).join(PersonBalance, PersonBalance.person_id == Person.id)
+
+    @staticmethod
+    def drift() -> List[Dict]:
+        """
+        Recompute balances from expenses, expense_splits, payments and carried balances
+        and compare with the ledger.
+        Returns one entry per person whose stored totals differ.
+        """
+        from settlement_calculator import SettlementCalculator
+
+        stored = {
+            person_id: (Decimal(str(paid)), Decimal(str(share)))
+            for person_id, _, paid, share in db.session.execute(BalanceLedger.balance_query())
+        }
+
+        drift = []
+        for person_id, name, paid, share in SettlementCalculator.recomputed_balance_rows():
+            paid, share = Decimal(str(paid)), Decimal(str(share))
+            ledger_paid, ledger_share = stored.get(person_id, (ZERO, ZERO))
+            if ledger_paid != paid or ledger_share != share:
+                drift.append({
+                    'person_id': person_id,
+                    'name': name,
+                    'ledger_total_paid': ledger_paid,
+                    'actual_total_paid': paid,
+                    'ledger_fair_share': ledger_share,
+                    'actual_fair_share': share,
+                })
+        return drift
+
+    @staticmethod
+    def rebuild() -> int:
+        """
+        Replace the ledger with totals recomputed from expenses, expense_splits,
+        payments and carried balances.
+        Returns the number of ledger rows written. Caller commits.
+        """
+        from settlement_calculator import SettlementCalculator
+
+        rows = [
+            {'person_id': person_id, 'total_paid': Decimal(str(paid)), 'fair_share': Decimal(str(share))}
+            for person_id, _, paid, share in SettlementCalculator.recomputed_balance_rows()
+        ]
+
+        BalanceLedger.bump_version()
+        db.session.execute(PersonBalance.__table__.delete())
+        if rows:
+            db.session.execute(insert(PersonBalance), rows)
+        BalanceLedger.rebuild_components()
+        # Corrected totals are not the sum of the logged events; start history afresh from them
+        LedgerEvents.checkpoint()
+        return len(rows)
+
+    @staticmethod
+    def rebuild_components() -> int:
+        """
+        Recompute every debt graph component from expenses, expense_splits and
+        payments with union-find, undoing merges left behind by updates and deletes.
+        Carried balances link nobody. Returns the number of components. Caller commits.
+        """
+        links = union(
+            select(Expense.paid_by_id, ExpenseSplit.person_id)
+            .join(Expense, Expense.id == ExpenseSplit.expense_id)
+            .where(ExpenseSplit.person_id != Expense.paid_by_id),
+            select(Payment.payer_id, Payment.payee_id)
+        )
+        components = UnionFind()
+        for person_id in db.session.execute(select(PersonBalance.person_id)).scalars():
+            components.find(person_id)
+        for payer_id, person_id in db.session.execute(links):
+            components.union(payer_id, person_id)
+
+        rows = []
+        sets = components.sets()
+        for members in sets:
+            label = min(members)
+            rows.extend({'member': person_id, 'new_label': label} for person_id in members)
+
+        BalanceLedger.bump_version()
+        table = PersonBalance.__table__
+        if rows:
+            db.session.execute(
+                update(table).where(table.c.person_id == bindparam('member'))
+                .values(component_id=bindparam('new_label')),
+                rows
+            )
+        return len(sets)
+
+    @staticmethod
+    def ensure_initialized() -> None:
+        """Populate an empty ledger for a database that already holds expenses."""
+        has_ledger = db.session.execute(select(PersonBalance.person_id).limit(1)).first()
+        has_expenses = db.session.execute(select(Expense.id).limit(1)).first()
+        if has_expenses and not has_ledger:
+            BalanceLedger.rebuild()
+            db.session.commit()
+
+
+def main(argv=None):
+    """Verify or rebuild the balance ledger from the command line"""
+    parser = argparse.ArgumentParser(description="Verify or rebuild the person_balances ledger")
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        drift = BalanceLedger.drift()
+        for entry in drift:
+            print(f"✗ {entry['name']} (id {entry['person_id']}): "
+                  f"paid {entry['ledger_total_paid']} vs {entry['actual_total_paid']}, "
+                  f"share {entry['ledger_fair_share']} vs {entry['actual_fair_share']}")
+
+        if args.command == 'verify':
+            if drift:
+                print(f"✗ Ledger drift detected for {len(drift)} people")
+                return 1
+            print("✓ Ledger matches expenses and splits")
+            return 0
+
+        count = BalanceLedger.rebuild()
+        db.session.commit()
+        print(f"✓ Ledger rebuilt for {count} people")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
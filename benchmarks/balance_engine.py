@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the SQL and NumPy balance engines
+Seeds a synthetic ledger (10^6 splits by default) and times, with
+BALANCE_ENGINE=sql and BALANCE_ENGINE=numpy:
+
+    recompute       every person's totals from expenses and splits (ledger drift/rebuild)
+    group_balances  one group's aggregate balances
+    debts           the netted pairwise "who owes whom" list, installation-wide
+
+and once more with the NumPy engine reading a memory-mapped snapshot file
+(LEDGER_SNAPSHOT_PATH) instead of loading from the database. Every result
+must match between the engines to the cent; the report is printed as JSON,
+with the NumPy load and array math, and the snapshot write, open and overlay,
+timed apart:
+
+    python benchmarks/balance_engine.py --splits 1000000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_generator import LedgerSpec, add_spec_arguments, seed, spec_from_args  # noqa: E402
+from run import reset_database, timed  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--splits', type=int, default=1000000, help='ledger size in splits (default: 1000000)')
+    add_spec_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement (default: 3)')
+    parser.add_argument('--reset', action='store_true', help='allow dropping every table in DATABASE_URL')
+    return parser.parse_args(argv)
+
+
+def run_engine(engine, repeat):
+    """Time every benchmark with one engine; returns (timings, results). Needs an app context."""
+    from app import db
+    from settlement_calculator import SettlementCalculator
+
+    os.environ['BALANCE_ENGINE'] = engine
+    benchmarks = {
+        'recompute': lambda: [(person_id, name, str(paid), str(share)) for person_id, name, paid, share
+                              in SettlementCalculator.recomputed_balance_rows()],
+        'group_balances': lambda: [(name, str(paid), str(share)) for name, paid, share
+                                   in SettlementCalculator.aggregate_balances(1)],
+        'debts': lambda: SettlementCalculator.pairwise_debts(),
+    }
+    timings, results = {}, {}
+    for name, fn in benchmarks.items():
+        timings[name] = timed(fn, repeat)
+        results[name] = fn()
+        db.session.remove()
+    return timings, results
+
+
+def snapshot_phases(path, repeat):
+    """
+    Time writing the snapshot file, then mapping and totalling it as a cold worker
+    would: at the snapshot's ledger version, and after a later write, when the
+    overlay checks the database for changes
+    """
+    from app import db
+    from balance_ledger import BalanceLedger
+    import snapshot_file
+
+    def open_and_total():
+        snapshot_file.SnapshotFile(path).ledger().totals()
+        db.session.remove()
+
+    phases = {'write': timed(lambda: snapshot_file.write_snapshot(path), 1), 'bytes': os.path.getsize(path)}
+    phases['open'] = timed(open_and_total, repeat)
+    BalanceLedger.bump_version()
+    db.session.commit()
+    phases['open_overlay'] = timed(open_and_total, repeat)
+    return phases
+
+
+def numpy_phases(repeat):
+    """Split the NumPy engine's time into loading the snapshot and the array math"""
+    from columnar_ledger import LedgerSnapshot
+
+    snapshot = LedgerSnapshot.load()
+    return {
+        'load': timed(LedgerSnapshot.load, repeat),
+        'totals': timed(snapshot.totals, repeat),
+        'pairwise': timed(snapshot.pairwise, repeat),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if os.environ.get('DATABASE_URL') and not args.reset:
+        sys.exit("DATABASE_URL is set: pass --reset to let the benchmark drop and recreate its tables")
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='split-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    from app import app
+    from columnar_ledger import np
+
+    if np is None:
+        sys.exit("NumPy is not installed: pip install numpy")
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = LedgerSpec.for_splits(args.splits, **spec_from_args(args)._asdict())
+    print(f"Seeding {spec.splits} splits ({spec.expenses} expenses)", file=sys.stderr)
+    report = {'spec': dict(spec._asdict(), expenses=spec.expenses, splits=spec.splits), 'repeat': args.repeat}
+    with app.app_context():
+        reset_database()
+        started = time.perf_counter()
+        seed(spec)
+        report['seed_s'] = round(time.perf_counter() - started, 1)
+
+        sql_timings, sql_results = run_engine('sql', args.repeat)
+        numpy_timings, numpy_results = run_engine('numpy', args.repeat)
+        report['sql'] = sql_timings
+        report['numpy'] = numpy_timings
+        report['numpy_phases'] = numpy_phases(args.repeat)
+
+        path = os.path.join(tempfile.mkdtemp(prefix='split-snapshot-'), 'ledger.snap')
+        report['snapshot_phases'] = snapshot_phases(path, args.repeat)
+        os.environ['LEDGER_SNAPSHOT_PATH'] = path
+        snapshot_timings, snapshot_results = run_engine('numpy', args.repeat)
+        report['numpy_snapshot'] = snapshot_timings
+
+    mismatched = [name for name in sql_results
+                  if not sql_results[name] == numpy_results[name] == snapshot_results[name]]
+    report['match'] = not mismatched
+    print(json.dumps(report, indent=2))
+    if mismatched:
+        print(f"✗ Engines disagree on: {', '.join(mismatched)}", file=sys.stderr)
+        return 1
+    print("✓ Engines agree to the cent", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark for recorded payments and ledger compaction
+Seeds a synthetic ledger of many debt graph components (10^6 splits in 200
+by default), records the greedy settlements of most components as payments,
+then times with the SQL and NumPy engines, before and after
+`ledger_compaction.py` folds the settled components away:
+
+    recompute       every person's totals (ledger drift/rebuild)
+    group_balances  one group's aggregate balances
+    debts           the netted pairwise "who owes whom" list, installation-wide
+    listing         the first page of the expense listing
+
+Installation-wide balances must be identical before and after compaction;
+the report is printed as JSON with the compaction itself timed apart:
+
+    python benchmarks/compaction.py --splits 1000000 --settled 0.9
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_generator import LedgerSpec, add_spec_arguments, seed, spec_from_args  # noqa: E402
+from run import reset_database, timed  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--splits', type=int, default=1000000, help='ledger size in splits (default: 1000000)')
+    add_spec_arguments(parser)
+    parser.set_defaults(clusters=200)
+    parser.add_argument('--settled', type=float, default=0.9,
+                        help='fraction of components whose settlements are paid (default: 0.9)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement (default: 3)')
+    parser.add_argument('--reset', action='store_true', help='allow dropping every table in DATABASE_URL')
+    return parser.parse_args(argv)
+
+
+def pay_settlements(fraction):
+    """
+    Record the greedy settlements of the first `fraction` of components as payments,
+    in one transaction with one ledger update. Returns the number of payments.
+    """
+    from sqlalchemy import insert, select
+
+    from app import db
+    from balance_ledger import BalanceLedger
+    from ledger_events import LedgerEvents
+    from models import LedgerEventKind, Payment, Person
+    from settlement_calculator import SettlementCalculator
+
+    components = SettlementCalculator.component_labels()
+    labels = sorted(set(components.values()))
+    paid_labels = set(labels[:round(len(labels) * fraction)])
+    ids = dict(db.session.execute(select(Person.name, Person.id)).all())
+    settlements = [settlement for settlement in SettlementCalculator.calculate_settlements()
+                   if components[settlement['from']] in paid_labels]
+    if not settlements:
+        return 0
+
+    rows = [{'payer_id': ids[s['from']], 'payee_id': ids[s['to']], 'amount': f"{s['amount']:.2f}"}
+            for s in settlements]
+    payments = db.session.execute(
+        insert(Payment).returning(Payment, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    deltas = [BalanceLedger.payment_deltas(payment) for payment in payments]
+    BalanceLedger.apply(delta for payment_deltas in deltas for delta in payment_deltas)
+    LedgerEvents.record_many(LedgerEventKind.CREATED,
+                             [(payment.id, None, payment_deltas) for payment, payment_deltas in zip(payments, deltas)],
+                             subject='payment_id')
+    db.session.commit()
+    return len(payments)
+
+
+def run_engines(repeat):
+    """Time every benchmark with both engines; returns (timings, sql results). Needs an app context."""
+    from app import db
+    from expense_listing import fetch_expense_dicts
+    from settlement_calculator import SettlementCalculator
+
+    benchmarks = {
+        'recompute': lambda: [(person_id, name, str(paid), str(share)) for person_id, name, paid, share
+                              in SettlementCalculator.recomputed_balance_rows()],
+        'group_balances': lambda: [(name, str(paid), str(share)) for name, paid, share
+                                   in SettlementCalculator.aggregate_balances(1)],
+        'debts': lambda: SettlementCalculator.pairwise_debts(),
+        'listing': lambda: fetch_expense_dicts(limit=50),
+    }
+    timings, results = {}, {}
+    for engine in ('sql', 'numpy'):
+        os.environ['BALANCE_ENGINE'] = engine
+        for name, fn in benchmarks.items():
+            if name == 'listing' and engine == 'numpy':
+                continue
+            timings[f"{engine}_{name}"] = timed(fn, repeat)
+            result = fn()
+            if engine == 'sql':
+                results[name] = result
+            elif result != results[name]:
+                sys.exit(f"✗ Engines disagree on {name}")
+            db.session.remove()
+    os.environ['BALANCE_ENGINE'] = 'sql'
+    return timings, results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if os.environ.get('DATABASE_URL') and not args.reset:
+        sys.exit("DATABASE_URL is set: pass --reset to let the benchmark drop and recreate its tables")
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='split-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    from app import app, db
+    from columnar_ledger import np
+    from ledger_compaction import LedgerCompaction
+    from models import Expense, ExpenseSplit
+
+    if np is None:
+        sys.exit("NumPy is not installed: pip install numpy")
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = LedgerSpec.for_splits(args.splits, **spec_from_args(args)._asdict())
+    print(f"Seeding {spec.splits} splits ({spec.expenses} expenses) in {spec.clusters} components",
+          file=sys.stderr)
+    report = {'spec': dict(spec._asdict(), expenses=spec.expenses, splits=spec.splits),
+              'settled': args.settled, 'repeat': args.repeat}
+    with app.app_context():
+        reset_database()
+        seed(spec)
+        report['payments'] = pay_settlements(args.settled)
+
+        report['before'], before = run_engines(args.repeat)
+
+        started = time.perf_counter()
+        result = LedgerCompaction.compact(datetime.utcnow() + timedelta(seconds=1))
+        db.session.commit()
+        report['compaction_s'] = round(time.perf_counter() - started, 2)
+        report['compacted'] = result._asdict()
+        report['remaining'] = {
+            'expenses': db.session.query(Expense).count(),
+            'splits': db.session.query(ExpenseSplit).count(),
+        }
+
+        report['after'], after = run_engines(args.repeat)
+        db.session.remove()
+
+    report['match'] = before['recompute'] == after['recompute']
+    print(json.dumps(report, indent=2))
+    if not report['match']:
+        print("✗ Compaction changed balances", file=sys.stderr)
+        return 1
+    print("✓ Balances unchanged by compaction", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
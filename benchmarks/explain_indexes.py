@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the balance and listing hot paths
+Seeds a database with synthetic expenses (1M splits by default), runs EXPLAIN
+on the queries the app serves most and fails if any of them scans the
+expenses or expense_splits table instead of using an index.
+
+Runs against DATABASE_URL, or a throwaway SQLite file when it is not set.
+Seeding refuses to touch a database that already holds expenses.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOT_TABLES = ('expenses', 'expense_splits')
+SEED_BATCH_SIZE = 10000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--splits', type=int, default=1000000, help='splits to seed (default: 1000000)')
+    parser.add_argument('--splits-per-expense', type=int, default=4)
+    parser.add_argument('--people', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--no-seed', action='store_true', help='explain against the existing data only')
+    parser.add_argument('--seed', type=int, default=7, help='random seed')
+    return parser.parse_args(argv)
+
+
+def seed(args):
+    """Insert synthetic people, groups, expenses and splits with Core executemany batches"""
+    from sqlalchemy import insert, select, text
+
+    from app import db
+    from balance_ledger import BalanceLedger
+    from models import Expense, ExpenseSplit, Group, Person, SplitMethod
+
+    if db.session.execute(select(Expense.id).limit(1)).first():
+        sys.exit("Refusing to seed: the database already holds expenses (use --no-seed)")
+
+    rng = random.Random(args.seed)
+    db.session.execute(insert(Person), [{'name': f"person-{i}"} for i in range(args.people)])
+    db.session.execute(insert(Group), [{'name': f"group-{i}"} for i in range(args.groups)])
+    person_ids = db.session.execute(select(Person.id)).scalars().all()
+    group_ids = db.session.execute(select(Group.id)).scalars().all()
+
+    per_expense = args.splits_per_expense
+    start = datetime.utcnow() - timedelta(days=365)
+    expense_count = args.splits // per_expense
+    for offset in range(0, expense_count, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(offset, min(offset + SEED_BATCH_SIZE, expense_count)):
+            cents = rng.randint(100 * per_expense, 50000)
+            participants = rng.sample(person_ids, per_expense)
+            group_id = rng.choice(group_ids) if rng.random() < 0.5 else None
+            batch.append((cents, participants, group_id, start + timedelta(seconds=i * 30)))
+
+        # The table starts empty, so ids are assigned here instead of read back with RETURNING
+        expense_ids = range(offset + 1, offset + 1 + len(batch))
+        db.session.execute(insert(Expense), [
+            {'id': expense_id, 'amount': Decimal(cents) / 100, 'description': 'seeded',
+             'paid_by_id': participants[0], 'group_id': group_id, 'split_method': SplitMethod.EQUAL,
+             'created_at': created_at, 'updated_at': created_at}
+            for expense_id, (cents, participants, group_id, created_at) in zip(expense_ids, batch)
+        ])
+
+        split_rows = []
+        for expense_id, (cents, participants, group_id, _) in zip(expense_ids, batch):
+            share, remainder = divmod(cents, per_expense)
+            for i, person_id in enumerate(participants):
+                split_cents = share + (remainder if i == per_expense - 1 else 0)
+                split_rows.append({'expense_id': expense_id, 'person_id': person_id, 'group_id': group_id,
+                                   'amount': Decimal(split_cents) / 100,
+                                   'percentage': Decimal(100) / per_expense})
+        db.session.execute(insert(ExpenseSplit), split_rows)
+
+    if db.engine.dialect.name == 'postgresql':
+        # Move the id sequence past the explicitly assigned ids
+        db.session.execute(text("SELECT setval(pg_get_serial_sequence('expenses', 'id'), MAX(id)) FROM expenses"))
+    BalanceLedger.rebuild()
+    db.session.commit()
+
+
+def analyze():
+    """Refresh planner statistics so plans reflect the seeded volume"""
+    from app import db
+
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM ANALYZE')
+        else:
+            conn.exec_driver_sql('ANALYZE')
+            conn.commit()
+
+
+def hot_queries():
+    """Return (label, query) pairs for the access paths the indexes exist for"""
+    from app import db
+    from expense_listing import expense_page_query
+    from models import Expense
+    from settlement_calculator import SettlementCalculator
+
+    newest = db.session.execute(
+        Expense.__table__.select().order_by(Expense.created_at.desc(), Expense.id.desc()).limit(1)
+    ).first()
+    cursor = (newest.created_at - timedelta(days=30), newest.id) if newest else (datetime.utcnow(), 0)
+
+    return [
+        ('listing, first page', expense_page_query()),
+        ('listing, keyset page', expense_page_query(cursor=cursor)),
+        ('listing, group page', expense_page_query(group_id=1)),
+        ('balances, all people', SettlementCalculator.balance_query()),
+        ('balances, one group', SettlementCalculator.balance_query(group_id=1)),
+    ]
+
+
+def explain(query):
+    """Return the database's plan for a query as a list of lines"""
+    from app import db
+
+    with db.engine.connect() as conn:
+        sql = str(query.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+        if conn.dialect.name == 'sqlite':
+            return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}")]
+
+
+def table_scans(plan):
+    """Return the hot tables a plan reads with a full table scan"""
+    scans = []
+    for line in plan:
+        for table in HOT_TABLES:
+            # SQLite: "SCAN expenses" without "USING ... INDEX"; PostgreSQL: "Seq Scan on expenses"
+            if re.search(rf'\bSCAN {table}\b(?!.*INDEX)', line) or re.search(rf'Seq Scan on {table}\b', line):
+                scans.append(table)
+    return scans
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='split-explain-'), 'explain.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    from app import app
+
+    with app.app_context():
+        if not args.no_seed:
+            started = time.perf_counter()
+            seed(args)
+            print(f"Seeded {args.splits} splits in {time.perf_counter() - started:.1f}s")
+        analyze()
+
+        failures = 0
+        for label, query in hot_queries():
+            plan = explain(query)
+            scans = table_scans(plan)
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'ok  '} {label}")
+            for line in plan:
+                print(f"       {line}")
+
+    if failures:
+        print(f"✗ {failures} hot queries scan a table instead of an index")
+        return 1
+    print("✓ All hot queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
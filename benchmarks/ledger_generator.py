@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Seeded generator for synthetic Split App ledgers
+Produces expenses in the same shape POST /api/expenses accepts, with a
+configurable number of people, expenses per person, participants per expense,
+mix of equal, exact and percentage splits and number of clusters (circles of
+people who only share expenses with each other). The same spec and seed always
+produce the same ledger.
+
+Run on its own to seed DATABASE_URL through the bulk import pipeline:
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/ledger_generator.py --people 250 --expenses-per-person 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterator, NamedTuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DESCRIPTIONS = ('Dinner', 'Groceries', 'Petrol', 'Movie Tickets', 'Pizza', 'Rent', 'Taxi', 'Coffee',
+                'Hotel', 'Train tickets', 'Electricity', 'Internet', 'Drinks', 'Museum', 'Breakfast')
+
+# Rows handed to bulk_import.insert_expenses per transaction while seeding
+SEED_BATCH_SIZE = 5000
+
+
+class LedgerSpec(NamedTuple):
+    """Shape of a generated ledger; splits = people * expenses_per_person * participants"""
+    people: int = 250
+    expenses_per_person: int = 10
+    participants: int = 4
+    groups: int = 10
+    group_share: float = 0.5  # fraction of expenses recorded in a group
+    mix: Dict[str, float] = {'equal': 0.6, 'exact': 0.2, 'percentage': 0.2}
+    seed: int = 7
+    clusters: int = 1  # disjoint circles of people, i.e. debt graph components
+
+    @property
+    def expenses(self) -> int:
+        return self.people * self.expenses_per_person
+
+    @property
+    def splits(self) -> int:
+        return self.expenses * min(self.participants, self.people // self.clusters)
+
+    @classmethod
+    def for_splits(cls, splits: int, **overrides) -> 'LedgerSpec':
+        """A spec of about `splits` splits, deriving the people count from the other sizes"""
+        spec = cls(**overrides)
+        people = max(spec.participants, splits // (spec.expenses_per_person * spec.participants))
+        return spec._replace(people=people)
+
+
+DEFAULTS = LedgerSpec._field_defaults
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "equal=0.6,exact=0.2,percentage=0.2" into split method weights"""
+    mix = {}
+    for part in value.split(','):
+        method, _, weight = part.partition('=')
+        if method.strip() not in ('equal', 'exact', 'percentage'):
+            raise argparse.ArgumentTypeError(f"unknown split method: {method}")
+        mix[method.strip()] = float(weight)
+    return mix
+
+
+def _cut(rng: random.Random, total: int, parts: int) -> list:
+    """Split a positive integer total into `parts` positive integers summing to it"""
+    cuts = sorted(rng.sample(range(1, total), parts - 1))
+    return [high - low for low, high in zip([0] + cuts, cuts + [total])]
+
+
+def generate_expenses(spec: LedgerSpec) -> Iterator[Dict]:
+    """
+    Yield spec.expenses expense dicts as accepted by POST /api/expenses, each with
+    a "group" index (None for ungrouped) saying which generated group it belongs to.
+    Every person pays spec.expenses_per_person expenses.
+    """
+    rng = random.Random(spec.seed)
+    names = [f"person-{i}" for i in range(spec.people)]
+    cluster_size = spec.people // spec.clusters
+    participants = min(spec.participants, cluster_size)
+    methods, weights = zip(*spec.mix.items())
+
+    for i in range(spec.expenses):
+        payer = i % spec.people
+        paid_by = names[payer]
+        # Participants come from the payer's cluster; the last one takes the leftover people
+        low = min(payer // cluster_size, spec.clusters - 1) * cluster_size
+        high = low + cluster_size if low + cluster_size * 2 <= spec.people else spec.people
+        others = rng.sample(range(high - low - 1), participants - 1)
+        # Shift indexes at or past the payer so the payer is never drawn twice
+        people = [paid_by] + [names[low + j + (j >= payer - low)] for j in others]
+        cents = rng.randint(100 * participants, 50000)
+        method = rng.choices(methods, weights)[0] if participants > 1 else 'equal'
+
+        data = {
+            'amount': f"{cents // 100}.{cents % 100:02d}",
+            'description': rng.choice(DESCRIPTIONS),
+            'paid_by': paid_by,
+            'split_method': method,
+            'group': rng.randrange(spec.groups) if spec.groups and rng.random() < spec.group_share else None,
+        }
+        if method == 'equal':
+            data['participants'] = people
+        elif method == 'exact':
+            data['splits'] = [{'person': name, 'amount': f"{part // 100}.{part % 100:02d}"}
+                              for name, part in zip(people, _cut(rng, cents, participants))]
+        else:
+            # Percentages in hundredths of a percent, summing to exactly 100
+            data['splits'] = [{'person': name, 'percentage': f"{part // 100}.{part % 100:02d}"}
+                              for name, part in zip(people, _cut(rng, 10000, participants))]
+        yield data
+
+
+def seed(spec: LedgerSpec, batch_size: int = SEED_BATCH_SIZE) -> Dict:
+    """
+    Write a generated ledger through bulk_import.insert_expenses, committing per batch.
+    Needs an app context. Returns the row counts and how long the writes took.
+    """
+    from sqlalchemy import insert, select
+
+    from app import db
+    from bulk_import import insert_expenses
+    from models import Group
+
+    if spec.groups:
+        db.session.execute(insert(Group), [{'name': f"group-{i}"} for i in range(spec.groups)])
+        db.session.commit()
+    group_ids = dict(enumerate(db.session.execute(select(Group.id).order_by(Group.id)).scalars()))
+
+    started = time.perf_counter()
+    expenses = 0
+    batch = []
+    for data in generate_expenses(spec):
+        batch.append(data)
+        if len(batch) == batch_size:
+            expenses += _write_batch(batch, group_ids, insert_expenses)
+            db.session.commit()
+            batch = []
+    if batch:
+        expenses += _write_batch(batch, group_ids, insert_expenses)
+        db.session.commit()
+
+    return {'expenses': expenses, 'splits': spec.splits, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def _write_batch(batch, group_ids, insert_expenses) -> int:
+    by_group = {}
+    for data in batch:
+        by_group.setdefault(data.pop('group'), []).append(data)
+    return sum(len(insert_expenses(rows, group_ids.get(group))) for group, rows in by_group.items())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_spec_arguments(parser)
+    parser.add_argument('--people', type=int, default=DEFAULTS['people'])
+    return parser.parse_args(argv)
+
+
+def add_spec_arguments(parser) -> None:
+    """Ledger shape options shared with benchmarks/run.py"""
+    parser.add_argument('--expenses-per-person', type=int, default=DEFAULTS['expenses_per_person'])
+    parser.add_argument('--participants', type=int, default=DEFAULTS['participants'],
+                        help='people sharing each expense, payer included')
+    parser.add_argument('--groups', type=int, default=DEFAULTS['groups'])
+    parser.add_argument('--group-share', type=float, default=DEFAULTS['group_share'],
+                        help='fraction of expenses recorded in a group')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULTS['mix']),
+                        help='split method weights (default: equal=0.6,exact=0.2,percentage=0.2)')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'], help='random seed')
+    parser.add_argument('--clusters', type=int, default=DEFAULTS['clusters'],
+                        help='disjoint circles of people who only share expenses with each other')
+
+
+def spec_from_args(args, **overrides) -> LedgerSpec:
+    return LedgerSpec(expenses_per_person=args.expenses_per_person, participants=args.participants,
+                      groups=args.groups, group_share=args.group_share, mix=args.mix,
+                      seed=args.seed, clusters=args.clusters, **overrides)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit("Set DATABASE_URL to the database to seed")
+
+    from app import app
+
+    spec = spec_from_args(args, people=args.people)
+    with app.app_context():
+        result = seed(spec)
+    print(f"Seeded {result['expenses']} expenses ({result['splits']} splits) in {result['seconds']:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Load test comparing the sync (gunicorn) and async (uvicorn) serving modes
+Hits the read endpoints of one or two running servers with N concurrent
+keep-alive clients for a fixed duration and reports requests per second and
+latency percentiles per endpoint as JSON.
+
+Start both modes against the same database first, for example:
+
+    gunicorn --bind 127.0.0.1:5000 --workers 4 --worker-class gthread --threads 16 main:app
+    uvicorn asgi_app:app --host 127.0.0.1 --port 5001 --workers 4
+
+then run:
+
+    python benchmarks/load_test.py --sync-url http://127.0.0.1:5000 --async-url http://127.0.0.1:5001
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    '/api/balances',
+    '/api/settlements',
+    '/api/expenses?limit=50',
+    '/api/people',
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sync-url', help='base URL of the gunicorn server')
+    parser.add_argument('--async-url', help='base URL of the uvicorn server')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients (default: 32)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint (default: 10)')
+    parser.add_argument('--path', action='append', dest='paths', help='endpoint to hit; repeatable')
+    parser.add_argument('--conditional', action='store_true',
+                        help='send If-None-Match with the last ETag, measuring the 304 path')
+    args = parser.parse_args(argv)
+    if not args.sync_url and not args.async_url:
+        parser.error('give --sync-url, --async-url or both')
+    args.paths = args.paths or DEFAULT_PATHS
+    return args
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _client(base_url, path, deadline, conditional, latencies, errors):
+    """One keep-alive client issuing requests back to back until the deadline"""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    etag = None
+    while time.monotonic() < deadline:
+        headers = {'If-None-Match': etag} if conditional and etag else {}
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+        if response.status >= 400:
+            errors.append(response.status)
+        etag = response.getheader('ETag') or etag
+    conn.close()
+
+
+def run_endpoint(base_url, path, concurrency, duration, conditional):
+    """Hit one endpoint with `concurrency` clients and summarize throughput and latency"""
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=_client, args=(base_url, path, deadline, conditional, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = [(name, url.rstrip('/')) for name, url in (('sync', args.sync_url), ('async', args.async_url)) if url]
+
+    report = {'concurrency': args.concurrency, 'duration': args.duration,
+              'conditional': args.conditional, 'results': {}}
+    for path in args.paths:
+        report['results'][path] = {}
+        for name, url in modes:
+            result = run_endpoint(url, path, args.concurrency, args.duration, args.conditional)
+            report['results'][path][name] = result
+            print(f"{name:5} {path}: {result['rps']} req/s, p50 {result['p50_ms']} ms, "
+                  f"p99 {result['p99_ms']} ms, {result['errors']} errors", file=sys.stderr)
+        if len(modes) == 2 and report['results'][path]['sync']['rps']:
+            report['results'][path]['async_speedup'] = round(
+                report['results'][path]['async']['rps'] / report['results'][path]['sync']['rps'], 2)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
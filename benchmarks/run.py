@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Split App
+Seeds a synthetic ledger at each requested scale (10^3 to 10^6 splits by
+default) with benchmarks/ledger_generator.py, then times:
+
+    bulk_create        writing the ledger through bulk_import.insert_expenses
+    balances           SettlementCalculator.calculate_balances, all people and one group
+    settlements        SettlementCalculator.calculate_settlements (greedy)
+    api_expenses       GET /api/expenses, first page and a page 20 pages deep
+    page_*             the index, expenses and settlements pages, cache cold and warm
+
+and prints the results as JSON. Pass --baseline with an earlier result file
+to compare: any timing slower than baseline by more than --tolerance makes the
+run exit with status 1, so regressions are caught between commits.
+
+Runs against a throwaway SQLite file, or DATABASE_URL with --reset (every
+table in that database is dropped and recreated for each scale):
+
+    python benchmarks/run.py --scales 1000,10000 --output bench.json
+    python benchmarks/run.py --scales 1000,10000 --baseline bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_generator import LedgerSpec, add_spec_arguments, seed, spec_from_args  # noqa: E402
+
+DEFAULT_SCALES = '1000,10000,100000,1000000'
+
+# Keyset pages followed to time a deep page of GET /api/expenses
+DEEP_PAGE = 20
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help=f'split counts (default: {DEFAULT_SCALES})')
+    add_spec_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per measurement (default: 5)')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='slowdown factor over baseline counted as a regression (default: 1.25)')
+    parser.add_argument('--reset', action='store_true', help='allow dropping every table in DATABASE_URL')
+    args = parser.parse_args(argv)
+    args.scales = [int(scale) for scale in args.scales.split(',')]
+    return args
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and summarize the wall times in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def reset_database():
+    """Drop and recreate every table, leaving an empty, migrated database"""
+    from sqlalchemy import text
+
+    import migrations
+    from app import db
+    from balance_ledger import BalanceLedger
+    from person_resolver import PersonResolver
+    from settlement_cache import SettlementCache
+
+    db.session.remove()
+    db.drop_all()
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    db.create_all()
+    migrations.upgrade()
+    BalanceLedger.ensure_initialized()
+    # Ids cached from the previous scale's people no longer exist
+    PersonResolver.invalidate()
+    SettlementCache.clear()
+
+
+def get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return response
+
+
+def deep_cursor(client):
+    """Follow keyset cursors DEEP_PAGE pages into the listing; returns the cursor there"""
+    cursor = None
+    for _ in range(DEEP_PAGE):
+        meta = get(client, f"/api/expenses?limit=50{'&cursor=' + cursor if cursor else ''}").get_json()['meta']
+        if not meta['next_cursor']:
+            break
+        cursor = meta['next_cursor']
+    return cursor
+
+
+def run_scale(app, spec, repeat):
+    """Seed one ledger and time every benchmark against it"""
+    from app import db
+    from settlement_cache import SettlementCache
+    from settlement_calculator import SettlementCalculator
+
+    with app.app_context():
+        reset_database()
+        seeded = seed(spec)
+
+    results = {'bulk_create': {'ms': round(seeded['seconds'] * 1000, 3),
+                               'expenses_per_s': round(seeded['expenses'] / seeded['seconds'], 1)}}
+    with app.app_context():
+        results['balances'] = timed(lambda: SettlementCalculator.calculate_balances(), repeat)
+        if spec.groups:
+            results['balances_group'] = timed(lambda: SettlementCalculator.calculate_balances(1), repeat)
+        results['settlements'] = timed(lambda: SettlementCalculator.calculate_settlements('greedy'), repeat)
+        db.session.remove()
+
+    client = app.test_client()
+    cursor = deep_cursor(client)
+    results['api_expenses'] = timed(lambda: get(client, '/api/expenses?limit=50'), repeat)
+    if cursor:
+        results['api_expenses_deep'] = timed(lambda: get(client, f'/api/expenses?limit=50&cursor={cursor}'), repeat)
+
+    for name, url in (('index', '/'), ('expenses', '/expenses'), ('settlements', '/settlements')):
+        def cold(url=url):
+            SettlementCache.clear()
+            get(client, url)
+        results[f'page_{name}_cold'] = timed(cold, repeat)
+        results[f'page_{name}_warm'] = timed(lambda url=url: get(client, url), repeat)
+
+    return {'spec': dict(spec._asdict(), expenses=spec.expenses, splits=spec.splits), 'results': results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(report, baseline, tolerance):
+    """Return (scale, benchmark, baseline_ms, current_ms) for timings slower than baseline * tolerance"""
+    slower = []
+    previous = {str(scale['spec']['splits']): scale['results'] for scale in baseline['scales']}
+    for scale in report['scales']:
+        for name, timing in scale['results'].items():
+            before = previous.get(str(scale['spec']['splits']), {}).get(name)
+            key = 'median_ms' if 'median_ms' in timing else 'ms'
+            if before and key in before and timing[key] > before[key] * tolerance:
+                slower.append((scale['spec']['splits'], name, before[key], timing[key]))
+    return slower
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if os.environ.get('DATABASE_URL') and not args.reset:
+        sys.exit("DATABASE_URL is set: pass --reset to let the benchmark drop and recreate its tables")
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='split-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    from app import app, db
+
+    # Per-request debug logging would dominate the request timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with app.app_context():
+        database = db.engine.dialect.name
+
+    report = {
+        'revision': git_revision(),
+        'started_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': database,
+        'repeat': args.repeat,
+        'scales': [],
+    }
+    for splits in args.scales:
+        spec = LedgerSpec.for_splits(splits, **spec_from_args(args)._asdict())
+        print(f"Benchmarking {spec.splits} splits ({spec.people} people, {spec.expenses} expenses)",
+              file=sys.stderr)
+        report['scales'].append(run_scale(app, spec, args.repeat))
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(report, json.load(f), args.tolerance)
+        for splits, name, before, after in slower:
+            print(f"✗ {name} at {splits} splits: {before:.1f} ms -> {after:.1f} ms", file=sys.stderr)
+        if slower:
+            return 1
+        print(f"✓ No timing more than {args.tolerance}x slower than {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
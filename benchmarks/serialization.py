@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for Split App expense listings
+Seeds a synthetic ledger (100k splits by default) and times building and
+encoding a page of GET /api/expenses three ways:
+
+    orm_jsonify     ORM objects -> Expense.to_dict -> Flask jsonify (the old path)
+    rows_json       selected rows -> serializers.expense_dicts -> stdlib json
+    rows_orjson     the same rows encoded with orjson, when it is installed
+
+Each is timed end to end (query, build, encode) for several page sizes and
+with money as numbers and as strings, and the results are printed as JSON:
+
+    python benchmarks/serialization.py --splits 100000 --page-sizes 50,200,500
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_generator import LedgerSpec, add_spec_arguments, seed, spec_from_args  # noqa: E402
+from run import reset_database, timed  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--splits', type=int, default=100000, help='ledger size in splits (default: 100000)')
+    parser.add_argument('--page-sizes', default='50,200,500', help='listing page sizes (default: 50,200,500)')
+    add_spec_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=10, help='timed runs per measurement (default: 10)')
+    parser.add_argument('--reset', action='store_true', help='allow dropping every table in DATABASE_URL')
+    args = parser.parse_args(argv)
+    args.page_sizes = [int(size) for size in args.page_sizes.split(',')]
+    return args
+
+
+def encoders():
+    """The (name, encode) pairs to time the row path with"""
+    import serializers
+
+    def stdlib(obj):
+        return (json.dumps(obj, default=serializers._default, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+    pairs = [('rows_json', stdlib)]
+    if serializers.orjson is not None:
+        pairs.append(('rows_orjson', serializers.dumps))
+    return pairs
+
+
+def run_page_size(limit, repeat):
+    """Time every path for one page size; needs an app context"""
+    from flask import jsonify
+
+    from app import db
+    from expense_listing import fetch_expense_dicts, fetch_expense_page
+
+    def orm_jsonify():
+        expenses, _ = fetch_expense_page(limit=limit)
+        body = jsonify([expense.to_dict() for expense in expenses]).get_data()
+        db.session.remove()
+        return body
+
+    results = {'orm_jsonify': timed(orm_jsonify, repeat)}
+    for name, encode in encoders():
+        for money in ('number', 'string'):
+            def rows(encode=encode, money=money):
+                expenses, _ = fetch_expense_dicts(limit=limit, money=money)
+                body = encode(expenses)
+                db.session.remove()
+                return body
+            results[name if money == 'number' else f'{name}_money_string'] = timed(rows, repeat)
+
+    results['bytes'] = len(orm_jsonify())
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if os.environ.get('DATABASE_URL') and not args.reset:
+        sys.exit("DATABASE_URL is set: pass --reset to let the benchmark drop and recreate its tables")
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='split-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    from app import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = LedgerSpec.for_splits(args.splits, **spec_from_args(args)._asdict())
+    print(f"Seeding {spec.splits} splits ({spec.expenses} expenses)", file=sys.stderr)
+    report = {'spec': dict(spec._asdict(), expenses=spec.expenses, splits=spec.splits),
+              'repeat': args.repeat, 'page_sizes': {}}
+    with app.app_context():
+        reset_database()
+        seed(spec)
+        for limit in args.page_sizes:
+            report['page_sizes'][str(limit)] = run_page_size(limit, args.repeat)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark for settling debt graph components in parallel
+Generates zero-sum components of random cent balances and times
+settlement_solver.solve_components with 1, 2, 4, ... worker processes in
+greedy and optimal mode. Results must match the single-process run exactly.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settlement_solver  # noqa: E402
+
+
+def generate_components(count, size, seed):
+    """`count` components of `size` people whose cent balances each sum to zero"""
+    rng = random.Random(seed)
+    components = []
+    for c in range(count):
+        cents = [rng.randint(-50000, 50000) for _ in range(size - 1)]
+        cents.append(-sum(cents))
+        components.append([(f"person-{c}-{i}", amount) for i, amount in enumerate(cents)])
+    return components
+
+
+def worker_counts(limit):
+    counts, workers = [], 1
+    while workers < limit:
+        counts.append(workers)
+        workers *= 2
+    return counts + [limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel settlement of debt graph components")
+    parser.add_argument('--components', type=int, default=2000, help='components per run (default: 2000)')
+    parser.add_argument('--size', type=int, default=12, help='people per component (default: 12)')
+    parser.add_argument('--modes', nargs='+', default=['greedy', 'optimal'], choices=['greedy', 'optimal'])
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    components = generate_components(args.components, args.size, args.seed)
+    print(f"{args.components} components of {args.size} people, {os.cpu_count()} CPUs")
+    print(f"{'mode':>8} {'workers':>8} {'seconds':>9} {'speedup':>8} {'transfers':>10}")
+    for mode in args.modes:
+        baseline, expected = None, None
+        for workers in worker_counts(args.max_workers):
+            # Warm the pool so process start-up is not timed
+            settlement_solver.solve_components(components[:2], mode, time.time() + 60, workers)
+            start = time.perf_counter()
+            solved = settlement_solver.solve_components(components, mode, time.time() + 600, workers)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                baseline, expected = elapsed, solved
+            elif solved != expected:
+                sys.exit(f"✗ {mode} with {workers} workers differs from the single-process result")
+            transfers = sum(len(transfers) for transfers, _, _ in solved)
+            print(f"{mode:>8} {workers:>8} {elapsed:>9.3f} {baseline / elapsed:>7.1f}x {transfers:>10}")
+            # The pool keeps its size, so start the next worker count afresh
+            settlement_solver.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the greedy settlement core
+Compares the integer-cent heap matcher with the original sorted Decimal loop
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app  # noqa: F401,E402  (initializes models before the calculator import)
+from settlement_calculator import SettlementCalculator  # noqa: E402
+
+
+def legacy_settlements(balances):
+    """The pre-heap greedy loop: float balances round-tripped through Decimal(str(...))"""
+    creditors = []
+    debtors = []
+    for name, balance in balances.items():
+        balance = Decimal(str(balance)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        if balance > 0:
+            creditors.append({'name': name, 'amount': balance})
+        elif balance < 0:
+            debtors.append({'name': name, 'amount': abs(balance)})
+
+    settlements = []
+    creditors.sort(key=lambda x: x['amount'], reverse=True)
+    debtors.sort(key=lambda x: x['amount'], reverse=True)
+
+    i, j = 0, 0
+    while i < len(creditors) and j < len(debtors):
+        creditor = creditors[i]
+        debtor = debtors[j]
+        settlement_amount = min(creditor['amount'], debtor['amount'])
+        if settlement_amount > Decimal('0.01'):
+            settlements.append({'from': debtor['name'], 'to': creditor['name'],
+                                'amount': float(settlement_amount)})
+            creditor['amount'] -= settlement_amount
+            debtor['amount'] -= settlement_amount
+        if creditor['amount'] <= Decimal('0.01'):
+            i += 1
+        if debtor['amount'] <= Decimal('0.01'):
+            j += 1
+    return settlements
+
+
+def generate_balances(people, seed):
+    """Random cent balances for `people` participants that sum to exactly zero"""
+    rng = random.Random(seed)
+    cents = [rng.randint(-500000, 500000) for _ in range(people - 1)]
+    cents.append(-sum(cents))
+    return [(f"person-{i}", amount) for i, amount in enumerate(cents)]
+
+
+def best_of(repeat, func, *args):
+    """Return (best wall time in seconds, last result) over `repeat` runs"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark greedy settlement implementations")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'people':>8} {'legacy s':>10} {'heap s':>10} {'speedup':>8} {'legacy residual':>16} {'heap residual':>14}")
+    for size in args.sizes:
+        balances = generate_balances(size, args.seed)
+        as_floats = {name: cents / 100 for name, cents in balances}
+
+        legacy_time, legacy = best_of(args.repeat, legacy_settlements, as_floats)
+        heap_time, heap = best_of(args.repeat, SettlementCalculator.settle_cents, balances)
+
+        # Residual: how far each solution leaves balances from fully settled, in cents
+        legacy_paid = sum(round(s['amount'] * 100) for s in legacy)
+        heap_paid = sum(cents for _, _, cents in heap)
+        owed = sum(cents for _, cents in balances if cents > 0)
+
+        print(f"{size:>8} {legacy_time:>10.4f} {heap_time:>10.4f} {legacy_time / heap_time:>7.1f}x "
+              f"{owed - legacy_paid:>16} {owed - heap_paid:>14}")
+
+
+if __name__ == "__main__":
+    main()
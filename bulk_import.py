@@ -0,0 +1,150 @@
+"""
+Bulk expense import for Split App
+Reads JSON array, NDJSON and CSV request bodies into expense rows and inserts
+all valid rows in one transaction with batched (executemany) statements.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app import db
+from balance_ledger import BalanceLedger
+from ledger_events import LedgerEvents
+from models import Expense, ExpenseSplit, LedgerEventKind, SplitMethod
+from expense_service import ExpenseService
+from person_resolver import PersonResolver
+
+MAX_BULK_ROWS = 100000
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+
+# CSV cells holding lists: participants as "A;B;C", splits as "A:30;B:70"
+CSV_LIST_SEPARATOR = ';'
+CSV_PAIR_SEPARATOR = ':'
+
+
+def _csv_row_to_expense(row: Dict[str, str]) -> Dict:
+    """Convert a CSV record into the JSON shape accepted by POST /api/expenses"""
+    data = {key.strip(): value.strip() for key, value in row.items()
+            if key and value is not None and value.strip()}
+
+    if 'participants' in data:
+        data['participants'] = [name.strip() for name in data['participants'].split(CSV_LIST_SEPARATOR)
+                                if name.strip()]
+
+    if 'splits' in data:
+        value_key = 'percentage' if data.get('split_method') == 'percentage' else 'amount'
+        splits = []
+        for pair in data['splits'].split(CSV_LIST_SEPARATOR):
+            if not pair.strip():
+                continue
+            person, _, value = pair.rpartition(CSV_PAIR_SEPARATOR)
+            splits.append({'person': person.strip(), value_key: value.strip()})
+        data['splits'] = splits
+
+    return data
+
+
+def read_bulk_rows(req) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Read expense rows from a request body as (data, parse_error) pairs.
+    NDJSON and CSV bodies are read line by line from the request stream; a JSON
+    body must be an array or an object with an "expenses" array.
+    Raises ValueError when the body as a whole cannot be read.
+    """
+    rows = []
+
+    if req.mimetype in NDJSON_MIMETYPES:
+        for line in io.TextIOWrapper(req.stream, encoding='utf-8'):
+            if not line.strip():
+                continue
+            try:
+                rows.append((json.loads(line), None))
+            except json.JSONDecodeError as e:
+                rows.append((None, f"Invalid JSON: {e.msg}"))
+            if len(rows) > MAX_BULK_ROWS:
+                break
+        return rows
+
+    if req.mimetype in CSV_MIMETYPES:
+        reader = csv.DictReader(io.TextIOWrapper(req.stream, encoding='utf-8', newline=''))
+        for record in reader:
+            rows.append((_csv_row_to_expense(record), None))
+            if len(rows) > MAX_BULK_ROWS:
+                break
+        return rows
+
+    body = req.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get('expenses')
+    if not isinstance(body, list):
+        raise ValueError("Request body must be a JSON array of expenses, NDJSON or CSV")
+    return [(item, None) for item in body]
+
+
+def insert_expenses(rows: List[Dict], group_id: Optional[int] = None) -> List[int]:
+    """
+    Insert validated expense rows with their splits and return the new expense ids in order.
+    People are resolved in one pass, expenses and splits are each written with one
+    executemany, and the balance ledger receives one merged set of deltas.
+    The caller commits.
+    """
+    if not rows:
+        return []
+
+    prepared = []
+    names = set()
+    for data in rows:
+        amount = Decimal(str(data['amount']))
+        paid_by = data['paid_by'].strip()
+        splits = ExpenseService.split_rows(data, amount, paid_by)
+        names.add(paid_by)
+        names.update(name for name, _, _ in splits)
+        prepared.append((data, amount, paid_by, splits))
+
+    person_ids = PersonResolver.resolve_ids(names)
+
+    expense_ids = db.session.execute(
+        insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+        [
+            {
+                'amount': amount,
+                'description': data['description'].strip(),
+                'paid_by_id': person_ids[paid_by],
+                'group_id': group_id,
+                'split_method': SplitMethod(data.get('split_method', 'equal')),
+            }
+            for data, amount, paid_by, _ in prepared
+        ]
+    ).scalars().all()
+
+    split_rows = []
+    deltas = []
+    links = []
+    events = []
+    for expense_id, (_, amount, paid_by, splits) in zip(expense_ids, prepared):
+        expense_deltas = [(person_ids[paid_by], amount, Decimal('0'))]
+        links.append([person_ids[paid_by]] + [person_ids[name] for name, _, _ in splits])
+        for name, split_amount, percentage in splits:
+            split_rows.append({
+                'expense_id': expense_id,
+                'person_id': person_ids[name],
+                'group_id': group_id,
+                'amount': split_amount,
+                'percentage': percentage,
+            })
+            expense_deltas.append((person_ids[name], Decimal('0'), split_amount))
+        deltas.extend(expense_deltas)
+        events.append((expense_id, group_id, expense_deltas))
+
+    db.session.execute(insert(ExpenseSplit), split_rows)
+    BalanceLedger.apply(deltas)
+    BalanceLedger.link(links)
+    LedgerEvents.record_many(LedgerEventKind.CREATED, events)
+    return list(expense_ids)
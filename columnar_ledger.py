@@ -0,0 +1,147 @@
+"""
+Columnar balance engine for Split App
+Loads expenses and expense_splits, with payments and carried balances as
+pseudo-expenses, as integer-cent NumPy arrays and computes
+per-person totals with np.bincount and the pairwise "who owes whom" matrix in
+bulk, instead of aggregating in SQL. Enabled with BALANCE_ENGINE=numpy; NumPy
+is optional and the SQL engine is used when it is not installed. Both engines
+agree to the cent.
+"""
+
+import logging
+import os
+from itertools import chain
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import BigInteger, cast, func, select, union_all
+
+from models import CarriedBalance, Expense, ExpenseSplit, Payment
+
+try:
+    import numpy as np
+except ImportError:  # Optional columnar engine
+    np = None
+
+# Accepted values of BALANCE_ENGINE
+BALANCE_ENGINES = ('sql', 'numpy')
+
+
+def configured_engine() -> str:
+    """Return the balance engine in use, falling back to sql when NumPy is missing"""
+    engine = os.environ.get('BALANCE_ENGINE', 'sql').lower()
+    if engine not in BALANCE_ENGINES:
+        raise ValueError(f"BALANCE_ENGINE must be one of: {', '.join(BALANCE_ENGINES)}")
+    if engine == 'numpy' and np is None:
+        logging.warning("BALANCE_ENGINE=numpy but NumPy is not installed; using the sql engine")
+        return 'sql'
+    return engine
+
+
+def cents(column):
+    """SQL expression converting a 2-decimal money column to integer cents"""
+    return cast(func.round(column * 100), BigInteger)
+
+
+def integer_columns(statement, width: int):
+    """Run an all-integer select of `width` columns and return them as int64 arrays"""
+    from app import db
+
+    # Executed through the session's connection so instrumentation still sees it, but
+    # fetched straight from the DBAPI cursor: building a Row per record costs more
+    # than the query itself
+    result = db.session.connection().execute(statement)
+    try:
+        flat = np.fromiter(chain.from_iterable(result.cursor.fetchall()), dtype=np.int64)
+    finally:
+        result.close()
+    return flat.reshape(-1, width).T
+
+
+def _exact(sums):
+    """bincount sums float64 weights; integer cents below 2**53 add up exactly"""
+    return np.rint(sums).astype(np.int64)
+
+
+class LedgerSnapshot(NamedTuple):
+    """Expenses and splits as parallel int64 arrays, expenses sorted by id"""
+    expense_ids: 'np.ndarray'
+    payer_ids: 'np.ndarray'
+    expense_cents: 'np.ndarray'
+    split_expense_ids: 'np.ndarray'
+    split_person_ids: 'np.ndarray'
+    split_cents: 'np.ndarray'
+
+    @classmethod
+    def load(cls, group_id: Optional[int] = None) -> 'LedgerSnapshot':
+        """Read the whole ledger, or one group's, in three queries"""
+        expenses = select(Expense.id, Expense.paid_by_id, cents(Expense.amount)).order_by(Expense.id)
+        splits = select(ExpenseSplit.expense_id, ExpenseSplit.person_id, cents(ExpenseSplit.amount))
+        if group_id is not None:
+            expenses = expenses.where(Expense.group_id == group_id)
+            splits = splits.where(ExpenseSplit.group_id == group_id)
+
+        return cls(*integer_columns(expenses, 3), *integer_columns(splits, 3)).with_side_ledger(group_id)
+
+    def with_side_ledger(self, group_id: Optional[int] = None) -> 'LedgerSnapshot':
+        """
+        Prepend payments and, for the whole ledger, carried balances, read in one
+        query, as pseudo-expenses with negative ids: a payment is paid by its payer
+        and shared by its payee, so the payee owes it back; a carried balance is
+        paid and shared by its own person.
+        """
+        side = select(Payment.payer_id, Payment.payee_id, cents(Payment.amount), cents(Payment.amount))
+        if group_id is None:
+            side = union_all(side, select(CarriedBalance.person_id, CarriedBalance.person_id,
+                                          cents(CarriedBalance.total_paid), cents(CarriedBalance.fair_share)))
+        else:
+            side = side.where(Payment.group_id == group_id)
+
+        payers, sharers, paid, shared = integer_columns(side, 4)
+        if not len(payers):
+            return self
+        ids = np.arange(-len(payers), 0, dtype=np.int64)
+        return LedgerSnapshot(*(np.concatenate(pair) for pair in zip(
+            (ids, payers, paid, ids, sharers, shared), self
+        )))
+
+    @property
+    def size(self) -> int:
+        """One more than the largest person id, the length of per-person arrays"""
+        ids = [int(ids.max()) for ids in (self.payer_ids, self.split_person_ids) if len(ids)]
+        return max(ids, default=-1) + 1
+
+    def totals(self) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        Return (person_ids, paid_cents, share_cents) for everyone who paid or shared
+        an expense, ordered by person id.
+        """
+        size = self.size
+        paid = _exact(np.bincount(self.payer_ids, weights=self.expense_cents, minlength=size))
+        share = _exact(np.bincount(self.split_person_ids, weights=self.split_cents, minlength=size))
+        people = np.union1d(self.payer_ids, self.split_person_ids)
+        return people, paid[people], share[people]
+
+    def pairwise(self) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        Return the sparse net debt matrix as (debtor_ids, creditor_ids, cents) arrays.
+        Every split owes its expense's payer; debts between the same two people in
+        opposite directions cancel, leaving at most one entry per pair, ordered by
+        debtor then creditor id.
+        """
+        size = self.size
+        creditors = self.payer_ids[np.searchsorted(self.expense_ids, self.split_expense_ids)]
+        owing = self.split_person_ids != creditors
+        debtors, creditors, amounts = self.split_person_ids[owing], creditors[owing], self.split_cents[owing]
+
+        # Key each debt by its unordered pair, signed positive when the smaller id owes
+        low, high = np.minimum(debtors, creditors), np.maximum(debtors, creditors)
+        signed = np.where(debtors == low, amounts, -amounts)
+        pairs, index = np.unique(low * size + high, return_inverse=True)
+        net = _exact(np.bincount(index, weights=signed, minlength=len(pairs)))
+
+        owed = net != 0
+        pairs, net = pairs[owed], net[owed]
+        low, high = pairs // size, pairs % size
+        debtors, creditors = np.where(net > 0, low, high), np.where(net > 0, high, low)
+        order = np.lexsort((creditors, debtors))
+        return debtors[order], creditors[order], np.abs(net)[order]
@@ -0,0 +1,119 @@
+"""
+Dashboard summary for Split App
+The home page figures (counts, total spent, top creditors and debtors and
+recent activity) are computed from the balance ledger with a few bounded
+queries and cached under the ledger version, so a page view normally costs
+one version lookup whatever the size of the data.
+"""
+
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from app import db
+from balance_ledger import BalanceLedger
+from models import Expense, ExpenseArchive, Payment, PaymentArchive, Person, PersonBalance
+from settlement_cache import SettlementCache
+
+# People listed on each side of the balance board
+TOP_BALANCES = 5
+
+# Recent expenses listed
+RECENT_EXPENSES = 5
+
+# Summaries are recomputed after this long even without a ledger write, which
+# bounds staleness when rows are changed outside the app
+DASHBOARD_TTL = 60  # seconds
+
+DASHBOARD_CACHE_KEY = 'dashboard'
+
+
+def _balance_entry(name, total_paid, fair_share) -> Dict:
+    """Same shape as the entries of SettlementCalculator.calculate_balances"""
+    return {
+        'name': name,
+        'total_paid': float(total_paid),
+        'fair_share': float(fair_share),
+        'balance': float(total_paid - fair_share)
+    }
+
+
+class DashboardSummary:
+    """Builds and caches the figures shown on the dashboard"""
+
+    @staticmethod
+    def get(version: Optional[int] = None) -> Dict:
+        """Return the dashboard summary at the current ledger version, computing it on a miss"""
+        if version is None:
+            version = BalanceLedger.version()
+
+        summary = SettlementCache.lookup(DASHBOARD_CACHE_KEY, version)
+        if summary is None or time.time() - summary['computed_at'] > DASHBOARD_TTL:
+            summary = DashboardSummary.compute()
+            SettlementCache.store(DASHBOARD_CACHE_KEY, version, summary)
+        return summary
+
+    @staticmethod
+    def compute() -> Dict:
+        """
+        Read the summary straight from the database: one query for the counts and
+        total spent, one per side of the balance board and one for recent expenses.
+        Payments count toward total_paid in the ledger but are not spending, so
+        every payment ever made, archived ones included, is taken back out.
+        Archived expenses are counted too, as total spent still includes them.
+        """
+        total_people, total_expenses, total_paid, total_repaid = db.session.execute(select(
+            select(func.count()).select_from(Person).scalar_subquery(),
+            select(func.count()).select_from(Expense).scalar_subquery()
+            + select(func.count()).select_from(ExpenseArchive).scalar_subquery(),
+            select(func.coalesce(func.sum(PersonBalance.total_paid), 0)).scalar_subquery(),
+            select(func.coalesce(func.sum(Payment.amount), 0)).scalar_subquery()
+            + select(func.coalesce(func.sum(PaymentArchive.amount), 0)).scalar_subquery(),
+        )).one()
+        total_spent = Decimal(str(total_paid)) - Decimal(str(total_repaid))
+
+        return {
+            'total_people': total_people,
+            'total_expenses': total_expenses,
+            'total_spent': float(total_spent),
+            'top_creditors': DashboardSummary.top_balances(creditors=True),
+            'top_debtors': DashboardSummary.top_balances(creditors=False),
+            'recent_expenses': DashboardSummary.recent_expenses(),
+            'computed_at': time.time(),
+        }
+
+    @staticmethod
+    def top_balances(creditors: bool = True, limit: int = TOP_BALANCES) -> List[Dict]:
+        """The people owed the most (creditors) or owing the most, largest first"""
+        balance = PersonBalance.total_paid - PersonBalance.fair_share
+        query = (
+            select(Person.name, PersonBalance.total_paid, PersonBalance.fair_share)
+            .join(PersonBalance, PersonBalance.person_id == Person.id)
+            .where(balance > 0 if creditors else balance < 0)
+            .order_by(balance.desc() if creditors else balance.asc(), Person.id)
+            .limit(limit)
+        )
+        return [_balance_entry(name, Decimal(str(paid)), Decimal(str(share)))
+                for name, paid, share in db.session.execute(query)]
+
+    @staticmethod
+    def recent_expenses(limit: int = RECENT_EXPENSES) -> List[Dict]:
+        """The newest expenses with their payer's name, read with one join"""
+        query = (
+            select(Expense.id, Expense.description, Expense.amount, Expense.created_at, Person.name)
+            .join(Person, Person.id == Expense.paid_by_id)
+            .order_by(Expense.created_at.desc(), Expense.id.desc())
+            .limit(limit)
+        )
+        return [
+            {
+                'id': expense_id,
+                'description': description,
+                'amount': float(amount),
+                'paid_by': payer,
+                'created_at': created_at.isoformat() if created_at else None
+            }
+            for expense_id, description, amount, created_at, payer in db.session.execute(query)
+        ]
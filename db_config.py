@@ -0,0 +1,104 @@
+"""
+Database engine configuration for Split App
+Pool sizing, the liveness check strategy and the statement timeout are read
+from the environment so they can be tuned per deployment:
+
+    DB_POOL_SIZE              connections kept open per process (default 5)
+    DB_MAX_OVERFLOW           extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT           seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE           seconds before a connection is replaced (default 300)
+    DB_PRE_PING               always | idle | never (default idle)
+    DB_PRE_PING_IDLE_SECONDS  idle time after which "idle" pings on checkout (default 30)
+    DB_STATEMENT_TIMEOUT_MS   PostgreSQL statement_timeout, 0 to disable (default 0)
+
+"always" pings on every checkout, which costs a round trip per request; "idle"
+only pings connections that sat unused long enough to have been dropped.
+"""
+
+import logging
+import os
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+
+from db_instrumentation import TimedAsyncQueuePool, TimedQueuePool
+
+PRE_PING_STRATEGIES = ('always', 'idle', 'never')
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def pre_ping_strategy() -> str:
+    strategy = os.environ.get('DB_PRE_PING', 'idle').lower()
+    if strategy not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_PRE_PING must be one of: {', '.join(PRE_PING_STRATEGIES)}")
+    return strategy
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def _statement_timeout_args(url, timeout_ms: int):
+    """connect_args setting statement_timeout for the PostgreSQL drivers; other databases have none"""
+    if not timeout_ms or url.get_backend_name() != 'postgresql':
+        return {}
+    if url.get_driver_name() == 'asyncpg':
+        return {'server_settings': {'statement_timeout': str(timeout_ms)}}
+    return {'options': f"-c statement_timeout={timeout_ms}"}
+
+
+def engine_options(database_url=None):
+    """Return create_engine keyword arguments for DATABASE_URL from the environment"""
+    options = {
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': pre_ping_strategy() == 'always',
+    }
+    if not database_url:
+        return options
+
+    url = make_url(database_url)
+    # In-memory SQLite keeps a single connection per thread; there is no pool to size
+    if not _is_memory_sqlite(url):
+        options.update({
+            'poolclass': TimedAsyncQueuePool if url.get_dialect().is_async else TimedQueuePool,
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        })
+
+    connect_args = _statement_timeout_args(url, _env_int('DB_STATEMENT_TIMEOUT_MS', 0))
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def install_idle_ping(engine) -> None:
+    """
+    With DB_PRE_PING=idle, ping a connection on checkout only when it has been
+    idle in the pool for longer than DB_PRE_PING_IDLE_SECONDS. A failed ping
+    makes the pool discard it and hand out a fresh connection instead.
+    """
+    if pre_ping_strategy() != 'idle':
+        return
+    idle_seconds = _env_int('DB_PRE_PING_IDLE_SECONDS', 30)
+
+    @event.listens_for(engine, 'checkin')
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    @event.listens_for(engine, 'checkout')
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.pop('checked_in_at', None)
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            logging.warning(f"Discarding stale database connection: {str(e)}")
+            raise exc.DisconnectionError() from e
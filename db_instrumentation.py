@@ -0,0 +1,157 @@
+"""
+Per-request database instrumentation for Split App
+Counts the queries a request runs, the time spent executing them and the time
+spent waiting for a pooled connection, then reports them in a Server-Timing
+header and a debug log line. A request running more than DB_QUERY_WARN_THRESHOLD
+queries is logged as a warning, which is how N+1 loads in to_dict() chains show up.
+"""
+
+import contextvars
+import logging
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Requests running more queries than this are logged as warnings
+QUERY_WARN_THRESHOLD = int(os.environ.get('DB_QUERY_WARN_THRESHOLD', 50))
+
+
+class RequestStats:
+    """Database work done while serving one request"""
+
+    __slots__ = ('queries', 'db_time', 'pool_wait', 'started')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.started = time.perf_counter()
+
+    def server_timing(self) -> str:
+        """Format the stats as a Server-Timing header value, durations in milliseconds"""
+        total = time.perf_counter() - self.started
+        return (f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+                f'db-pool;dur={self.pool_wait * 1000:.2f}, '
+                f'app;dur={total * 1000:.2f}')
+
+    def log(self, method: str, path: str) -> None:
+        summary = (f"{method} {path}: {self.queries} queries, {self.db_time * 1000:.1f} ms in database, "
+                   f"{self.pool_wait * 1000:.1f} ms waiting for a connection")
+        if self.queries > QUERY_WARN_THRESHOLD:
+            logging.warning(f"Query count above {QUERY_WARN_THRESHOLD}, {summary}")
+        else:
+            logging.debug(summary)
+
+
+# Stats of the request being served in this thread or task; None outside requests
+_current = contextvars.ContextVar('db_request_stats', default=None)
+
+
+def start_request():
+    """Start collecting stats for the current request; returns a token for end_request"""
+    return _current.set(RequestStats())
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+
+class _TimedCheckout:
+    """Pool mixin adding the time spent getting a connection to the request's pool wait"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - started
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def init_app(app) -> None:
+    """Collect stats for every Flask request and report them on the response"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_db_stats():
+        g.db_stats_token = start_request()
+
+    @app.after_request
+    def _report_db_stats(response):
+        stats = current_stats()
+        if stats is not None:
+            response.headers['Server-Timing'] = stats.server_timing()
+            stats.log(request.method, request.path)
+        return response
+
+    @app.teardown_request
+    def _end_db_stats(exc):
+        token = g.pop('db_stats_token', None)
+        if token is not None:
+            end_request(token)
+
+
+class ServerTimingMiddleware:
+    """ASGI counterpart of init_app for the routes served natively by asgi_app"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        token = start_request()
+        stats = current_stats()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                # Routes handed to Flask already carry their own header
+                if not any(name.lower() == b'server-timing' for name, _ in headers):
+                    headers.append((b'server-timing', stats.server_timing().encode()))
+                    stats.log(scope['method'], scope['path'])
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request(token)
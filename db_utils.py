@@ -0,0 +1,20 @@
+"""
+Database helpers shared across Split App modules
+"""
+
+from app import db
+
+
+def dialect_insert(model):
+    """
+    Return an INSERT for model that supports on_conflict_do_nothing/on_conflict_do_update,
+    or None when the connected database has no ON CONFLICT support.
+    """
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
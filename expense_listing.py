@@ -0,0 +1,217 @@
+"""
+Keyset-paginated expense listing shared by the API and web routes
+Pages are ordered newest first on (created_at, id). The web pages load Expense
+objects with every relationship they need eager-loaded; the API reads plain
+rows instead, so a page costs at most two queries either way.
+"""
+
+import base64
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import aliased, joinedload, selectinload
+
+from models import Expense, ExpenseSplit, Person
+from serializers import MONEY_FORMATS, expense_dicts, split_dicts
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Fields accepted by fields=; splits and paid_by are only loaded when requested
+EXPENSE_FIELDS = (
+    'id', 'amount', 'description', 'paid_by', 'paid_by_id', 'group_id',
+    'split_method', 'created_at', 'updated_at', 'splits'
+)
+
+
+def encode_cursor(expense) -> str:
+    """Encode the (created_at, id) position of an expense (or expense row) as an opaque cursor"""
+    raw = f"{expense.created_at.isoformat()}|{expense.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, expense_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(expense_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("cursor is invalid")
+
+
+def _parse_datetime(value: str, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+
+
+def _parse_amount(value: str, name: str) -> Decimal:
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a valid number")
+
+
+def parse_listing_args(args) -> Dict:
+    """
+    Turn query string arguments into listing options.
+    Raises ValueError with a client-facing message on invalid input.
+    """
+    options = {'limit': DEFAULT_PAGE_SIZE, 'fields': None, 'cursor': None, 'money': 'number'}
+
+    if args.get('limit'):
+        try:
+            options['limit'] = int(args['limit'])
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= options['limit'] <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    if args.get('cursor'):
+        options['cursor'] = decode_cursor(args['cursor'])
+
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in EXPENSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        options['fields'] = fields
+
+    if args.get('money'):
+        if args['money'] not in MONEY_FORMATS:
+            raise ValueError(f"money must be one of: {', '.join(MONEY_FORMATS)}")
+        options['money'] = args['money']
+
+    for name in ('paid_by', 'participant'):
+        if args.get(name):
+            options[name] = args[name].strip()
+    if args.get('start_date'):
+        options['start_date'] = _parse_datetime(args['start_date'], 'start_date')
+    if args.get('end_date'):
+        # Stored as an exclusive bound: a bare date covers that whole day
+        end_date = _parse_datetime(args['end_date'], 'end_date')
+        is_date_only = len(args['end_date']) == 10
+        options['end_date'] = end_date + (timedelta(days=1) if is_date_only else timedelta(microseconds=1))
+    for name in ('min_amount', 'max_amount'):
+        if args.get(name):
+            options[name] = _parse_amount(args[name], name)
+
+    return options
+
+
+def expense_page_query(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[datetime, int]] = None,
+                       group_id: Optional[int] = None, **filters):
+    """
+    Build the query for one page of expenses, newest first, with one extra row to detect a next page.
+    Filters: paid_by and participant (person names), start_date (inclusive) and end_date
+    (exclusive) created_at bounds, and min_amount/max_amount.
+    """
+    query = select(Expense)
+
+    if group_id is not None:
+        query = query.where(Expense.group_id == group_id)
+    if filters.get('paid_by'):
+        payer_id = select(Person.id).where(Person.name == filters['paid_by']).scalar_subquery()
+        query = query.where(Expense.paid_by_id == payer_id)
+    if filters.get('participant'):
+        participant_id = select(Person.id).where(Person.name == filters['participant']).scalar_subquery()
+        query = query.where(Expense.splits.any(ExpenseSplit.person_id == participant_id))
+    if filters.get('start_date'):
+        query = query.where(Expense.created_at >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.where(Expense.created_at < filters['end_date'])
+    if filters.get('min_amount') is not None:
+        query = query.where(Expense.amount >= filters['min_amount'])
+    if filters.get('max_amount') is not None:
+        query = query.where(Expense.amount <= filters['max_amount'])
+
+    if cursor is not None:
+        created_at, expense_id = cursor
+        query = query.where(or_(
+            Expense.created_at < created_at,
+            and_(Expense.created_at == created_at, Expense.id < expense_id)
+        ))
+
+    # Fetch one extra row to learn whether another page follows
+    return query.order_by(Expense.created_at.desc(), Expense.id.desc()).limit(limit + 1)
+
+
+def fetch_expense_page(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[datetime, int]] = None,
+                       fields: Optional[List[str]] = None, group_id: Optional[int] = None,
+                       **filters) -> Tuple[List[Expense], Optional[str]]:
+    """
+    Return one page of expenses, newest first, and the cursor for the next page (None on the last page).
+    Accepts the filters of expense_page_query.
+    """
+    from app import db
+
+    filters.pop('money', None)
+    query = with_expense_loaders(expense_page_query(limit, cursor, group_id, **filters), fields)
+    expenses = list(db.session.execute(query).unique().scalars())
+    return split_page(expenses, limit)
+
+
+def fetch_expense_dicts(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[datetime, int]] = None,
+                        fields: Optional[List[str]] = None, group_id: Optional[int] = None,
+                        money: str = 'number', **filters) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Like fetch_expense_page, but return the page as serializable dicts built from
+    rows, without loading any ORM objects. Splits, when wanted, take one more query.
+    """
+    from app import db
+
+    query = expense_row_query(expense_page_query(limit, cursor, group_id, **filters), fields)
+    rows, next_cursor = split_page(db.session.execute(query).all(), limit)
+    splits = None
+    if rows and (fields is None or 'splits' in fields):
+        splits = split_dicts(db.session.execute(split_row_query([row.id for row in rows])), money)
+    return expense_dicts(rows, splits, fields, money), next_cursor
+
+
+def expense_row_query(page_query, fields: Optional[List[str]] = None):
+    """
+    Turn an expense_page_query into one selecting the columns serializers.expense_dicts
+    reads, joining the payer's name only when the paid_by field is wanted.
+    """
+    query = page_query.with_only_columns(
+        Expense.id, Expense.amount, Expense.description, Expense.paid_by_id, Expense.group_id,
+        Expense.split_method, Expense.created_at, Expense.updated_at
+    )
+    if fields is None or 'paid_by' in fields:
+        # Aliased so the person-name filter subqueries stay uncorrelated
+        payer = aliased(Person)
+        query = query.add_columns(payer.name.label('paid_by')).join(payer, payer.id == Expense.paid_by_id)
+    return query
+
+
+def split_row_query(expense_ids: List[int]):
+    """Select the (expense_id, id, person_id, person_name, amount, percentage) rows of some expenses"""
+    return (
+        select(ExpenseSplit.expense_id, ExpenseSplit.id, ExpenseSplit.person_id, Person.name,
+               ExpenseSplit.amount, ExpenseSplit.percentage)
+        .join(Person, Person.id == ExpenseSplit.person_id)
+        .where(ExpenseSplit.expense_id.in_(expense_ids))
+        .order_by(ExpenseSplit.expense_id, ExpenseSplit.id)
+    )
+
+
+def with_expense_loaders(query, fields: Optional[List[str]] = None):
+    """Eager-load the relationships the requested fields need, so serializing never queries"""
+    if fields is None or 'paid_by' in fields:
+        query = query.options(joinedload(Expense.payer))
+    if fields is None or 'splits' in fields:
+        query = query.options(selectinload(Expense.splits).joinedload(ExpenseSplit.person))
+    return query
+
+
+def split_page(expenses: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Trim the extra row fetched by expense_page_query and return the page with its next cursor"""
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_cursor(expenses[-1])
+    return expenses, next_cursor
@@ -0,0 +1,120 @@
+"""
+Expense write pipeline for Split App
+Shared by the API and web routes. Splits are computed in memory with rounding
+settled up front, people are resolved in one batch, and an expense is written
+together with its splits in a single flush. Nothing here commits; the caller
+commits once, so no partial expense is ever visible.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from app import db
+from balance_ledger import BalanceLedger
+from models import Expense, ExpenseSplit, SplitMethod
+from person_resolver import PersonResolver
+from settlement_calculator import SettlementCalculator
+
+
+class ExpenseService:
+    """Creates, amends and deletes expenses together with their splits and ledger deltas"""
+
+    @staticmethod
+    def split_rows(data: Dict, amount: Decimal, paid_by: str) -> List[Tuple[str, Decimal, Decimal]]:
+        """
+        Compute (person_name, amount, percentage) rows for a validated expense.
+        Equal splits always include the payer and ignore repeated participants.
+        """
+        split_method = data.get('split_method', 'equal')
+        if split_method == 'equal':
+            participants = [name.strip() for name in data.get('participants') or [paid_by]]
+            if paid_by not in participants:
+                participants.append(paid_by)
+            # Drop repeated names, keeping the first occurrence
+            participants = list(dict.fromkeys(participants))
+            return SettlementCalculator.compute_equal_splits(amount, participants)
+        return SettlementCalculator.compute_custom_splits(amount, data['splits'], split_method)
+
+    @staticmethod
+    def create_expense(data: Dict, group_id: Optional[int] = None) -> Expense:
+        """Add a validated expense with its splits to the session and record it in the ledger"""
+        amount = Decimal(str(data['amount']))
+        paid_by = data['paid_by'].strip()
+        rows = ExpenseService.split_rows(data, amount, paid_by)
+        person_ids = PersonResolver.resolve_ids([paid_by] + [name for name, _, _ in rows])
+
+        expense = Expense(
+            amount=amount,
+            description=data['description'].strip(),
+            paid_by_id=person_ids[paid_by],
+            group_id=group_id,
+            split_method=SplitMethod(data.get('split_method', 'equal')),
+            splits=[
+                ExpenseSplit(person_id=person_ids[name], group_id=group_id,
+                             amount=split_amount, percentage=percentage)
+                for name, split_amount, percentage in rows
+            ]
+        )
+        db.session.add(expense)
+        db.session.flush()
+        BalanceLedger.record_expense(expense)
+        return expense
+
+    @staticmethod
+    def update_expense(expense: Expense, data: Dict) -> Expense:
+        """
+        Apply a validated partial update. Splits are recomputed when the amount,
+        split method, participants or splits change; existing split rows are
+        updated in place, so a person keeps their row across the change.
+        """
+        retracted = BalanceLedger.expense_deltas(expense, sign=-1)
+
+        if 'amount' in data:
+            expense.amount = Decimal(str(data['amount']))
+        if 'description' in data:
+            expense.description = data['description'].strip()
+        if 'split_method' in data:
+            expense.split_method = SplitMethod(data['split_method'])
+
+        payer_name = expense.payer.name
+        if 'paid_by' in data:
+            payer_name = data['paid_by'].strip()
+            expense.paid_by_id = PersonResolver.resolve_id(payer_name)
+
+        if {'amount', 'participants', 'split_method', 'splits'} & data.keys():
+            split_method = data.get('split_method', expense.split_method.value)
+            if split_method == 'equal' or 'splits' in data:
+                split_data = dict(data, split_method=split_method)
+                rows = ExpenseService.split_rows(split_data, expense.amount, payer_name)
+                ExpenseService._replace_splits(expense, rows)
+
+        # Splits can change without the expense row; ledger snapshots find edits by updated_at
+        expense.updated_at = datetime.utcnow()
+        db.session.flush()
+        BalanceLedger.amend_expense(expense, retracted)
+        return expense
+
+    @staticmethod
+    def delete_expense(expense: Expense) -> None:
+        """Remove an expense and its splits from the session and the ledger"""
+        BalanceLedger.retract_expense(expense)
+        db.session.delete(expense)
+
+    @staticmethod
+    def _replace_splits(expense: Expense, rows: List[Tuple[str, Decimal, Decimal]]) -> None:
+        """Make an expense's splits match rows, reusing the rows of people who remain"""
+        person_ids = PersonResolver.resolve_ids(name for name, _, _ in rows)
+        existing = {split.person_id: split for split in expense.splits}
+
+        splits = []
+        for name, split_amount, percentage in rows:
+            split = existing.pop(person_ids[name], None)
+            if split is None:
+                split = ExpenseSplit(person_id=person_ids[name], group_id=expense.group_id)
+            split.amount = split_amount
+            split.percentage = percentage
+            splits.append(split)
+
+        # Removed splits are deleted as orphans when the session flushes
+        expense.splits = splits
@@ -0,0 +1,114 @@
+from flask import Blueprint, Response, request, stream_with_context
+from app import db
+from models import Person, Expense, ExpenseSplit
+from settlement_calculator import SettlementCalculator
+from balance_ledger import BalanceLedger
+from api_routes import create_response
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+import csv
+import io
+import json
+import logging
+
+export = Blueprint('export', __name__)
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def _expenses_query(group_id):
+    payer = aliased(Person)
+    query = (
+        select(Expense.id, Expense.amount, Expense.description, Expense.paid_by_id,
+               payer.name.label('paid_by'), Expense.group_id, Expense.split_method,
+               Expense.created_at, Expense.updated_at)
+        .join(payer, payer.id == Expense.paid_by_id)
+        .order_by(Expense.id)
+    )
+    if group_id is not None:
+        query = query.where(Expense.group_id == group_id)
+    return query
+
+def _splits_query(group_id):
+    query = (
+        select(ExpenseSplit.id, ExpenseSplit.expense_id, ExpenseSplit.person_id,
+               Person.name.label('person_name'), ExpenseSplit.group_id,
+               ExpenseSplit.amount, ExpenseSplit.percentage)
+        .join(Person, Person.id == ExpenseSplit.person_id)
+        .order_by(ExpenseSplit.id)
+    )
+    if group_id is not None:
+        query = query.where(ExpenseSplit.group_id == group_id)
+    return query
+
+def _balances_query(group_id):
+    if group_id is not None:
+        return SettlementCalculator.balance_query(group_id)
+    return BalanceLedger.balance_query()
+
+# Export name -> query builder taking an optional group_id
+DATASETS = {
+    'expenses': _expenses_query,
+    'splits': _splits_query,
+    'balances': _balances_query,
+}
+
+def _export_value(value):
+    """Convert a column value to its exported form; money stays exact as a string"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def _stream_rows(query, export_format):
+    """Yield the query's rows in the export format, one chunk per server-side fetch"""
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    columns = list(result.keys())
+
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+        for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_export_value(value) for value in row] for row in partition)
+            yield buffer.getvalue()
+    else:
+        for partition in result.partitions():
+            yield ''.join(
+                json.dumps({column: _export_value(value) for column, value in zip(columns, row)}) + '\n'
+                for row in partition
+            )
+
+@export.route('/<dataset>.<export_format>', methods=['GET'])
+def export_dataset(dataset, export_format):
+    """Stream a full table export as NDJSON or CSV without materializing it in memory"""
+    if dataset not in DATASETS or export_format not in EXPORT_FORMATS:
+        return create_response(False, None, "Unknown export", 404)
+
+    group_id = request.args.get('group_id', type=int)
+    try:
+        query = DATASETS[dataset](group_id)
+        filename = f"{dataset}.{export_format}"
+        return Response(
+            stream_with_context(_stream_rows(query, export_format)),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        logging.error(f"Error exporting {dataset}: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
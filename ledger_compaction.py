@@ -0,0 +1,293 @@
+"""
+Ledger compaction for Split App
+Recorded payments settle debts, but the expenses behind them would stay in
+expenses and expense_splits forever, read by every listing and balance
+recomputation. Compaction folds the settled part of the history into
+carried_balances, a single row per person, and moves the raw expenses,
+splits and payments into the cold *_archive tables, so hot-path queries only
+touch the recent, unsettled window:
+
+    python ledger_compaction.py --older-than-days 90 [--dry-run]
+
+A debt graph component (people linked through shared expenses and payments)
+is compacted whole, once everyone in it is settled up, overall and within
+every group, and its newest expense or payment is older than the cutoff.
+Balances are unchanged by compaction, so the balance ledger and the event log
+need no update, and so are group balances and settlements, as the archived
+rows net to zero for each person in each group. Group debts may lose amounts
+that only went round in circles.
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import case, delete, func, insert, literal, select, union_all, update
+
+from app import db
+from balance_ledger import BalanceLedger
+from columnar_ledger import cents
+from db_utils import dialect_insert
+from models import (CarriedBalance, Expense, ExpenseArchive, ExpenseSplit, ExpenseSplitArchive,
+                    Payment, PaymentArchive, PersonBalance)
+
+ZERO = Decimal('0')
+
+# Default age, in days, below which history is never compacted
+COMPACTION_MIN_AGE_DAYS = int(os.environ.get('COMPACTION_MIN_AGE_DAYS', '90'))
+
+# Payer ids per IN (...) when moving rows to the archive
+COMPACTION_CHUNK_SIZE = 1000
+
+
+def _upsert_statement():
+    """Return an INSERT ... ON CONFLICT DO UPDATE that adds to the carried totals, if supported."""
+    stmt = dialect_insert(CarriedBalance)
+    if stmt is None:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=[CarriedBalance.person_id],
+        set_={
+            'total_paid': CarriedBalance.total_paid + stmt.excluded.total_paid,
+            'fair_share': CarriedBalance.fair_share + stmt.excluded.fair_share,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+
+
+class CompactionResult(NamedTuple):
+    """What one compaction run folded away"""
+    components: int
+    people: int
+    expenses: int
+    splits: int
+    payments: int
+    carried_rows: int
+
+
+class LedgerCompaction:
+    """
+    Folds settled history into carried balances and archives the raw rows.
+    Callers are responsible for committing; nothing is moved until they do.
+    """
+
+    @staticmethod
+    def settled_components_query(before: datetime):
+        """
+        Build the query returning the component labels whose members are all settled
+        up, to the cent, both overall and within every group, and whose newest expense
+        edit or payment happened before `before`
+        """
+        balances = PersonBalance.__table__
+        activity = union_all(
+            select(balances.c.component_id,
+                   func.max(func.coalesce(Expense.updated_at, Expense.created_at)).label('last_at'))
+            .join(Expense, Expense.paid_by_id == balances.c.person_id)
+            .group_by(balances.c.component_id),
+            select(balances.c.component_id, func.max(Payment.created_at).label('last_at'))
+            .join(Payment, Payment.payer_id == balances.c.person_id)
+            .group_by(balances.c.component_id)
+        ).subquery()
+        idle = (
+            select(activity.c.component_id)
+            .group_by(activity.c.component_id)
+            .having(func.max(activity.c.last_at) < before)
+        )
+        # Settled overall is not enough: someone owed in one group and owing the same
+        # in another would lose both group balances once their rows are archived
+        group_nets = union_all(
+            select(Expense.paid_by_id.label('person_id'), Expense.group_id, Expense.amount.label('net')),
+            select(ExpenseSplit.person_id, ExpenseSplit.group_id, -ExpenseSplit.amount),
+            select(Payment.payer_id, Payment.group_id, Payment.amount),
+            select(Payment.payee_id, Payment.group_id, -Payment.amount)
+        ).subquery()
+        unsettled_in_a_group = (
+            select(balances.c.component_id)
+            .join(group_nets, group_nets.c.person_id == balances.c.person_id)
+            .group_by(balances.c.component_id, group_nets.c.person_id, group_nets.c.group_id)
+            .having(cents(func.sum(group_nets.c.net)) != 0)
+        )
+        return (
+            select(balances.c.component_id)
+            .where(balances.c.component_id.in_(idle))
+            .where(balances.c.component_id.notin_(unsettled_in_a_group))
+            .group_by(balances.c.component_id)
+            .having(func.sum(case((cents(balances.c.total_paid - balances.c.fair_share) != 0, 1), else_=0)) == 0)
+            .order_by(balances.c.component_id)
+        )
+
+    @staticmethod
+    def compact(before: datetime) -> CompactionResult:
+        """
+        Compact every settled component idle since `before`. Caller commits.
+        Components are recomputed first, so links left behind by edits and
+        deletes do not keep settled people tied to unsettled ones.
+        """
+        # Locks the version row, as every ledger writer does, so no expense or
+        # payment commits while components are read and rows are moved
+        BalanceLedger.bump_version()
+        BalanceLedger.rebuild_components()
+
+        components = db.session.execute(LedgerCompaction.settled_components_query(before)).scalars().all()
+        people = []
+        for start in range(0, len(components), COMPACTION_CHUNK_SIZE):
+            chunk = components[start:start + COMPACTION_CHUNK_SIZE]
+            people.extend(db.session.execute(
+                select(PersonBalance.person_id).where(PersonBalance.component_id.in_(chunk))
+            ).scalars())
+        people.sort()
+
+        carried: Dict[int, List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+        archived_at = datetime.utcnow()
+        expenses = splits = payments = 0
+        for start in range(0, len(people), COMPACTION_CHUNK_SIZE):
+            chunk = people[start:start + COMPACTION_CHUNK_SIZE]
+            LedgerCompaction._carry(chunk, carried)
+            moved = LedgerCompaction._archive(chunk, archived_at)
+            expenses += moved[0]
+            splits += moved[1]
+            payments += moved[2]
+
+        carried_rows = LedgerCompaction._store_carried(carried)
+        return CompactionResult(len(components), len(people), expenses, splits, payments, carried_rows)
+
+    @staticmethod
+    def _carry(payer_ids: List[int], carried: Dict[int, List[Decimal]]) -> None:
+        """Add each person's totals over the rows paid by payer_ids to carried"""
+        expense_ids = select(Expense.id).where(Expense.paid_by_id.in_(payer_ids))
+        paid = union_all(
+            select(Expense.paid_by_id, func.sum(Expense.amount))
+            .where(Expense.paid_by_id.in_(payer_ids))
+            .group_by(Expense.paid_by_id),
+            select(Payment.payer_id, func.sum(Payment.amount))
+            .where(Payment.payer_id.in_(payer_ids))
+            .group_by(Payment.payer_id)
+        )
+        shared = union_all(
+            select(ExpenseSplit.person_id, func.sum(ExpenseSplit.amount))
+            .where(ExpenseSplit.expense_id.in_(expense_ids))
+            .group_by(ExpenseSplit.person_id),
+            select(Payment.payee_id, func.sum(Payment.amount))
+            .where(Payment.payer_id.in_(payer_ids))
+            .group_by(Payment.payee_id)
+        )
+        for person_id, amount in db.session.execute(paid):
+            carried[person_id][0] += Decimal(str(amount))
+        for person_id, amount in db.session.execute(shared):
+            carried[person_id][1] += Decimal(str(amount))
+
+    @staticmethod
+    def _archive(payer_ids: List[int], archived_at: datetime) -> Tuple[int, int, int]:
+        """
+        Copy the expenses, splits and payments paid by payer_ids into the archive
+        tables with INSERT ... SELECT and delete them. Returns the rows moved of each.
+        """
+        expense_ids = select(Expense.id).where(Expense.paid_by_id.in_(payer_ids))
+        stamp = literal(archived_at, type_=db.DateTime)
+
+        split_columns = ['id', 'expense_id', 'person_id', 'group_id', 'amount', 'percentage']
+        db.session.execute(insert(ExpenseSplitArchive).from_select(
+            split_columns + ['archived_at'],
+            select(*(getattr(ExpenseSplit, column) for column in split_columns), stamp)
+            .where(ExpenseSplit.expense_id.in_(expense_ids))
+        ))
+        expense_columns = ['id', 'amount', 'description', 'paid_by_id', 'group_id', 'split_method',
+                           'created_at', 'updated_at']
+        db.session.execute(insert(ExpenseArchive).from_select(
+            expense_columns + ['archived_at'],
+            select(*(getattr(Expense, column) for column in expense_columns), stamp)
+            .where(Expense.paid_by_id.in_(payer_ids))
+        ))
+        payment_columns = ['id', 'payer_id', 'payee_id', 'group_id', 'amount', 'created_at']
+        db.session.execute(insert(PaymentArchive).from_select(
+            payment_columns + ['archived_at'],
+            select(*(getattr(Payment, column) for column in payment_columns), stamp)
+            .where(Payment.payer_id.in_(payer_ids))
+        ))
+
+        splits = db.session.execute(
+            delete(ExpenseSplit).where(ExpenseSplit.expense_id.in_(expense_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        expenses = db.session.execute(
+            delete(Expense).where(Expense.paid_by_id.in_(payer_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        payments = db.session.execute(
+            delete(Payment).where(Payment.payer_id.in_(payer_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        return expenses, splits, payments
+
+    @staticmethod
+    def _store_carried(carried: Dict[int, List[Decimal]]) -> int:
+        """Add carried totals onto the people's carried_balances rows, creating missing ones"""
+        now = datetime.utcnow()
+        rows = [
+            {'person_id': person_id, 'total_paid': paid, 'fair_share': share, 'updated_at': now}
+            for person_id, (paid, share) in carried.items()
+            if paid or share
+        ]
+        if not rows:
+            return 0
+
+        upsert = _upsert_statement()
+        if upsert is not None:
+            db.session.execute(upsert, rows)
+            return len(rows)
+
+        # Portable fallback: update in place, insert the rows that did not exist yet
+        for row in rows:
+            result = db.session.execute(
+                update(CarriedBalance)
+                .where(CarriedBalance.person_id == row['person_id'])
+                .values(total_paid=CarriedBalance.total_paid + row['total_paid'],
+                        fair_share=CarriedBalance.fair_share + row['fair_share'],
+                        updated_at=now)
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(CarriedBalance), [row])
+        return len(rows)
+
+
+def main(argv=None):
+    """Compact settled ledger history from the command line"""
+    parser = argparse.ArgumentParser(description="Fold settled history into carried balances and archive it")
+    cutoff = parser.add_mutually_exclusive_group()
+    cutoff.add_argument('--older-than-days', type=int, default=COMPACTION_MIN_AGE_DAYS,
+                        help=f'compact history idle for this many days (default: {COMPACTION_MIN_AGE_DAYS})')
+    cutoff.add_argument('--before', type=datetime.fromisoformat,
+                        help='compact history idle since this UTC date or date-time instead')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be compacted and roll back')
+    args = parser.parse_args(argv)
+    before = args.before or datetime.utcnow() - timedelta(days=args.older_than_days)
+
+    from app import app
+    import snapshot_file
+
+    with app.app_context():
+        result = LedgerCompaction.compact(before)
+        summary = (f"{result.expenses} expenses ({result.splits} splits) and {result.payments} payments "
+                   f"of {result.people} people in {result.components} settled components, "
+                   f"idle since {before.isoformat()}")
+        if args.dry_run:
+            db.session.rollback()
+            print(f"Would compact {summary}")
+            return 0
+
+        db.session.commit()
+        print(f"✓ Compacted {summary} into {result.carried_rows} carried balances")
+        path = snapshot_file.configured_path()
+        if path and snapshot_file.np is not None and (result.expenses or result.payments):
+            # The snapshot still holds the archived rows; rewrite it rather than overlay the deletes
+            snapshot_file.write_snapshot(path)
+            print(f"✓ Rewrote ledger snapshot {path}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Append-only ledger event log for Split App
+Every expense or payment write appends an event (created, amended or deleted)
+with each person's net balance change, in the same transaction as the balance ledger
+update. About every LEDGER_CHECKPOINT_INTERVAL events the materialized
+balances are copied into a checkpoint, so balances at any past moment are
+the nearest earlier checkpoint plus the tail of events after it.
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, literal, select, union_all
+
+from app import db
+from models import (BalanceCheckpoint, BalanceCheckpointRow, LedgerEvent, LedgerEventDelta,
+                    LedgerEventKind, LedgerVersion, Person, PersonBalance)
+
+ZERO = Decimal('0')
+
+# Events between automatic checkpoints
+LEDGER_CHECKPOINT_INTERVAL = int(os.environ.get('LEDGER_CHECKPOINT_INTERVAL', '10000'))
+
+Deltas = Iterable[Tuple[int, Decimal, Decimal]]
+
+
+class LedgerEvents:
+    """
+    Appends events and checkpoints and answers point-in-time balance queries.
+    Callers are responsible for committing; events join the caller's transaction.
+    """
+
+    @staticmethod
+    def record(kind: LedgerEventKind, expense, deltas: Deltas) -> None:
+        """Append one event for an expense write; call after BalanceLedger.apply"""
+        LedgerEvents.record_many(kind, [(expense.id, expense.group_id, deltas)])
+
+    @staticmethod
+    def record_payment(kind: LedgerEventKind, payment, deltas: Deltas) -> None:
+        """Append one event for a payment write; call after BalanceLedger.apply"""
+        LedgerEvents.record_many(kind, [(payment.id, payment.group_id, deltas)], subject='payment_id')
+
+    @staticmethod
+    def record_many(kind: LedgerEventKind, events: List[Tuple[int, Optional[int], Deltas]],
+                    subject: str = 'expense_id') -> None:
+        """
+        Append one event per (subject id, group_id, deltas), storing each person's
+        merged delta; subject names the column the id goes in, expense_id or
+        payment_id. Takes a checkpoint when the new events cross a multiple of
+        LEDGER_CHECKPOINT_INTERVAL, which is why this must follow BalanceLedger.apply.
+        """
+        if not events:
+            return
+
+        recorded_at = datetime.utcnow()
+        event_ids = db.session.execute(
+            insert(LedgerEvent).returning(LedgerEvent.id, sort_by_parameter_order=True),
+            [
+                {'kind': kind, subject: subject_id, 'group_id': group_id, 'recorded_at': recorded_at}
+                for subject_id, group_id, _ in events
+            ]
+        ).scalars().all()
+
+        rows = []
+        for event_id, (_, _, deltas) in zip(event_ids, events):
+            merged: Dict[int, List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+            for person_id, paid_delta, share_delta in deltas:
+                merged[person_id][0] += Decimal(paid_delta)
+                merged[person_id][1] += Decimal(share_delta)
+            rows.extend(
+                {'event_id': event_id, 'person_id': person_id, 'paid_delta': paid, 'share_delta': share}
+                for person_id, (paid, share) in merged.items()
+                if paid or share
+            )
+        if rows:
+            db.session.execute(insert(LedgerEventDelta), rows)
+
+        # Ids skipped by rolled-back writes can hide a multiple; the next one is caught
+        if (event_ids[0] - 1) // LEDGER_CHECKPOINT_INTERVAL < event_ids[-1] // LEDGER_CHECKPOINT_INTERVAL:
+            LedgerEvents.checkpoint()
+
+    @staticmethod
+    def checkpoint() -> int:
+        """
+        Copy the current balance ledger into a new checkpoint covering every event
+        so far and return its id. Caller commits. The ledger version row is locked
+        first, as every writer does, so no event commits between the copy and its
+        watermark.
+        """
+        db.session.execute(select(LedgerVersion.version).where(LedgerVersion.id == 1).with_for_update())
+        last_event_id = db.session.execute(select(func.max(LedgerEvent.id))).scalar() or 0
+        checkpoint_id = db.session.execute(
+            insert(BalanceCheckpoint).returning(BalanceCheckpoint.id),
+            [{'last_event_id': last_event_id, 'taken_at': datetime.utcnow()}]
+        ).scalar_one()
+        db.session.execute(
+            insert(BalanceCheckpointRow).from_select(
+                ['checkpoint_id', 'person_id', 'total_paid', 'fair_share'],
+                select(literal(checkpoint_id), PersonBalance.person_id,
+                       PersonBalance.total_paid, PersonBalance.fair_share)
+            )
+        )
+        return checkpoint_id
+
+    @staticmethod
+    def checkpoint_query(as_of: datetime):
+        """Build the query returning (id, last_event_id, taken_at) of the latest checkpoint at or before as_of"""
+        return (
+            select(BalanceCheckpoint.id, BalanceCheckpoint.last_event_id, BalanceCheckpoint.taken_at)
+            .where(BalanceCheckpoint.taken_at <= as_of)
+            .order_by(BalanceCheckpoint.taken_at.desc(), BalanceCheckpoint.id.desc())
+            .limit(1)
+        )
+
+    @staticmethod
+    def history_start_query():
+        """Build the query returning when the earliest checkpoint was taken"""
+        return select(func.min(BalanceCheckpoint.taken_at))
+
+    @staticmethod
+    def balance_query(checkpoint_id: int, last_event_id: int, as_of: datetime):
+        """
+        Build the query returning (person_id, name, total_paid, fair_share) as of a
+        moment: a checkpoint's rows plus the deltas of the events recorded after
+        it up to as_of, summed per person in a single round trip.
+        """
+        stored = (
+            select(BalanceCheckpointRow.person_id,
+                   BalanceCheckpointRow.total_paid.label('total_paid'),
+                   BalanceCheckpointRow.fair_share.label('fair_share'))
+            .where(BalanceCheckpointRow.checkpoint_id == checkpoint_id)
+        )
+        tail = (
+            select(LedgerEventDelta.person_id,
+                   LedgerEventDelta.paid_delta.label('total_paid'),
+                   LedgerEventDelta.share_delta.label('fair_share'))
+            .join(LedgerEvent, LedgerEvent.id == LedgerEventDelta.event_id)
+            .where(LedgerEvent.id > last_event_id, LedgerEvent.recorded_at <= as_of)
+        )
+        combined = union_all(stored, tail).subquery()
+        return (
+            select(Person.id, Person.name,
+                   func.sum(combined.c.total_paid).label('total_paid'),
+                   func.sum(combined.c.fair_share).label('fair_share'))
+            .join(combined, combined.c.person_id == Person.id)
+            .group_by(Person.id, Person.name)
+            .order_by(Person.id)
+        )
+
+    @staticmethod
+    def balance_rows_as_of(as_of: datetime) -> Tuple[Optional[Tuple], List[Tuple]]:
+        """
+        Return (checkpoint_query row, balance_query rows) for as_of, or (None, []) when
+        as_of is earlier than the first checkpoint and history does not reach it.
+        """
+        checkpoint = db.session.execute(LedgerEvents.checkpoint_query(as_of)).first()
+        if checkpoint is None:
+            return None, []
+        return checkpoint, db.session.execute(
+            LedgerEvents.balance_query(checkpoint.id, checkpoint.last_event_id, as_of)
+        ).all()
+
+    @staticmethod
+    def parse_as_of(value: str) -> datetime:
+        """
+        Parse an ISO 8601 date or date-time into a naive UTC datetime, the form
+        timestamps are stored in. A bare date means midnight UTC.
+        Raises ValueError on anything else.
+        """
+        try:
+            moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError("as_of must be an ISO 8601 date or date-time, e.g. 2024-05-01T12:00:00Z")
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment
+
+
+def main(argv=None):
+    """Take a balance checkpoint from the command line"""
+    parser = argparse.ArgumentParser(description="Take a checkpoint of the ledger event log")
+    parser.add_argument('command', choices=['checkpoint'])
+    parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        checkpoint_id = LedgerEvents.checkpoint()
+        db.session.commit()
+        checkpoint = db.session.get(BalanceCheckpoint, checkpoint_id)
+        print(f"✓ Checkpoint {checkpoint.id} taken at event {checkpoint.last_event_id}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Metrics registry for Split App
+Counters and histograms rendered in the Prometheus text exposition format by
+the /metrics endpoint. Each thread records into its own shard, so recording
+takes no lock; the shards are only summed when /metrics is scraped. Values are
+per process: with several gunicorn or uvicorn workers, each scrape reports the
+worker that happened to serve it.
+"""
+
+import bisect
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow solves
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for sharded metrics: one dict of label values to samples per thread"""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            # Taken once per thread, never on the recording path afterwards
+            shard = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[Dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, *label_values) -> None:
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def collect(self) -> Dict[Tuple, float]:
+        totals = {}
+        for shard in self._snapshots():
+            for label_values, value in shard.items():
+                totals[label_values] = totals.get(label_values, 0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for label_values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values) -> None:
+        shard = self._shard()
+        samples = shard.get(label_values)
+        if samples is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            samples = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        samples[bisect.bisect_left(self.buckets, value)] += 1
+        samples[-1] += value
+
+    def collect(self) -> Dict[Tuple, List]:
+        totals = {}
+        for shard in self._snapshots():
+            for label_values, samples in shard.items():
+                total = totals.setdefault(label_values, [0] * len(samples))
+                for i, sample in enumerate(samples):
+                    total[i] += sample
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for label_values, samples in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), samples):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labels, label_values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(samples[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[_Metric] = ()) -> str:
+        lines = []
+        for metric in list(self._metrics) + list(extra):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'split_http_request_duration_seconds', 'Time to produce a response, by route',
+    ('route', 'method', 'status')))
+DB_QUERIES = registry.register(Counter(
+    'split_db_queries_total', 'Database queries run while serving requests, by route', ('route',)))
+DB_TIME = registry.register(Counter(
+    'split_db_query_seconds_total', 'Time spent executing database queries, by route', ('route',)))
+DB_POOL_WAIT = registry.register(Counter(
+    'split_db_pool_wait_seconds_total', 'Time spent waiting for a pooled connection, by route', ('route',)))
+SETTLEMENT_PHASE = registry.register(Histogram(
+    'split_settlement_phase_seconds',
+    'Time spent in each phase of a settlement: aggregate, partition or match', ('phase',)))
+
+
+def observe_phase(phase: str, started: float) -> float:
+    """Record a settlement phase that began at started (a time.perf_counter() value); returns now"""
+    now = time.perf_counter()
+    SETTLEMENT_PHASE.observe(now - started, phase)
+    return now
+
+
+def observe_request(route: str, method: str, status: int, duration: float, db_stats=None) -> None:
+    """Record one served request and the database work it did"""
+    REQUEST_DURATION.observe(duration, route, method, status)
+    if db_stats is not None:
+        DB_QUERIES.inc(db_stats.queries, route)
+        DB_TIME.inc(db_stats.db_time, route)
+        DB_POOL_WAIT.inc(db_stats.pool_wait, route)
+
+
+def init_app(app) -> None:
+    """Record the latency of every Flask request under its URL rule"""
+    from flask import g, request
+
+    from db_instrumentation import current_stats
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe_request(route, request.method, response.status_code,
+                            time.perf_counter() - started, current_stats())
+        return response
+
+
+# Starlette path parameters written the way Flask writes them, so both modes share labels
+_ASGI_PARAM = re.compile(r'\{(\w+):(\w+)\}')
+
+
+class MetricsMiddleware:
+    """ASGI counterpart of init_app; routes handed to Flask are recorded by Flask itself"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        from starlette.routing import Route
+
+        from db_instrumentation import current_stats
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            if isinstance(route, Route):
+                observe_request(_ASGI_PARAM.sub(r'<\2:\1>', route.path), scope['method'], status[0],
+                                time.perf_counter() - started, current_stats())
@@ -0,0 +1,58 @@
+"""
+Metrics endpoint for Split App
+/metrics renders the registry in metrics.py together with gauges read at
+scrape time: row counts, the ledger version, cache hits and misses per kind of entry and the
+settlement cache hit ratio.
+"""
+
+from flask import Blueprint, Response
+from sqlalchemy import func, select
+from app import db
+from models import Person, Expense, ExpenseSplit
+from balance_ledger import BalanceLedger
+from settlement_cache import SettlementCache
+from metrics import Counter, Gauge, registry
+import logging
+
+metrics = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _scrape_metrics():
+    """Gauges and cache counters read once per scrape"""
+    people, expenses, splits = db.session.execute(select(
+        select(func.count()).select_from(Person).scalar_subquery(),
+        select(func.count()).select_from(Expense).scalar_subquery(),
+        select(func.count()).select_from(ExpenseSplit).scalar_subquery(),
+    )).one()
+    cache = SettlementCache.stats()
+    settlements = cache.get('settlements', {'hits': 0, 'misses': 0})
+    settlement_lookups = settlements['hits'] + settlements['misses']
+
+    cache_hits = Counter('split_cache_hits_total', 'Balance and settlement cache hits', ('kind',))
+    cache_misses = Counter('split_cache_misses_total', 'Balance and settlement cache misses', ('kind',))
+    for kind, counts in cache.items():
+        cache_hits.inc(counts['hits'], kind)
+        cache_misses.inc(counts['misses'], kind)
+
+    return [
+        Gauge('split_people', 'People recorded', lambda: people),
+        Gauge('split_expenses', 'Expenses recorded', lambda: expenses),
+        Gauge('split_expense_splits', 'Expense splits recorded', lambda: splits),
+        Gauge('split_ledger_version', 'Current balance ledger version', BalanceLedger.version),
+        cache_hits,
+        cache_misses,
+        Gauge('split_settlement_cache_hit_ratio', 'Share of settlement lookups served from the cache',
+              lambda: settlements['hits'] / settlement_lookups if settlement_lookups else None),
+    ]
+
+
+@metrics.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request, database, settlement and cache metrics in the Prometheus text format"""
+    try:
+        return Response(registry.render(_scrape_metrics()), content_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as e:
+        logging.error(f"Error rendering metrics: {str(e)}")
+        return Response(f"# Error rendering metrics: {str(e)}\n", status=500, content_type=PROMETHEUS_CONTENT_TYPE)
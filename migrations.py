@@ -0,0 +1,240 @@
+"""
+Schema migrations for Split App
+db.create_all() creates missing tables but never alters existing ones, so
+columns and indexes added after a database was created are applied here.
+Each migration runs once, is recorded in schema_migrations, and checks the
+live schema first so it is a no-op on databases created from current models.
+Every worker upgrades on boot, so upgrades are serialized by schema_lock().
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+# Key of the PostgreSQL advisory lock held while the schema is upgraded
+SCHEMA_LOCK_KEY = 0x5E17A9
+
+_lock_depth = 0
+
+
+@contextmanager
+def schema_lock():
+    """
+    Hold a cross-process lock while creating tables and applying migrations, so
+    workers booting together upgrade one at a time and later ones find nothing
+    left to do. PostgreSQL takes a session advisory lock on its own connection;
+    SQLite locks a file next to the database. Re-entrant within a process.
+    """
+    global _lock_depth
+    if _lock_depth:
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+        return
+
+    url = db.engine.url
+    conn = lock_file = None
+    if url.get_backend_name() == 'postgresql':
+        conn = db.engine.connect()
+        # Waiting for another worker's upgrade must not hit DB_STATEMENT_TIMEOUT_MS
+        conn.execute(text("SET statement_timeout = 0"))
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': SCHEMA_LOCK_KEY})
+        conn.commit()
+    elif url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') and fcntl is not None:
+        lock_file = open(f"{os.path.abspath(url.database)}.migrate.lock", 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    _lock_depth = 1
+    try:
+        yield
+    finally:
+        _lock_depth = 0
+        if conn is not None:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': SCHEMA_LOCK_KEY})
+            conn.execute(text("RESET statement_timeout"))
+            conn.commit()
+            conn.close()
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+def _has_column(table, column):
+    """Check whether a column exists on a table in the live database"""
+    return column in {col['name'] for col in inspect(db.engine).get_columns(table)}
+
+
+def _create_indexes(model):
+    """Create any of a model's declared indexes that do not exist yet"""
+    for index in model.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def add_expense_groups():
+    """Add group_id to expenses and expense_splits with their group-scoped indexes"""
+    from models import Expense, ExpenseSplit
+
+    with db.engine.begin() as conn:
+        for table in ('expenses', 'expense_splits'):
+            if not _has_column(table, 'group_id'):
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN group_id INTEGER REFERENCES groups(id)"))
+    _create_indexes(Expense)
+    _create_indexes(ExpenseSplit)
+
+
+def add_hot_path_indexes():
+    """Add the listing, payer-sum and share-sum indexes to existing databases"""
+    from models import Expense, ExpenseSplit
+
+    _create_indexes(Expense)
+    _create_indexes(ExpenseSplit)
+
+
+def add_ledger_version():
+    """Create the ledger_version row that expense writes bump"""
+    from models import LedgerVersion
+
+    LedgerVersion.__table__.create(db.engine, checkfirst=True)
+    with db.engine.begin() as conn:
+        if conn.execute(text("SELECT id FROM ledger_version WHERE id = 1")).first() is None:
+            conn.execute(text("INSERT INTO ledger_version (id, version) VALUES (1, 0)"))
+
+
+def add_debt_components():
+    """Add component_id to person_balances and label the existing ledger"""
+    from balance_ledger import BalanceLedger
+    from models import PersonBalance
+
+    with db.engine.begin() as conn:
+        if not _has_column('person_balances', 'component_id'):
+            conn.execute(text("ALTER TABLE person_balances ADD COLUMN component_id INTEGER"))
+    _create_indexes(PersonBalance)
+    BalanceLedger.rebuild_components()
+    db.session.commit()
+
+
+def add_expense_updated_index():
+    """Index expenses.updated_at, which ledger snapshot overlays scan for recent edits"""
+    from models import Expense
+
+    _create_indexes(Expense)
+
+
+def add_ledger_events():
+    """Create the ledger event log and checkpoint tables and checkpoint the existing ledger"""
+    from ledger_events import LedgerEvents
+    from models import BalanceCheckpoint, BalanceCheckpointRow, LedgerEvent, LedgerEventDelta
+
+    for model in (LedgerEvent, LedgerEventDelta, BalanceCheckpoint, BalanceCheckpointRow):
+        model.__table__.create(db.engine, checkfirst=True)
+    # History starts here: earlier balances were never logged
+    LedgerEvents.checkpoint()
+    db.session.commit()
+
+
+def _rebuild_sqlite_table(model):
+    """
+    Recreate a SQLite table from its model, keeping its rows: SQLite cannot drop
+    NOT NULL from a column in place. Legacy renaming leaves other tables' foreign
+    keys pointing at the table's name, so they follow the rows to the new table.
+    """
+    table = model.__table__
+    with db.engine.begin() as conn:
+        old_columns = [col['name'] for col in inspect(conn).get_columns(table.name)]
+        columns = ', '.join(name for name in old_columns if name in table.c)
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+        for index in inspect(conn).get_indexes(table.name):
+            conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}_old")
+        table.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old")
+        conn.exec_driver_sql(f"DROP TABLE {table.name}_old")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+
+
+def add_payments():
+    """Create the payment, carried balance and archive tables and let ledger events name a payment"""
+    from models import CarriedBalance, ExpenseArchive, ExpenseSplitArchive, LedgerEvent, Payment, PaymentArchive
+
+    for model in (Payment, CarriedBalance, ExpenseArchive, ExpenseSplitArchive, PaymentArchive):
+        model.__table__.create(db.engine, checkfirst=True)
+
+    nullable = {col['name']: col['nullable'] for col in inspect(db.engine).get_columns('ledger_events')}
+    if db.engine.dialect.name == 'sqlite':
+        if not nullable['expense_id'] or 'payment_id' not in nullable:
+            _rebuild_sqlite_table(LedgerEvent)
+    else:
+        with db.engine.begin() as conn:
+            if not nullable['expense_id']:
+                conn.execute(text("ALTER TABLE ledger_events ALTER COLUMN expense_id DROP NOT NULL"))
+            if 'payment_id' not in nullable:
+                conn.execute(text("ALTER TABLE ledger_events ADD COLUMN payment_id INTEGER"))
+    _create_indexes(LedgerEvent)
+
+
+# Ordered (version, description, function) steps; append new ones, never reorder
+MIGRATIONS = [
+    (1, "add expense groups", add_expense_groups),
+    (2, "add hot path indexes", add_hot_path_indexes),
+    (3, "add ledger version", add_ledger_version),
+    (4, "add debt components", add_debt_components),
+    (5, "add expense updated_at index", add_expense_updated_index),
+    (6, "add ledger events", add_ledger_events),
+    (7, "add payments", add_payments),
+]
+
+
+def _is_applied(version):
+    """Check schema_migrations for a version, reading what other workers committed"""
+    with db.engine.connect() as conn:
+        return conn.execute(
+            text("SELECT 1 FROM schema_migrations WHERE version = :version"), {'version': version}
+        ).first() is not None
+
+
+def upgrade():
+    """Apply pending migrations in order under schema_lock() and return the versions applied"""
+    with schema_lock():
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+            ))
+
+        newly_applied = []
+        for version, description, migrate in MIGRATIONS:
+            if _is_applied(version):
+                continue
+            migrate()
+            with db.engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) "
+                         "VALUES (:version, :description, :applied_at)"),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+            newly_applied.append(version)
+        return newly_applied
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        versions = upgrade()
+    if versions:
+        print(f"✓ Applied migrations: {', '.join(str(v) for v in versions)}")
+    else:
+        print("✓ Schema is up to date")
+    sys.exit(0)
@@ -8,6 +8,31 @@ class SplitMethod(Enum):
     EXACT = "exact"
     PERCENTAGE = "percentage"
 
+class LedgerEventKind(Enum):
+    CREATED = "created"
+    AMENDED = "amended"
+    DELETED = "deleted"
+
+class Group(db.Model):
+    __tablename__ = 'groups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    expenses = db.relationship('Expense', backref='group', lazy=True)
+    
+    def __repr__(self):
+        return f'<Group {self.name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class Person(db.Model):
     __tablename__ = 'people'
     
@@ -36,6 +61,7 @@ class Expense(db.Model):
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     description = db.Column(db.String(255), nullable=False)
     paid_by_id = db.Column(db.Integer, db.ForeignKey('people.id'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=True)  # None for ungrouped expenses
     split_method = db.Column(db.Enum(SplitMethod), default=SplitMethod.EQUAL, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -43,21 +69,39 @@ class Expense(db.Model):
     # Relationships
     splits = db.relationship('ExpenseSplit', backref='expense', lazy=True, cascade='all, delete-orphan')
     
+    # Hot access paths: newest-first listings (keyset on created_at, id),
+    # per-payer sums, which (paid_by_id, amount) answers from the index alone,
+    # and the edits made since a ledger snapshot
+    __table_args__ = (
+        db.Index('ix_expenses_created_id', 'created_at', 'id'),
+        db.Index('ix_expenses_paid_by_amount', 'paid_by_id', 'amount'),
+        db.Index('ix_expenses_group_created', 'group_id', 'created_at'),
+        db.Index('ix_expenses_group_paid_by', 'group_id', 'paid_by_id'),
+        db.Index('ix_expenses_updated_at', 'updated_at'),
+    )
+    
     def __repr__(self):
         return f'<Expense {self.description}: ${self.amount}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None):
+        data = {
             'id': self.id,
             'amount': float(self.amount),
             'description': self.description,
-            'paid_by': self.payer.name,
             'paid_by_id': self.paid_by_id,
+            'group_id': self.group_id,
             'split_method': self.split_method.value,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'splits': [split.to_dict() for split in self.splits]
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        # Relationship-backed fields are only touched when requested
+        if fields is None or 'paid_by' in fields:
+            data['paid_by'] = self.payer.name
+        if fields is None or 'splits' in fields:
+            data['splits'] = [split.to_dict() for split in self.splits]
+        if fields is not None:
+            data = {field: data[field] for field in fields}
+        return data
 
 class ExpenseSplit(db.Model):
     __tablename__ = 'expense_splits'
@@ -65,11 +109,17 @@ class ExpenseSplit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id'), nullable=False)
     person_id = db.Column(db.Integer, db.ForeignKey('people.id'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=True)  # Mirrors the expense's group
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     percentage = db.Column(db.Numeric(5, 2), nullable=True)  # For percentage splits
     
     # Unique constraint to prevent duplicate splits for same expense-person combination
-    __table_args__ = (db.UniqueConstraint('expense_id', 'person_id', name='unique_expense_person_split'),)
+    __table_args__ = (
+        db.UniqueConstraint('expense_id', 'person_id', name='unique_expense_person_split'),
+        # Per-person share sums, answered from the index alone
+        db.Index('ix_expense_splits_person_amount', 'person_id', 'amount'),
+        db.Index('ix_expense_splits_group_person', 'group_id', 'person_id'),
+    )
     
     def __repr__(self):
         return f'<ExpenseSplit Expense:{self.expense_id} Person:{self.person_id} Amount:${self.amount}>'
@@ -83,3 +133,172 @@ class ExpenseSplit(db.Model):
             'amount': float(self.amount),
             'percentage': float(self.percentage) if self.percentage else None
         }
+
+class PersonBalance(db.Model):
+    __tablename__ = 'person_balances'
+    
+    person_id = db.Column(db.Integer, db.ForeignKey('people.id'), primary_key=True)
+    total_paid = db.Column(db.Numeric(14, 2), nullable=False, default=Decimal('0'))
+    fair_share = db.Column(db.Numeric(14, 2), nullable=False, default=Decimal('0'))
+    # Connected component of the debt graph: people linked through shared expenses
+    # carry the same label, the smallest person id among them when it was assigned
+    component_id = db.Column(db.Integer, index=True)
+    
+    def __repr__(self):
+        return f'<PersonBalance Person:{self.person_id} Paid:${self.total_paid} Share:${self.fair_share}>'
+
+class Payment(db.Model):
+    __tablename__ = 'payments'
+    
+    # Money handed over to settle up: counts toward the payer's total_paid and the payee's fair_share
+    id = db.Column(db.Integer, primary_key=True)
+    payer_id = db.Column(db.Integer, db.ForeignKey('people.id'), nullable=False)
+    payee_id = db.Column(db.Integer, db.ForeignKey('people.id'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=True)  # None for ungrouped payments
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    payer = db.relationship('Person', foreign_keys=[payer_id])
+    payee = db.relationship('Person', foreign_keys=[payee_id])
+    
+    __table_args__ = (
+        db.Index('ix_payments_created_id', 'created_at', 'id'),
+        db.Index('ix_payments_group_created', 'group_id', 'created_at'),
+        db.Index('ix_payments_payer_id', 'payer_id'),
+        db.Index('ix_payments_payee_id', 'payee_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Payment {self.payer_id} -> {self.payee_id}: ${self.amount}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'from': self.payer.name,
+            'to': self.payee.name,
+            'amount': float(self.amount),
+            'group_id': self.group_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class CarriedBalance(db.Model):
+    __tablename__ = 'carried_balances'
+    
+    # Totals of a person's compacted expenses and payments, counted by installation-wide
+    # recomputations in place of the archived rows. Compaction only takes people who are
+    # settled up, so the two are equal; group figures cover the uncompacted window only.
+    person_id = db.Column(db.Integer, db.ForeignKey('people.id'), primary_key=True)
+    total_paid = db.Column(db.Numeric(14, 2), nullable=False, default=Decimal('0'))
+    fair_share = db.Column(db.Numeric(14, 2), nullable=False, default=Decimal('0'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CarriedBalance Person:{self.person_id} Paid:${self.total_paid} Share:${self.fair_share}>'
+
+# Cold copies of compacted rows, keeping their original ids. Nothing on the hot
+# path reads them, so they have no foreign keys or secondary indexes.
+class ExpenseArchive(db.Model):
+    __tablename__ = 'expenses_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    description = db.Column(db.String(255), nullable=False)
+    paid_by_id = db.Column(db.Integer, nullable=False)
+    group_id = db.Column(db.Integer, nullable=True)
+    split_method = db.Column(db.Enum(SplitMethod), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExpenseArchive {self.id}>'
+
+class ExpenseSplitArchive(db.Model):
+    __tablename__ = 'expense_splits_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    expense_id = db.Column(db.Integer, nullable=False)
+    person_id = db.Column(db.Integer, nullable=False)
+    group_id = db.Column(db.Integer, nullable=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    percentage = db.Column(db.Numeric(5, 2), nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExpenseSplitArchive {self.id} Expense:{self.expense_id}>'
+
+class PaymentArchive(db.Model):
+    __tablename__ = 'payments_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    payer_id = db.Column(db.Integer, nullable=False)
+    payee_id = db.Column(db.Integer, nullable=False)
+    group_id = db.Column(db.Integer, nullable=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PaymentArchive {self.id}>'
+
+class LedgerVersion(db.Model):
+    __tablename__ = 'ledger_version'
+    
+    # Single row (id 1) whose version is bumped by every expense or payment write
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<LedgerVersion {self.version}>'
+
+
+class LedgerEvent(db.Model):
+    __tablename__ = 'ledger_events'
+    
+    # Append-only: one row per expense or payment write, never updated or deleted
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.Enum(LedgerEventKind), nullable=False)
+    # No foreign keys: deleted expenses and payments keep their history. Exactly one is set.
+    expense_id = db.Column(db.Integer, nullable=True, index=True)
+    payment_id = db.Column(db.Integer, nullable=True, index=True)
+    group_id = db.Column(db.Integer, nullable=True)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        subject = f'Expense:{self.expense_id}' if self.expense_id is not None else f'Payment:{self.payment_id}'
+        return f'<LedgerEvent {self.id} {self.kind.value} {subject}>'
+
+class LedgerEventDelta(db.Model):
+    __tablename__ = 'ledger_event_deltas'
+    
+    # Net balance change of one person in one event
+    event_id = db.Column(db.Integer, db.ForeignKey('ledger_events.id'), primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('people.id'), primary_key=True)
+    paid_delta = db.Column(db.Numeric(14, 2), nullable=False)
+    share_delta = db.Column(db.Numeric(14, 2), nullable=False)
+    
+    def __repr__(self):
+        return f'<LedgerEventDelta Event:{self.event_id} Person:{self.person_id}>'
+
+class BalanceCheckpoint(db.Model):
+    __tablename__ = 'balance_checkpoints'
+    
+    # Copy of person_balances after every event up to last_event_id
+    id = db.Column(db.Integer, primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<BalanceCheckpoint {self.id} at event {self.last_event_id}>'
+
+class BalanceCheckpointRow(db.Model):
+    __tablename__ = 'balance_checkpoint_rows'
+    
+    checkpoint_id = db.Column(db.Integer, db.ForeignKey('balance_checkpoints.id'), primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('people.id'), primary_key=True)
+    total_paid = db.Column(db.Numeric(14, 2), nullable=False)
+    fair_share = db.Column(db.Numeric(14, 2), nullable=False)
+    
+    def __repr__(self):
+        return f'<BalanceCheckpointRow Checkpoint:{self.checkpoint_id} Person:{self.person_id}>'
@@ -0,0 +1,82 @@
+"""
+Payment write pipeline for Split App
+Records that a suggested settlement was actually paid. A payment joins the
+balance ledger like an expense: the payer's total_paid and the payee's
+fair_share both grow by the amount, so the debt it pays back disappears from
+balances, settlements and pairwise debts. Nothing here commits; the caller
+commits once.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app import db
+from balance_ledger import BalanceLedger
+from models import Payment, Person
+
+
+class PaymentService:
+    """Creates, lists and deletes payments together with their ledger deltas"""
+
+    @staticmethod
+    def create_payment(data: Dict, group_id: Optional[int] = None) -> Payment:
+        """
+        Add a validated payment to the session and record it in the ledger.
+        Both people must already exist: a payment settles an existing debt, so
+        a misspelt name is an error rather than a new person.
+        Raises ValueError naming any unknown person.
+        """
+        payer, payee = data['from'].strip(), data['to'].strip()
+        ids = dict(db.session.execute(
+            select(Person.name, Person.id).where(Person.name.in_([payer, payee]))
+        ).all())
+        unknown = [name for name in (payer, payee) if name not in ids]
+        if unknown:
+            raise ValueError(f"Unknown person: {', '.join(unknown)}")
+
+        payment = Payment(
+            payer_id=ids[payer],
+            payee_id=ids[payee],
+            group_id=group_id,
+            amount=Decimal(str(data['amount'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        )
+        db.session.add(payment)
+        db.session.flush()
+        BalanceLedger.record_payment(payment)
+        return payment
+
+    @staticmethod
+    def delete_payment(payment: Payment) -> None:
+        """Remove a payment from the session and the ledger"""
+        BalanceLedger.retract_payment(payment)
+        db.session.delete(payment)
+
+    @staticmethod
+    def payment_dicts(group_id: Optional[int] = None) -> List[Dict]:
+        """
+        Every payment not yet compacted, optionally in one group, newest first,
+        with both names read in the same query
+        """
+        payer, payee = aliased(Person), aliased(Person)
+        query = (
+            select(Payment.id, payer.name, payee.name, Payment.amount, Payment.group_id, Payment.created_at)
+            .join(payer, payer.id == Payment.payer_id)
+            .join(payee, payee.id == Payment.payee_id)
+            .order_by(Payment.created_at.desc(), Payment.id.desc())
+        )
+        if group_id is not None:
+            query = query.where(Payment.group_id == group_id)
+        return [
+            {
+                'id': payment_id,
+                'from': payer_name,
+                'to': payee_name,
+                'amount': float(amount),
+                'group_id': payment_group_id,
+                'created_at': created_at.isoformat() if created_at else None
+            }
+            for payment_id, payer_name, payee_name, amount, payment_group_id, created_at in db.session.execute(query)
+        ]
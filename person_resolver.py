@@ -0,0 +1,152 @@
+"""
+Person name resolution for Split App
+Resolves many person names to ids at once, creating the missing people in a
+single statement instead of one lookup and flush per name, and keeps a
+per-process LRU cache of name -> id for names seen in committed transactions.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from app import db
+from db_utils import dialect_insert
+from models import Person
+
+# Keeps IN (...) lists well under database parameter limits
+LOOKUP_CHUNK_SIZE = 1000
+
+# Names kept in the per-process cache
+CACHE_SIZE = 10000
+
+# session.info key for ids resolved in the session's open transaction
+_PENDING_KEY = 'person_resolver_pending'
+
+
+class _NameCache:
+    """Thread-safe LRU mapping of person name -> id"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names) -> Dict[str, int]:
+        hits = {}
+        with self._lock:
+            for name in names:
+                person_id = self._entries.get(name)
+                if person_id is not None:
+                    self._entries.move_to_end(name)
+                    hits[name] = person_id
+        return hits
+
+    def put_many(self, mapping: Dict[str, int]) -> None:
+        with self._lock:
+            self._entries.update(mapping)
+            for name in mapping:
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, names) -> None:
+        with self._lock:
+            for name in names:
+                self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _NameCache(CACHE_SIZE)
+
+
+@event.listens_for(Session, 'after_commit')
+def _promote_pending(session):
+    """Ids resolved in a committed transaction are now visible to everyone; cache them"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _cache.put_many(pending)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_pending(session, transaction):
+    """A transaction that ended without committing may have created people that no longer exist"""
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+class PersonResolver:
+    """
+    Maps person names to ids, creating people that do not exist yet.
+    New people join the caller's transaction; callers are responsible for committing.
+    Ids only enter the shared cache once that transaction commits.
+    """
+
+    @staticmethod
+    def _lookup(names) -> Dict[str, int]:
+        """Return the ids of the people among names that already exist"""
+        names = list(names)
+        found = {}
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+            found.update(db.session.execute(select(Person.name, Person.id).where(Person.name.in_(chunk))).all())
+        return found
+
+    @staticmethod
+    def _create(names) -> Dict[str, int]:
+        """
+        Insert people for names in one INSERT ... ON CONFLICT DO NOTHING RETURNING.
+        Names created concurrently by another transaction are skipped by the insert
+        and picked up by a follow-up lookup rather than duplicated.
+        """
+        rows = [{'name': name} for name in sorted(names)]
+        stmt = dialect_insert(Person)
+        if stmt is None:
+            stmt = insert(Person)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Person.name])
+
+        created = dict(db.session.execute(stmt.returning(Person.name, Person.id), rows).all())
+        conflicted = set(names) - created.keys()
+        if conflicted:
+            created.update(PersonResolver._lookup(conflicted))
+        return created
+
+    @staticmethod
+    def resolve_ids(names: Iterable[str]) -> Dict[str, int]:
+        """
+        Return a name -> id mapping for every name, creating the missing people.
+        Cached names cost nothing; the rest cost one lookup plus, if any are new,
+        one insert, however many names are passed.
+        """
+        wanted = set(names)
+        ids = _cache.get_many(wanted)
+
+        uncached = wanted - ids.keys()
+        if uncached:
+            resolved = PersonResolver._lookup(uncached)
+            missing = uncached - resolved.keys()
+            if missing:
+                resolved.update(PersonResolver._create(missing))
+            db.session.info.setdefault(_PENDING_KEY, {}).update(resolved)
+            ids.update(resolved)
+
+        return ids
+
+    @staticmethod
+    def resolve_id(name: str) -> int:
+        """Return the id for a single name, creating the person if needed"""
+        return PersonResolver.resolve_ids([name])[name]
+
+    @staticmethod
+    def invalidate(names: Optional[Iterable[str]] = None) -> None:
+        """Forget cached ids for names, or the whole cache, e.g. after people are removed"""
+        if names is None:
+            _cache.clear()
+        else:
+            _cache.discard(names)
@@ -4,8 +4,9 @@ Populates database with sample people and expenses for testing
 """
 
 from app import db
-from models import Person, Expense, SplitMethod
-from settlement_calculator import SettlementCalculator
+from models import Expense
+from expense_service import ExpenseService
+from person_resolver import PersonResolver
 
 def populate_sample_data():
     """Populate database with sample data for testing"""
@@ -18,14 +19,7 @@ def populate_sample_data():
     ]
     
     # Create people
-    people = {}
-    for name in people_data:
-        person = Person.query.filter_by(name=name).first()
-        if not person:
-            person = Person(name=name)
-            db.session.add(person)
-            db.session.flush()
-        people[name] = person
+    PersonResolver.resolve_ids(people_data)
     
     # Sample expenses
     expenses_data = [
@@ -70,22 +64,7 @@ def populate_sample_data():
         ).first()
         
         if not existing:
-            payer = people[expense_data["paid_by"]]
-            
-            expense = Expense(
-                amount=expense_data["amount"],
-                description=expense_data["description"],
-                paid_by_id=payer.id,
-                split_method=SplitMethod.EQUAL
-            )
-            db.session.add(expense)
-            db.session.flush()
-            
-            # Create equal splits
-            SettlementCalculator.create_equal_splits(
-                expense.id, 
-                expense_data["participants"]
-            )
+            ExpenseService.create_expense(expense_data)
     
     db.session.commit()
     print("Sample data populated successfully!")
@@ -0,0 +1,102 @@
+"""
+JSON serialization for Split App read endpoints
+Listings are built straight from selected row tuples instead of hydrated ORM
+objects, and encoded with orjson when it is installed (stdlib json otherwise).
+Both encoders produce the compact, key-sorted output jsonify gives in
+production. Money can be rendered as JSON numbers (the default) or as exact
+decimal strings such as "12.30".
+"""
+
+import json
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional fast encoder
+    orjson = None
+
+# Accepted values of the money= query argument
+MONEY_FORMATS = ('number', 'string')
+
+
+def _default(value):
+    """Encode the types the row serializers leave as they are, the way jsonify would"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    """Encode obj as a compact, key-sorted JSON document followed by a newline"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=_default, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def money_formatter(money: str = 'number'):
+    """Return the function that renders a Decimal amount in the requested money format"""
+    return str if money == 'string' else float
+
+
+def split_dicts(split_rows: Iterable, money: str = 'number') -> Dict[int, List[Dict]]:
+    """
+    Group (expense_id, id, person_id, person_name, amount, percentage) rows by expense,
+    in the shape of ExpenseSplit.to_dict.
+    """
+    amount = money_formatter(money)
+    splits = {}
+    for expense_id, split_id, person_id, person_name, split_amount, percentage in split_rows:
+        splits.setdefault(expense_id, []).append({
+            'id': split_id,
+            'expense_id': expense_id,
+            'person_id': person_id,
+            'person_name': person_name,
+            'amount': amount(split_amount),
+            'percentage': float(percentage) if percentage else None
+        })
+    return splits
+
+
+def expense_dicts(rows: Iterable, splits: Optional[Dict[int, List[Dict]]] = None,
+                  fields: Optional[List[str]] = None, money: str = 'number') -> List[Dict]:
+    """
+    Build Expense.to_dict-shaped dicts from rows of expense_listing.expense_row_query.
+    splits maps expense ids to split dicts (from split_dicts) and is only read when
+    the splits field is wanted.
+    """
+    amount = money_formatter(money)
+    with_payer = fields is None or 'paid_by' in fields
+    with_splits = fields is None or 'splits' in fields
+
+    expenses = []
+    for row in rows:
+        data = {
+            'id': row.id,
+            'amount': amount(row.amount),
+            'description': row.description,
+            'paid_by_id': row.paid_by_id,
+            'group_id': row.group_id,
+            'split_method': row.split_method.value,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        if with_payer:
+            data['paid_by'] = row.paid_by
+        if with_splits:
+            data['splits'] = splits.get(row.id, []) if splits else []
+        if fields is not None:
+            data = {field: data[field] for field in fields}
+        expenses.append(data)
+    return expenses
+
+
+def person_dicts(rows: Iterable) -> List[Dict]:
+    """Build Person.to_dict-shaped dicts from (id, name, created_at) rows"""
+    return [{'id': person_id, 'name': name, 'created_at': created_at} for person_id, name, created_at in rows]
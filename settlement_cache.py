@@ -0,0 +1,222 @@
+"""
+Balance and settlement cache for Split App
+Balances and settlements are cached under the current ledger version, which
+every expense write bumps. A write therefore invalidates every cached result
+as soon as it commits, and until the next write repeated reads cost a single
+version lookup. Entries live in a per-process LRU and, when REDIS_URL is
+set and the redis package is installed, in Redis shared by all processes.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from balance_ledger import BalanceLedger
+from settlement_calculator import SettlementCalculator
+
+try:
+    import redis
+except ImportError:  # Optional shared backend
+    redis = None
+
+# Entries kept in the per-process cache
+CACHE_SIZE = 256
+
+# Shared entries expire on their own once newer versions stop reading them
+REDIS_TTL = 600  # seconds
+REDIS_KEY_PREFIX = 'split:cache:'
+
+
+class _VersionedLRU:
+    """Thread-safe LRU that drops all entries when a newer ledger version is seen"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version: int, key: str):
+        with self._lock:
+            if version != self.version:
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, version: int, key: str, value) -> None:
+        with self._lock:
+            if self.version is None or version > self.version:
+                self.version = version
+                self._entries.clear()
+            elif version < self.version:
+                return  # Computed from an older snapshot; already superseded
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version = None
+            self._entries.clear()
+
+
+_local = _VersionedLRU(CACHE_SIZE)
+_shared = None
+# Hit and miss counts per kind of entry, the part of the key before the first colon
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _shared_backend():
+    """Return the Redis client when one is configured and importable, else None"""
+    global _shared
+    url = os.environ.get('REDIS_URL')
+    if _shared is None and url and redis is not None:
+        _shared = redis.Redis.from_url(url)
+    return _shared
+
+
+def _count(key: str, outcome: str) -> None:
+    kind = key.split(':', 1)[0]
+    with _stats_lock:
+        counts = _stats.setdefault(kind, {'hits': 0, 'misses': 0})
+        counts[outcome] += 1
+
+
+class SettlementCache:
+    """Reads balances and settlements through the versioned cache"""
+
+    @staticmethod
+    def get_or_compute(key: str, compute: Callable, version: Optional[int] = None) -> Tuple[object, bool]:
+        """
+        Return (value, cached) for key at the current ledger version, computing and
+        storing the value on a miss. Values must be JSON-serializable for the shared backend.
+        Shared backend errors are logged and the local cache is used alone.
+        """
+        if version is None:
+            version = BalanceLedger.version()
+
+        value = SettlementCache.lookup(key, version)
+        if value is not None:
+            return value, True
+
+        value = compute()
+        SettlementCache.store(key, version, value)
+        return value, False
+
+    @staticmethod
+    def lookup(key: str, version: int):
+        """Return the cached value for key at version, or None (counted as a miss)"""
+        value = _local.get(version, key)
+        if value is not None:
+            _count(key, 'hits')
+            return value
+
+        shared = _shared_backend()
+        if shared is not None:
+            try:
+                raw = shared.get(f"{REDIS_KEY_PREFIX}{version}:{key}")
+                if raw is not None:
+                    value = json.loads(raw)
+                    _local.put(version, key, value)
+                    _count(key, 'hits')
+                    return value
+            except redis.RedisError as e:
+                logging.warning(f"Settlement cache backend unavailable: {str(e)}")
+
+        _count(key, 'misses')
+        return None
+
+    @staticmethod
+    def store(key: str, version: int, value) -> None:
+        """Cache a value computed for key at version"""
+        _local.put(version, key, value)
+        shared = _shared_backend()
+        if shared is not None:
+            try:
+                shared.set(f"{REDIS_KEY_PREFIX}{version}:{key}", json.dumps(value), ex=REDIS_TTL)
+            except redis.RedisError as e:
+                logging.warning(f"Settlement cache backend unavailable: {str(e)}")
+
+    @staticmethod
+    def balances_key(group_id: Optional[int] = None) -> str:
+        return f"balances:{group_id}"
+
+    @staticmethod
+    def settlements_key(mode: str = 'greedy', group_id: Optional[int] = None) -> str:
+        return f"settlements:{group_id}:{mode}"
+
+    @staticmethod
+    def aggregates(group_id: Optional[int] = None, version: Optional[int] = None) -> List[Tuple[str, Decimal, Decimal]]:
+        """Cached SettlementCalculator.aggregate_balances, shared by balances and settlements"""
+        rows, _ = SettlementCache.get_or_compute(
+            f"aggregates:{group_id}",
+            lambda: [[name, str(paid), str(share)]
+                     for name, paid, share in SettlementCalculator.aggregate_balances(group_id)],
+            version
+        )
+        return [(name, Decimal(paid), Decimal(share)) for name, paid, share in rows]
+
+    @staticmethod
+    def balances(group_id: Optional[int] = None, version: Optional[int] = None) -> Dict[str, Dict]:
+        """Cached SettlementCalculator.calculate_balances, at version if the caller already read it"""
+        if version is None:
+            version = BalanceLedger.version()
+        balances, _ = SettlementCache.get_or_compute(
+            SettlementCache.balances_key(group_id),
+            lambda: SettlementCalculator.calculate_balances(
+                group_id, SettlementCache.aggregates(group_id, version)),
+            version
+        )
+        return balances
+
+    @staticmethod
+    def settlements(mode: str = 'greedy', group_id: Optional[int] = None, version: Optional[int] = None) -> Dict:
+        """
+        Cached SettlementCalculator.solve_settlements, at version if the caller already read it.
+        The result gains a cached flag; elapsed_ms is the time of the solve that produced it,
+        which differs between processes, so responses report it in a header, not the body.
+        """
+        if version is None:
+            version = BalanceLedger.version()
+        result, cached = SettlementCache.get_or_compute(
+            SettlementCache.settlements_key(mode, group_id),
+            lambda: SettlementCalculator.solve_settlements(
+                mode, group_id, SettlementCache.aggregates(group_id, version)),
+            version
+        )
+        return dict(result, cached=cached)
+
+    @staticmethod
+    def debts(group_id: Optional[int] = None, version: Optional[int] = None) -> List[Dict]:
+        """Cached SettlementCalculator.pairwise_debts, at version if the caller already read it"""
+        if version is None:
+            version = BalanceLedger.version()
+        debts, _ = SettlementCache.get_or_compute(
+            f"debts:{group_id}",
+            lambda: SettlementCalculator.pairwise_debts(group_id),
+            version
+        )
+        return debts
+
+    @staticmethod
+    def stats() -> Dict[str, Dict[str, int]]:
+        """
+        Return hit and miss counts since the process started per kind of entry
+        (balances, settlements, aggregates, debts, dashboard). Kinds are counted
+        apart because a settlements miss also looks up the aggregates it is solved from.
+        """
+        with _stats_lock:
+            return {kind: dict(counts) for kind, counts in _stats.items()}
+
+    @staticmethod
+    def clear() -> None:
+        """Drop every entry from the per-process cache"""
+        _local.clear()
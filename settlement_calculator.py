@@ -1,7 +1,17 @@
-from decimal import Decimal, ROUND_HALF_UP
+import time
 from collections import defaultdict
-from typing import List, Dict, Tuple
-from models import Person, Expense, ExpenseSplit
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import func, or_, select, union_all
+from models import CarriedBalance, Person, Expense, ExpenseSplit, Payment
+from balance_ledger import BalanceLedger
+from columnar_ledger import LedgerSnapshot, cents, configured_engine
+import snapshot_file
+from metrics import observe_phase
+from settlement_solver import OPTIMAL_TIME_BUDGET, settle_cents, solve_components, split_components
+
+# Settlement solver modes accepted by SettlementCalculator.solve_settlements
+SETTLEMENT_MODES = ('greedy', 'optimal')
 
 class SettlementCalculator:
     """
@@ -10,32 +20,213 @@ class SettlementCalculator:
     """
     
     @staticmethod
-    def calculate_balances() -> Dict[str, Dict]:
+    def balance_query(group_id: Optional[int] = None):
+        """
+        Build the aggregate query returning (person_id, name, total_paid, fair_share)
+        recomputed from expenses, splits, payments and carried balances. Each source
+        is summed per person in its own grouped subquery, the sums are added up and
+        outer-joined onto people, so the whole ledger is reduced in a single round trip.
+        With a group_id, only that group's rows and members are read; compacted
+        history is not broken down by group, so carried balances are left out.
+        """
+        paid_sources = [
+            select(Expense.paid_by_id.label('person_id'), func.sum(Expense.amount).label('amount'))
+            .group_by(Expense.paid_by_id),
+            select(Payment.payer_id.label('person_id'), func.sum(Payment.amount).label('amount'))
+            .group_by(Payment.payer_id),
+        ]
+        share_sources = [
+            select(ExpenseSplit.person_id.label('person_id'), func.sum(ExpenseSplit.amount).label('amount'))
+            .group_by(ExpenseSplit.person_id),
+            select(Payment.payee_id.label('person_id'), func.sum(Payment.amount).label('amount'))
+            .group_by(Payment.payee_id),
+        ]
+        if group_id is None:
+            paid_sources.append(select(CarriedBalance.person_id, CarriedBalance.total_paid))
+            share_sources.append(select(CarriedBalance.person_id, CarriedBalance.fair_share))
+        else:
+            paid_columns = (Expense.group_id, Payment.group_id)
+            paid_sources = [source.where(column == group_id) for source, column in zip(paid_sources, paid_columns)]
+            share_columns = (ExpenseSplit.group_id, Payment.group_id)
+            share_sources = [source.where(column == group_id) for source, column in zip(share_sources, share_columns)]
+        
+        paid = union_all(*paid_sources).subquery()
+        paid = (
+            select(paid.c.person_id, func.sum(paid.c.amount).label('total_paid'))
+            .group_by(paid.c.person_id)
+            .subquery()
+        )
+        share = union_all(*share_sources).subquery()
+        share = (
+            select(share.c.person_id, func.sum(share.c.amount).label('fair_share'))
+            .group_by(share.c.person_id)
+            .subquery()
+        )
+        query = (
+            select(Person.id, Person.name)
+            .add_columns(func.coalesce(paid.c.total_paid, 0).label('total_paid'),
+                         func.coalesce(share.c.fair_share, 0).label('fair_share'))
+            .outerjoin(paid, paid.c.person_id == Person.id)
+            .outerjoin(share, share.c.person_id == Person.id)
+            .order_by(Person.id)
+        )
+        if group_id is not None:
+            # A group's members are the people with a row in any of its sources
+            query = query.where(or_(paid.c.person_id.is_not(None), share.c.person_id.is_not(None)))
+        return query
+
+    @staticmethod
+    def aggregate_balances(group_id: Optional[int] = None) -> List[Tuple[str, Decimal, Decimal]]:
+        """
+        Return (name, total_paid, fair_share) for every person as exact Decimals.
+        Installation-wide balances are read from the materialized balance ledger;
+        group balances are aggregated from that group's expenses, splits and
+        payments, in SQL
+        or, with BALANCE_ENGINE=numpy, by the columnar engine.
+        """
+        from app import db
+
+        started = time.perf_counter()
+        if group_id is not None and configured_engine() == 'numpy':
+            rows = SettlementCalculator.columnar_balance_rows(group_id)
+        else:
+            rows = db.session.execute(SettlementCalculator.aggregate_query(group_id))
+        aggregates = SettlementCalculator.aggregates_from_rows(rows)
+        observe_phase('aggregate', started)
+        return aggregates
+
+    @staticmethod
+    def recomputed_balance_rows() -> List[Tuple[int, str, Decimal, Decimal]]:
+        """
+        Recompute (person_id, name, total_paid, fair_share) for every person from
+        expenses, splits, payments and carried balances, bypassing the ledger, with
+        the configured engine.
+        """
+        from app import db
+
+        if configured_engine() == 'numpy':
+            # Always from the database: drift and rebuild check the ledger against it
+            return SettlementCalculator.columnar_balance_rows(snapshot=LedgerSnapshot.load())
+        return db.session.execute(SettlementCalculator.balance_query()).all()
+
+    @staticmethod
+    def ledger_snapshot(group_id: Optional[int] = None) -> LedgerSnapshot:
+        """
+        The columnar engine's arrays for the whole ledger or one group: read from the
+        memory-mapped snapshot file with newer writes applied on top when
+        LEDGER_SNAPSHOT_PATH names one, loaded from the database otherwise.
+        """
+        mapped = snapshot_file.current()
+        if mapped is not None:
+            return mapped.ledger(group_id)
+        return LedgerSnapshot.load(group_id)
+
+    @staticmethod
+    def columnar_balance_rows(group_id: Optional[int] = None,
+                              snapshot: Optional[LedgerSnapshot] = None) -> List[Tuple[int, str, Decimal, Decimal]]:
+        """
+        balance_query's rows computed by the columnar engine, from snapshot or else
+        ledger_snapshot. Without a group_id everyone is listed, with zero totals for
+        people who have no expenses.
+        """
+        if snapshot is None:
+            snapshot = SettlementCalculator.ledger_snapshot(group_id)
+        people, paid, share = snapshot.totals()
+        totals = dict(zip(people.tolist(), zip(paid.tolist(), share.tolist())))
+        names = SettlementCalculator.person_names()
+        ids = sorted(names) if group_id is None else totals
+        return [
+            (person_id, names[person_id], *(Decimal(c).scaleb(-2) for c in totals.get(person_id, (0, 0))))
+            for person_id in ids
+        ]
+
+    @staticmethod
+    def person_names() -> Dict[int, str]:
+        """Map every person id to their name, from the snapshot's name table when one is mapped"""
+        from app import db
+
+        mapped = snapshot_file.current()
+        if mapped is not None:
+            return mapped.names()
+        return dict(db.session.execute(select(Person.id, Person.name)).all())
+
+    @staticmethod
+    def pairwise_debts(group_id: Optional[int] = None) -> List[Dict]:
+        """
+        Return who owes whom before any settlement: every split owes its expense's
+        payer, recorded payments pay debts back, and debts between two people in
+        opposite directions cancel out. Ordered by debtor then creditor id. Uses the
+        configured engine. Compacted history is left out: its people were all
+        settled up, so any debts it still held only went round in circles.
+        """
+        from app import db
+
+        if configured_engine() == 'numpy':
+            debtors, creditors, amounts = SettlementCalculator.ledger_snapshot(group_id).pairwise()
+            debts = zip(debtors.tolist(), creditors.tolist(), amounts.tolist())
+        else:
+            query = (
+                select(ExpenseSplit.person_id, Expense.paid_by_id, func.sum(cents(ExpenseSplit.amount)))
+                .join(Expense, Expense.id == ExpenseSplit.expense_id)
+                .where(ExpenseSplit.person_id != Expense.paid_by_id)
+                .group_by(ExpenseSplit.person_id, Expense.paid_by_id)
+            )
+            # A payment is owed back by its payee, cancelling the payer's debt
+            repaid = (
+                select(Payment.payee_id, Payment.payer_id, func.sum(cents(Payment.amount)))
+                .group_by(Payment.payee_id, Payment.payer_id)
+            )
+            if group_id is not None:
+                query = query.where(ExpenseSplit.group_id == group_id)
+                repaid = repaid.where(Payment.group_id == group_id)
+            net = defaultdict(int)
+            for debtor, creditor, amount in db.session.execute(union_all(query, repaid)):
+                if debtor < creditor:
+                    net[(debtor, creditor)] += int(amount)
+                else:
+                    net[(creditor, debtor)] -= int(amount)
+            debts = sorted((low, high, amount) if amount > 0 else (high, low, -amount)
+                           for (low, high), amount in net.items() if amount)
+
+        names = SettlementCalculator.person_names()
+        return [
+            {'from': names[debtor], 'to': names[creditor], 'amount': amount / 100}
+            for debtor, creditor, amount in debts
+        ]
+
+    @staticmethod
+    def aggregate_query(group_id: Optional[int] = None):
+        """Build the query aggregate_balances runs, for callers executing it on another session"""
+        if group_id is None:
+            return BalanceLedger.balance_query()
+        return SettlementCalculator.balance_query(group_id)
+
+    @staticmethod
+    def aggregates_from_rows(rows) -> List[Tuple[str, Decimal, Decimal]]:
+        """Convert (person_id, name, total_paid, fair_share) rows into aggregate_balances tuples"""
+        return [
+            (name, Decimal(str(total_paid)), Decimal(str(fair_share)))
+            for _, name, total_paid, fair_share in rows
+        ]
+
+    @staticmethod
+    def calculate_balances(group_id: Optional[int] = None, aggregates: Optional[List[Tuple]] = None) -> Dict[str, Dict]:
         """
         Calculate each person's balance (total_paid - fair_share).
         Returns a dictionary with person names as keys and balance info as values.
+        Pass a group_id to limit the calculation to one group's expenses, or
+        aggregates from aggregate_balances to reuse balances already read.
         """
-        balances = {}
+        if aggregates is None:
+            aggregates = SettlementCalculator.aggregate_balances(group_id)
         
-        # Get all people who have been involved in expenses
-        people = Person.query.all()
+        balances = {}
         
-        for person in people:
-            total_paid = Decimal('0')
-            fair_share = Decimal('0')
-            
-            # Calculate total paid by this person
-            for expense in person.expenses_paid:
-                total_paid += expense.amount
-            
-            # Calculate fair share (total amount they should pay based on splits)
-            for split in person.expense_splits:
-                fair_share += split.amount
-            
+        for name, total_paid, fair_share in aggregates:
             balance = total_paid - fair_share
             
-            balances[person.name] = {
-                'name': person.name,
+            balances[name] = {
+                'name': name,
                 'total_paid': float(total_paid),
                 'fair_share': float(fair_share),
                 'balance': float(balance)  # Positive means they are owed money, negative means they owe money
@@ -44,161 +235,140 @@ class SettlementCalculator:
         return balances
     
     @staticmethod
-    def calculate_settlements() -> List[Dict]:
+    def net_balances(group_id: Optional[int] = None, aggregates: Optional[List[Tuple]] = None) -> List[Tuple[str, int]]:
+        """
+        Return (name, balance_in_cents) for everyone with a non-zero balance.
+        """
+        if aggregates is None:
+            aggregates = SettlementCalculator.aggregate_balances(group_id)
+        
+        net = []
+        for name, total_paid, fair_share in aggregates:
+            balance = (total_paid - fair_share).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            if balance:
+                net.append((name, int(balance * 100)))
+        return net
+    
+    @staticmethod
+    def calculate_settlements(mode: str = 'greedy', group_id: Optional[int] = None) -> List[Dict]:
         """
         Calculate the minimal set of transactions to settle all balances.
-        Uses a greedy algorithm to minimize the number of transactions.
+        Uses a greedy algorithm unless mode='optimal' is requested.
+        """
+        return SettlementCalculator.solve_settlements(mode, group_id)['settlements']
+    
+    @staticmethod
+    def solve_settlements(mode: str = 'greedy', group_id: Optional[int] = None,
+                          aggregates: Optional[List[Tuple]] = None,
+                          components: Optional[Dict[str, int]] = None) -> Dict:
+        """
+        Calculate settlements with the requested solver mode, optionally within one group.
+        Balances are split into the connected components of the debt graph (people
+        linked by shared expenses) and each component is settled on its own, so nobody
+        is asked to pay someone outside their circle. components maps names to
+        component labels, as read by component_labels, and is read when not given.
+        Returns the settlements along with the solver that produced them, the reason
+        for falling back to greedy (if any), the number of components and the solver
+        time in milliseconds.
         """
-        balances = SettlementCalculator.calculate_balances()
+        if mode not in SETTLEMENT_MODES:
+            raise ValueError(f"Invalid settlement mode: {mode}")
         
-        # Separate creditors (positive balance) and debtors (negative balance)
-        creditors = []  # People who are owed money
-        debtors = []    # People who owe money
+        if aggregates is None:
+            aggregates = SettlementCalculator.aggregate_balances(group_id)
+        if components is None:
+            components = SettlementCalculator.component_labels()
         
-        for person_name, balance_info in balances.items():
-            balance = Decimal(str(balance_info['balance'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            
-            if balance > 0:
-                creditors.append({'name': person_name, 'amount': balance})
-            elif balance < 0:
-                debtors.append({'name': person_name, 'amount': abs(balance)})
+        start = time.perf_counter()
+        balances = SettlementCalculator.net_balances(group_id, aggregates)
+        subsets = split_components(balances, components)
+        matching = observe_phase('partition', start)
         
         settlements = []
-        
-        # Sort by amount (largest first) to minimize transactions
-        creditors.sort(key=lambda x: x['amount'], reverse=True)
-        debtors.sort(key=lambda x: x['amount'], reverse=True)
-        
-        i, j = 0, 0
-        
-        while i < len(creditors) and j < len(debtors):
-            creditor = creditors[i]
-            debtor = debtors[j]
-            
-            # Calculate the settlement amount (minimum of what creditor is owed and debtor owes)
-            settlement_amount = min(creditor['amount'], debtor['amount'])
-            
-            if settlement_amount > Decimal('0.01'):  # Only create settlement if amount is significant
+        solver, fallback = mode, None
+        for transfers, component_solver, component_fallback in solve_components(
+                subsets, mode, time.time() + OPTIMAL_TIME_BUDGET):
+            if component_solver != mode:
+                solver = component_solver
+                fallback = fallback or component_fallback
+            for debtor, creditor, cents in transfers:
                 settlements.append({
-                    'from': debtor['name'],
-                    'to': creditor['name'],
-                    'amount': float(settlement_amount)
+                    'from': debtor,
+                    'to': creditor,
+                    'amount': cents / 100
                 })
-                
-                # Update remaining amounts
-                creditor['amount'] -= settlement_amount
-                debtor['amount'] -= settlement_amount
-            
-            # Move to next creditor/debtor if current one is settled
-            if creditor['amount'] <= Decimal('0.01'):
-                i += 1
-            if debtor['amount'] <= Decimal('0.01'):
-                j += 1
+        observe_phase('match', matching)
         
-        return settlements
+        return {
+            'settlements': settlements,
+            'mode': mode,
+            'solver': solver,
+            'fallback': fallback,
+            'components': len(subsets),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+    
+    @staticmethod
+    def component_labels() -> Dict[str, int]:
+        """Read the debt graph component label of everyone in the balance ledger, by name"""
+        from app import db
+
+        return SettlementCalculator.labels_from_rows(db.session.execute(BalanceLedger.component_query()))
     
     @staticmethod
-    def create_equal_splits(expense_id: int, participant_names: List[str]) -> None:
+    def labels_from_rows(rows) -> Dict[str, int]:
+        """Convert (name, component_id) rows into component_labels' mapping"""
+        return {name: component_id for name, component_id in rows}
+    
+    @staticmethod
+    def settle_cents(balances: List[Tuple[str, int]]) -> List[Tuple[str, str, int]]:
+        """Greedily settle integer-cent balances; see settlement_solver.settle_cents"""
+        return settle_cents(balances)
+    
+    @staticmethod
+    def compute_equal_splits(amount: Decimal, participants: List) -> List[Tuple]:
         """
-        Create equal splits for an expense among the specified participants.
+        Split an amount equally, returning (participant, amount, percentage) rows.
+        The last participant absorbs the rounding difference so the rows sum to amount.
         """
-        from app import db
-        
-        expense = Expense.query.get(expense_id)
-        if not expense:
-            raise ValueError("Expense not found")
+        count = len(participants)
+        split_amount = (amount / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        last_split_amount = amount - split_amount * (count - 1)
+        percentage = (Decimal('100') / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         
-        # Clear existing splits
-        ExpenseSplit.query.filter_by(expense_id=expense_id).delete()
-        
-        # Calculate equal split amount
-        split_amount = (expense.amount / len(participant_names)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        
-        # Handle rounding by adjusting the last split
-        total_splits = split_amount * (len(participant_names) - 1)
-        last_split_amount = expense.amount - total_splits
-        
-        for i, name in enumerate(participant_names):
-            person = Person.query.filter_by(name=name).first()
-            if not person:
-                person = Person(name=name)
-                db.session.add(person)
-                db.session.flush()  # Get the ID
-            
-            amount = last_split_amount if i == len(participant_names) - 1 else split_amount
-            
-            split = ExpenseSplit(
-                expense_id=expense_id,
-                person_id=person.id,
-                amount=amount,
-                percentage=Decimal('100') / len(participant_names)
-            )
-            db.session.add(split)
-        
-        db.session.commit()
+        return [
+            (participant, last_split_amount if i == count - 1 else split_amount, percentage)
+            for i, participant in enumerate(participants)
+        ]
     
     @staticmethod
-    def create_custom_splits(expense_id: int, splits_data: List[Dict], split_method: str) -> None:
+    def compute_custom_splits(amount: Decimal, splits_data: List[Dict], split_method: str) -> List[Tuple]:
         """
-        Create custom splits for an expense (exact amounts or percentages).
+        Turn exact or percentage splits into (person, amount, percentage) rows.
+        Any rounding difference is moved onto the first (exact) or last (percentage)
+        split so the rows always sum to amount.
         """
-        from app import db
-        
-        expense = Expense.query.get(expense_id)
-        if not expense:
-            raise ValueError("Expense not found")
-        
-        # Clear existing splits
-        ExpenseSplit.query.filter_by(expense_id=expense_id).delete()
-        
+        rows = []
         for split_data in splits_data:
             person_name = split_data['person'].strip()
-            person = Person.query.filter_by(name=person_name).first()
-            if not person:
-                person = Person(name=person_name)
-                db.session.add(person)
-                db.session.flush()  # Get the ID
             
             if split_method == 'exact':
-                # Use the provided exact amount
                 split_amount = Decimal(str(split_data['amount'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                percentage = (split_amount / expense.amount * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                percentage = (split_amount / amount * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
             elif split_method == 'percentage':
-                # Calculate amount from percentage
                 percentage = Decimal(str(split_data['percentage'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                split_amount = (expense.amount * percentage / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                split_amount = (amount * percentage / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
             else:
                 raise ValueError(f"Invalid split method: {split_method}")
             
-            split = ExpenseSplit(
-                expense_id=expense_id,
-                person_id=person.id,
-                amount=split_amount,
-                percentage=percentage
-            )
-            db.session.add(split)
+            rows.append([person_name, split_amount, percentage])
         
-        # Handle rounding differences for exact amounts
-        if split_method == 'exact':
-            splits = ExpenseSplit.query.filter_by(expense_id=expense_id).all()
-            total_splits = sum(split.amount for split in splits)
-            diff = expense.amount - total_splits
-            
-            if abs(diff) > Decimal('0.01'):
-                # Adjust the first split to handle rounding
-                if splits:
-                    splits[0].amount += diff
-                    splits[0].percentage = (splits[0].amount / expense.amount * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        
-        # Handle rounding differences for percentage amounts
-        elif split_method == 'percentage':
-            splits = ExpenseSplit.query.filter_by(expense_id=expense_id).all()
-            total_splits = sum(split.amount for split in splits)
-            diff = expense.amount - total_splits
-            
-            if abs(diff) > Decimal('0.01'):
-                # Adjust the last split to handle rounding
-                if splits:
-                    splits[-1].amount += diff
+        diff = amount - sum(row[1] for row in rows)
+        if diff and rows:
+            if split_method == 'exact':
+                rows[0][1] += diff
+                rows[0][2] = (rows[0][1] / amount * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            else:
+                rows[-1][1] += diff
         
-        db.session.commit()
+        return [tuple(row) for row in rows]
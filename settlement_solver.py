@@ -0,0 +1,285 @@
+"""
+Settlement solvers for Split App
+The greedy and exact solvers work on integer-cent balances alone and never
+touch the database or import the app, so the connected components of the debt
+graph can be settled independently, and in worker processes when a ledger is
+large enough to pay for shipping its balances to them.
+"""
+
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Budgets for the exact solver; beyond either one a component falls back to greedy
+OPTIMAL_MAX_BALANCES = 20
+OPTIMAL_TIME_BUDGET = 3.0  # seconds
+
+# Worker processes settling components; 1 settles everything in the calling process
+SETTLEMENT_WORKERS = int(os.environ.get('SETTLEMENT_WORKERS', '1'))
+
+# Estimated solver steps below which fanning out costs more than it saves
+SETTLEMENT_PARALLEL_MIN_WORK = int(os.environ.get('SETTLEMENT_PARALLEL_MIN_WORK', str(1 << 16)))
+
+Balances = List[Tuple[str, int]]
+
+
+class UnionFind:
+    """Disjoint sets over hashable items, with path halving and union by size"""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def find(self, item: Hashable) -> Hashable:
+        parent = self.parent
+        if item not in parent:
+            parent[item] = item
+            self.size[item] = 1
+            return item
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def union_all(self, items: Iterable[Hashable]) -> None:
+        """Put every item into one set"""
+        items = iter(items)
+        first = next(items, None)
+        if first is None:
+            return
+        # A lone item still gets a set of its own
+        first = self.find(first)
+        for item in items:
+            first = self.union(first, item)
+
+    def sets(self) -> List[List[Hashable]]:
+        """Return every set, members in insertion order"""
+        sets = defaultdict(list)
+        for item in self.parent:
+            sets[self.find(item)].append(item)
+        return list(sets.values())
+
+
+def split_components(balances: Balances, labels: Dict[str, Optional[int]]) -> List[Balances]:
+    """
+    Partition (name, cents) balances by the component label of each name, in order
+    of first appearance. Names without a label are pooled into one component, so
+    they still sum to zero together.
+    """
+    components = {}
+    for entry in balances:
+        components.setdefault(labels.get(entry[0]), []).append(entry)
+    return list(components.values())
+
+
+def settle_cents(balances: Balances) -> List[Tuple[str, str, int]]:
+    """
+    Greedily match the largest creditor with the largest debtor until one side is empty.
+    Balances are integer cents (positive means owed money); returns (from, to, cents)
+    transfers. Both sides are max-heaps, so this runs in O(n log n) and, when the
+    balances sum to zero, every cent is transferred with nothing left over.
+    """
+    # Heap entries pack (cents, position) into a single negated int, since heapq is a
+    # min-heap and plain int comparisons are much cheaper than tuple comparisons
+    width = len(balances)
+    creditors = [-(cents * width + i) for i, (_, cents) in enumerate(balances) if cents > 0]
+    debtors = [-(-cents * width + i) for i, (_, cents) in enumerate(balances) if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    settlements = []
+    while creditors and debtors:
+        owed, creditor = divmod(-creditors[0], width)
+        owes, debtor = divmod(-debtors[0], width)
+        amount = owed if owed < owes else owes
+        settlements.append((balances[debtor][0], balances[creditor][0], amount))
+
+        # Shrink whichever side is left with a remainder, drop the side that is settled
+        if owed > amount:
+            heapq.heapreplace(creditors, -((owed - amount) * width + creditor))
+        else:
+            heapq.heappop(creditors)
+        if owes > amount:
+            heapq.heapreplace(debtors, -((owes - amount) * width + debtor))
+        else:
+            heapq.heappop(debtors)
+
+    return settlements
+
+
+def zero_sum_groups(balances: Balances, deadline: float) -> Optional[List[Balances]]:
+    """
+    Partition balances into the largest possible number of zero-sum groups.
+    A group of k people settles in k - 1 transfers, so maximising the number of
+    groups minimises the total number of transfers. Returns None if the deadline
+    (a time.perf_counter() value) passes before the search completes.
+    """
+    # A debt and a credit of exactly the same amount always form their own group
+    groups = []
+    unmatched = defaultdict(list)
+    rest = []
+    for entry in balances:
+        partners = unmatched[-entry[1]]
+        if partners:
+            groups.append([partners.pop(), entry])
+        else:
+            unmatched[entry[1]].append(entry)
+    for entries in unmatched.values():
+        rest.extend(entries)
+
+    n = len(rest)
+    if n == 0:
+        return groups
+
+    # dp[mask] = most zero-sum groups that the people in mask can be split into,
+    # counted as zero-sum prefixes along the best ordering of those people
+    cents = [balance for _, balance in rest]
+    size = 1 << n
+    sums = [0] * size
+    dp = [0] * size
+    for mask in range(1, size):
+        if not mask & 0xFFF and time.perf_counter() > deadline:
+            return None
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + cents[low.bit_length() - 1]
+        best = 0
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if dp[mask ^ bit] > best:
+                best = dp[mask ^ bit]
+            bits ^= bit
+        dp[mask] = best + (1 if sums[mask] == 0 else 0)
+
+    # Walk back from the full set to recover the ordering, then cut it at zero-sum prefixes
+    order = []
+    mask = size - 1
+    while mask:
+        target = dp[mask] - (1 if sums[mask] == 0 else 0)
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if dp[mask ^ bit] == target:
+                break
+            bits ^= bit
+        order.append(bit.bit_length() - 1)
+        mask ^= bit
+    order.reverse()
+
+    group, running = [], 0
+    for index in order:
+        group.append(rest[index])
+        running += cents[index]
+        if running == 0:
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+
+    return groups
+
+
+def solve_component(balances: Balances, mode: str, deadline: float) -> Tuple[List[Tuple[str, str, int]], str, Optional[str]]:
+    """
+    Settle one component with the requested mode. deadline is a time.time() value,
+    comparable across processes, after which the exact solver gives up.
+    Returns (transfers, solver, fallback reason or None).
+    """
+    if mode != 'optimal':
+        return settle_cents(balances), 'greedy', None
+    if len(balances) > OPTIMAL_MAX_BALANCES:
+        return settle_cents(balances), 'greedy', 'size_budget'
+
+    groups = zero_sum_groups(balances, time.perf_counter() + deadline - time.time())
+    if groups is None:
+        return settle_cents(balances), 'greedy', 'time_budget'
+    return [transfer for group in groups for transfer in settle_cents(group)], 'optimal', None
+
+
+def solve_batch(components: List[Balances], mode: str, deadline: float) -> List[Tuple]:
+    """solve_component over several components; the unit of work sent to a worker"""
+    return [solve_component(balances, mode, deadline) for balances in components]
+
+
+def solve_components(components: List[Balances], mode: str, deadline: float,
+                     workers: int = SETTLEMENT_WORKERS) -> List[Tuple]:
+    """
+    Settle every component, returning solve_component results in component order.
+    With more than one worker and enough estimated work, contiguous batches of
+    components are settled in a process pool.
+    """
+    work = [_work(balances, mode) for balances in components]
+    if workers <= 1 or len(components) < 2 or sum(work) < SETTLEMENT_PARALLEL_MIN_WORK:
+        return solve_batch(components, mode, deadline)
+
+    batches = _batches(components, work, workers * 4)
+    results = []
+    for solved in _executor(workers).map(solve_batch, batches, repeat(mode), repeat(deadline)):
+        results.extend(solved)
+    return results
+
+
+def _work(balances: Balances, mode: str) -> int:
+    """Rough solver steps for a component: n log n for greedy, 2^n for the exact solver"""
+    if mode == 'optimal' and len(balances) <= OPTIMAL_MAX_BALANCES:
+        return 1 << len(balances)
+    return len(balances)
+
+
+def _batches(components: List[Balances], work: List[int], count: int) -> List[List[Balances]]:
+    """Cut components into about `count` contiguous batches of similar work"""
+    target = sum(work) / count
+    batches, batch, load = [], [], 0
+    for balances, cost in zip(components, work):
+        batch.append(balances)
+        load += cost
+        if load >= target:
+            batches.append(batch)
+            batch, load = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """
+    The process pool of the current process, created on first use (so each server
+    worker gets its own after forking). Workers are forked: they only ever run the
+    functions in this module, which take no locks and hold no connections.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes; the next parallel solve starts a new pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,351 @@
+"""
+Memory-mapped ledger snapshot for Split App
+`python snapshot_file.py write` dumps people, expenses and splits into one
+binary file of fixed-width little-endian records plus a UTF-8 name table.
+Server workers open it with mmap and read the records as NumPy arrays in
+place, so every worker shares the same page-cache pages and a cold worker
+reads nothing from the database but what changed since the snapshot: rows
+past the snapshot's id watermarks and expenses edited or deleted after it,
+applied on top by the columnar balance engine. Payments and carried
+balances are small and always read live. Enabled with LEDGER_SNAPSHOT_PATH;
+needs NumPy.
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app import db
+from balance_ledger import BalanceLedger
+from columnar_ledger import LedgerSnapshot, cents, integer_columns, np
+from models import Expense, ExpenseSplit, Person
+
+MAGIC = b'SPLTSNAP'
+FORMAT_VERSION = 1
+
+# magic, format version, then the SnapshotHeader fields; padded to HEADER_SIZE
+HEADER = struct.Struct('<8sI4x10q')
+HEADER_SIZE = 128
+
+# Record layouts; an expense or split without a group has group_id NO_GROUP
+PERSON_RECORD = [('id', '<i8'), ('name_offset', '<u4'), ('name_length', '<u4')]
+EXPENSE_RECORD = [('id', '<i8'), ('paid_by_id', '<i8'), ('group_id', '<i8'), ('cents', '<i8')]
+SPLIT_RECORD = [('expense_id', '<i8'), ('person_id', '<i8'), ('group_id', '<i8'), ('cents', '<i8')]
+NO_GROUP = -1
+
+# Expense ids per IN (...) lookup when re-reading changed expenses
+OVERLAY_CHUNK_SIZE = 1000
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class SnapshotHeader(NamedTuple):
+    """What a snapshot holds and the watermarks newer writes are read past"""
+    ledger_version: int
+    written_at: int           # microseconds since the epoch
+    people: int
+    expenses: int
+    splits: int
+    names_size: int           # bytes in the name table
+    max_person_id: int
+    max_expense_id: int
+    max_split_id: int
+    updated_watermark: int    # newest expenses.updated_at, microseconds since the epoch
+
+
+def _microseconds(moment: Optional[datetime]) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1) if moment else 0
+
+
+def _aligned(size: int) -> int:
+    """Round a section size up to 8 bytes so every record array starts aligned"""
+    return -(-size // 8) * 8
+
+
+def _sections(header: SnapshotHeader) -> List[int]:
+    """Byte offsets of the people, expenses, splits and name sections"""
+    offsets, offset = [], HEADER_SIZE
+    for count, record in ((header.people, PERSON_RECORD), (header.expenses, EXPENSE_RECORD),
+                          (header.splits, SPLIT_RECORD)):
+        offsets.append(offset)
+        offset += _aligned(count * np.dtype(record).itemsize)
+    return offsets + [offset]
+
+
+def _records(statement, record) -> 'np.ndarray':
+    """Run an all-integer select and pack its columns into a record array"""
+    columns = integer_columns(statement, len(record))
+    records = np.empty(columns.shape[1], dtype=record)
+    for (field, _), column in zip(record, columns):
+        records[field] = column
+    return records
+
+
+def write_snapshot(path: str) -> SnapshotHeader:
+    """
+    Write a snapshot of the whole ledger to path, atomically replacing any older one.
+    Watermarks are read first and every section is cut at them, so rows written
+    while the snapshot is taken are left to the overlay rather than half-included.
+    """
+    version = BalanceLedger.version()
+    max_person_id, max_expense_id, max_split_id = (
+        db.session.execute(select(func.max(model.id))).scalar() or 0
+        for model in (Person, Expense, ExpenseSplit)
+    )
+    updated_watermark = db.session.execute(select(func.max(Expense.updated_at))).scalar()
+
+    people = db.session.execute(
+        select(Person.id, Person.name).where(Person.id <= max_person_id).order_by(Person.id)
+    ).all()
+    encoded = [name.encode('utf-8') for _, name in people]
+    lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+    person_records = np.empty(len(people), dtype=PERSON_RECORD)
+    person_records['id'] = [person_id for person_id, _ in people]
+    person_records['name_length'] = lengths
+    person_records['name_offset'] = np.cumsum(lengths) - lengths
+    names = b''.join(encoded)
+
+    expense_records = _records(
+        select(Expense.id, Expense.paid_by_id, func.coalesce(Expense.group_id, NO_GROUP), cents(Expense.amount))
+        .where(Expense.id <= max_expense_id)
+        .order_by(Expense.id),
+        EXPENSE_RECORD
+    )
+    split_records = _records(
+        select(ExpenseSplit.expense_id, ExpenseSplit.person_id,
+               func.coalesce(ExpenseSplit.group_id, NO_GROUP), cents(ExpenseSplit.amount))
+        .where(ExpenseSplit.id <= max_split_id, ExpenseSplit.expense_id <= max_expense_id),
+        SPLIT_RECORD
+    )
+
+    header = SnapshotHeader(
+        ledger_version=version, written_at=_microseconds(datetime.utcnow()),
+        people=len(person_records), expenses=len(expense_records), splits=len(split_records),
+        names_size=len(names), max_person_id=max_person_id, max_expense_id=max_expense_id,
+        max_split_id=max_split_id, updated_watermark=_microseconds(updated_watermark)
+    )
+    offsets = _sections(header)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, FORMAT_VERSION, *header).ljust(HEADER_SIZE, b'\0'))
+        for offset, section in zip(offsets, (person_records, expense_records, split_records, names)):
+            out.write(b'\0' * (offset - out.tell()))
+            out.write(section.tobytes() if isinstance(section, np.ndarray) else section)
+        out.flush()
+        os.fsync(out.fileno())
+    # Workers still reading the old file keep its pages until they reopen
+    os.replace(temporary, path)
+    return header
+
+
+class SnapshotFile:
+    """
+    A snapshot file mapped read-only into memory. The record arrays are views of
+    the mapping; nothing is copied until a group is selected or the overlay
+    replaces rows.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as source:
+            self.mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, *fields = HEADER.unpack_from(self.mapping)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} ledger snapshot")
+        self.path = path
+        self.header = SnapshotHeader(*fields)
+
+        header = self.header
+        offsets = _sections(header)
+        self.people = np.frombuffer(self.mapping, PERSON_RECORD, header.people, offsets[0])
+        self.expenses = np.frombuffer(self.mapping, EXPENSE_RECORD, header.expenses, offsets[1])
+        self.splits = np.frombuffer(self.mapping, SPLIT_RECORD, header.splits, offsets[2])
+        self.names_start = offsets[3]
+        self._names = None
+
+    def names(self) -> Dict[int, str]:
+        """Map every person id to their name: the name table plus people added since"""
+        if self._names is None:
+            start = self.names_start
+            self._names = {
+                person_id: self.mapping[start + offset:start + offset + length].decode('utf-8')
+                for person_id, offset, length in self.people.tolist()
+            }
+        names = dict(self._names)
+        watermark = self.header.max_person_id
+        known = db.session.execute(select(func.count(Person.id)).where(Person.id <= watermark)).scalar()
+        newer = select(Person.id, Person.name)
+        if known == len(self.people):
+            newer = newer.where(Person.id > watermark)
+        names.update(db.session.execute(newer).all())
+        return names
+
+    def ledger(self, group_id: Optional[int] = None) -> LedgerSnapshot:
+        """
+        Return the columnar ledger, or one group's, as of now: the mapped records
+        with the overlay from the database applied when the ledger has been
+        written since the snapshot, plus the payments and carried balances, which
+        are always read live.
+        """
+        expenses, splits = self.expenses, self.splits
+        if group_id is not None:
+            expenses = expenses[expenses['group_id'] == group_id]
+            splits = splits[splits['group_id'] == group_id]
+        snapshot = LedgerSnapshot(expenses['id'], expenses['paid_by_id'], expenses['cents'],
+                                  splits['expense_id'], splits['person_id'], splits['cents'])
+        if BalanceLedger.version() != self.header.ledger_version:
+            snapshot = self._overlay(snapshot, group_id)
+        return snapshot.with_side_ledger(group_id)
+
+    def changed_expense_ids(self) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Return (edited, deleted): ids at or below the expense watermark whose snapshot
+        rows no longer hold. Edited expenses (by updated_at, or given new splits) and
+        ones committed late with an id below the watermark are re-read; deleted or
+        compacted ones are only dropped.
+        """
+        header = self.header
+        watermark = header.max_expense_id
+        # Filtered on the split id alone so the primary key range is used
+        resplit = integer_columns(select(ExpenseSplit.expense_id).where(ExpenseSplit.id > header.max_split_id), 1)[0]
+        edited = [resplit[resplit <= watermark]]
+        if header.updated_watermark:
+            # >= rather than >: an edit in the same microsecond as the watermark is re-read too
+            updated_since = EPOCH + timedelta(microseconds=header.updated_watermark)
+            edited.append(integer_columns(
+                select(Expense.id).where(Expense.id <= watermark, Expense.updated_at >= updated_since), 1
+            )[0])
+
+        # Deletes and late commits change the count or the id total below the watermark
+        count, total = db.session.execute(
+            select(func.count(Expense.id), func.coalesce(func.sum(Expense.id), 0)).where(Expense.id <= watermark)
+        ).one()
+        ids = self.expenses['id']
+        deleted = np.empty(0, dtype=np.int64)
+        if count != len(ids) or total != int(ids.sum()):
+            current = integer_columns(select(Expense.id).where(Expense.id <= watermark), 1)[0]
+            deleted = np.setdiff1d(ids, current)
+            edited.append(np.setdiff1d(current, ids))
+
+        return np.setdiff1d(np.concatenate(edited), deleted), deleted
+
+    def _overlay(self, snapshot: LedgerSnapshot, group_id: Optional[int]) -> LedgerSnapshot:
+        """Drop stale expenses and their splits, then append what the database holds now"""
+        edited, deleted = self.changed_expense_ids()
+        stale = np.union1d(edited, deleted)
+        expense_query = select(Expense.id, Expense.paid_by_id, cents(Expense.amount))
+        split_query = select(ExpenseSplit.expense_id, ExpenseSplit.person_id, cents(ExpenseSplit.amount))
+        if group_id is not None:
+            expense_query = expense_query.where(Expense.group_id == group_id)
+            split_query = split_query.where(ExpenseSplit.group_id == group_id)
+
+        # Whole columns rather than records: masking and joining record arrays copies every field
+        watermark = self.header.max_expense_id
+        expenses, splits = [snapshot[:3]], [snapshot[3:]]
+        if len(stale):
+            kept = ~np.isin(snapshot.expense_ids, stale)
+            expenses = [[column[kept] for column in snapshot[:3]]]
+            kept = ~np.isin(snapshot.split_expense_ids, stale)
+            splits = [[column[kept] for column in snapshot[3:]]]
+        expenses.append(integer_columns(expense_query.where(Expense.id > watermark).order_by(Expense.id), 3))
+        splits.append(integer_columns(split_query.where(ExpenseSplit.expense_id > watermark), 3))
+        edited_ids = edited.tolist()
+        for start in range(0, len(edited_ids), OVERLAY_CHUNK_SIZE):
+            chunk = edited_ids[start:start + OVERLAY_CHUNK_SIZE]
+            expenses.append(integer_columns(expense_query.where(Expense.id.in_(chunk)), 3))
+            splits.append(integer_columns(split_query.where(ExpenseSplit.expense_id.in_(chunk)), 3))
+
+        expenses = [np.concatenate(columns) for columns in zip(*expenses)]
+        splits = [np.concatenate(columns) for columns in zip(*splits)]
+        if len(edited):
+            # Re-read expenses sit below the watermark; LedgerSnapshot keeps expenses sorted by id
+            order = np.argsort(expenses[0], kind='stable')
+            expenses = [column[order] for column in expenses]
+        return LedgerSnapshot(*expenses, *splits)
+
+
+_opened: Optional[SnapshotFile] = None
+_opened_stat = None
+_open_lock = threading.Lock()
+
+
+def configured_path() -> Optional[str]:
+    """The snapshot file named by LEDGER_SNAPSHOT_PATH, or None"""
+    return os.environ.get('LEDGER_SNAPSHOT_PATH') or None
+
+
+def current() -> Optional[SnapshotFile]:
+    """
+    Return this process's mapping of the configured snapshot, or None when no
+    snapshot is configured, the file does not exist yet or NumPy is missing.
+    A file replaced by a newer snapshot is mapped again on the next call.
+    """
+    global _opened, _opened_stat
+    path = configured_path()
+    if path is None or np is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _open_lock:
+        if _opened is None or _opened_stat != key:
+            try:
+                _opened = SnapshotFile(path)
+            except (OSError, ValueError) as e:
+                logging.error(f"Cannot open ledger snapshot {path}: {e}")
+                _opened = None
+            _opened_stat = key
+        return _opened
+
+
+def main(argv=None):
+    """Write a ledger snapshot, or describe one, from the command line"""
+    parser = argparse.ArgumentParser(description="Write or inspect the memory-mapped ledger snapshot")
+    parser.add_argument('command', choices=['write', 'info'])
+    parser.add_argument('--path', default=configured_path(), help='snapshot file (default: LEDGER_SNAPSHOT_PATH)')
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error("pass --path or set LEDGER_SNAPSHOT_PATH")
+    if np is None:
+        sys.exit("NumPy is not installed: pip install numpy")
+
+    from app import app
+
+    with app.app_context():
+        if args.command == 'write':
+            started = time.perf_counter()
+            header = write_snapshot(args.path)
+            print(f"✓ Wrote {args.path}: {header.people} people, {header.expenses} expenses, "
+                  f"{header.splits} splits at ledger version {header.ledger_version} "
+                  f"({os.path.getsize(args.path)} bytes, {time.perf_counter() - started:.1f}s)")
+            return 0
+
+        snapshot = SnapshotFile(args.path)
+        header = snapshot.header
+        written = EPOCH + timedelta(microseconds=header.written_at)
+        print(f"{args.path}: written {written.isoformat()} at ledger version {header.ledger_version}")
+        print(f"  {header.people} people, {header.expenses} expenses, {header.splits} splits")
+        print(f"  watermarks: person {header.max_person_id}, expense {header.max_expense_id}, "
+              f"split {header.max_split_id}")
+        newer = db.session.execute(
+            select(func.count(Expense.id)).where(Expense.id > header.max_expense_id)
+        ).scalar()
+        edited, deleted = snapshot.changed_expense_ids()
+        print(f"  overlay: {newer} newer expenses, {len(edited)} edited, {len(deleted)} deleted")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
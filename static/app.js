@@ -4,9 +4,18 @@
 class SplitAppAPI {
     constructor() {
         this.baseURL = '/api';
+        // Last ETag and body per GET URL, revalidated with If-None-Match
+        this.validators = new Map();
     }
 
     async request(endpoint, options = {}) {
+        const { data } = await this.conditionalRequest(endpoint, options);
+        return data;
+    }
+
+    // Like request(), but also reports whether a GET returned something new.
+    // A 304 reuses the stored body; changed is false on the first fetch of a URL.
+    async conditionalRequest(endpoint, options = {}) {
         const url = `${this.baseURL}${endpoint}`;
         const defaultOptions = {
             headers: {
@@ -15,16 +24,30 @@ class SplitAppAPI {
         };
 
         const config = { ...defaultOptions, ...options };
+        const isGet = !config.method || config.method.toUpperCase() === 'GET';
+        const previous = isGet ? this.validators.get(url) : undefined;
+        if (previous) {
+            config.headers = { ...config.headers, 'If-None-Match': previous.etag };
+        }
 
         try {
             const response = await fetch(url, config);
+            if (response.status === 304 && previous) {
+                return { data: previous.data, changed: false };
+            }
+
             const data = await response.json();
             
             if (!response.ok) {
                 throw new Error(data.message || `HTTP error! status: ${response.status}`);
             }
             
-            return data;
+            const etag = response.headers.get('ETag');
+            if (isGet && etag) {
+                this.validators.set(url, { etag, data });
+            }
+            
+            return { data, changed: Boolean(previous) && (!etag || etag !== previous.etag) };
         } catch (error) {
             console.error('API request failed:', error);
             throw error;
@@ -254,26 +277,207 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-// Real-time updates (basic polling for demo purposes)
+// Real-time updates (server push, with conditional polling as a fallback)
 let updateInterval;
+let balanceStream;
+let lastLedgerVersion = null;
+
+// Re-render from the API only when the server reports new data
+async function refreshIfChanged() {
+    try {
+        const [balances, settlements] = await Promise.all([
+            api.conditionalRequest('/balances'),
+            api.conditionalRequest('/settlements'),
+        ]);
+        if (balances.changed || settlements.changed) {
+            if (!renderBalances(balances.data.data, true) && balances.data.data.length) {
+                location.reload();
+                return;
+            }
+            renderSettlements(settlements.data.data);
+        }
+    } catch (error) {
+        console.log('Update check failed:', error);
+    }
+}
 
-function startRealTimeUpdates() {
-    // Only on settlements page, poll for updates every 30 seconds
-    if (window.location.pathname === '/settlements') {
-        updateInterval = setInterval(async () => {
-            try {
-                const balances = await api.getBalances();
-                const settlements = await api.getSettlements();
-                // Could update page content here without full reload
-                // For simplicity, we'll just refresh if significant changes detected
-            } catch (error) {
-                console.log('Update check failed:', error);
+function formatSignedBalance(balance) {
+    if (balance > 0) {
+        return { text: `+$${balance.toFixed(2)}`, className: 'text-success' };
+    }
+    if (balance < 0) {
+        return { text: `-$${Math.abs(balance).toFixed(2)}`, className: 'text-danger' };
+    }
+    return { text: '$0.00', className: 'text-muted' };
+}
+
+function balanceStatus(balance) {
+    if (balance > 0) {
+        return { text: 'Should Receive', className: 'badge bg-success' };
+    }
+    if (balance < 0) {
+        return { text: 'Owes Money', className: 'badge bg-danger' };
+    }
+    return { text: 'Settled', className: 'badge bg-secondary' };
+}
+
+// Build a balances table row like the server-rendered ones; names go in as text
+function buildBalanceRow(entry) {
+    const row = document.createElement('tr');
+    row.dataset.person = entry.name;
+    const cells = [
+        ['strong', entry.name, ''],
+        [null, `$${entry.total_paid.toFixed(2)}`, ''],
+        [null, `$${entry.fair_share.toFixed(2)}`, ''],
+        ['span', formatSignedBalance(entry.balance).text, formatSignedBalance(entry.balance).className],
+        ['span', balanceStatus(entry.balance).text, balanceStatus(entry.balance).className],
+    ];
+    cells.forEach(([tag, text, className]) => {
+        const cell = document.createElement('td');
+        if (tag) {
+            const inner = document.createElement(tag);
+            inner.textContent = text;
+            if (className) {
+                inner.className = className;
             }
-        }, 30000);
+            cell.appendChild(inner);
+        } else {
+            cell.textContent = text;
+        }
+        row.appendChild(cell);
+    });
+    return row;
+}
+
+// Replace the rows of changed people and drop removed ones; with replaceAll the
+// entries are the complete balances and every other row is dropped.
+// Returns false when the page has no balances table to update.
+function renderBalances(entries, replaceAll = false, removed = []) {
+    const tbody = document.getElementById('balanceRows');
+    if (!tbody) {
+        return false;
+    }
+    const rows = new Map([...tbody.querySelectorAll('tr[data-person]')].map(row => [row.dataset.person, row]));
+    const kept = new Set(entries.map(entry => entry.name));
+    rows.forEach((row, name) => {
+        if (removed.includes(name) || (replaceAll && !kept.has(name))) {
+            row.remove();
+            rows.delete(name);
+        }
+    });
+    entries.forEach(entry => {
+        const row = buildBalanceRow(entry);
+        const existing = rows.get(entry.name);
+        if (existing) {
+            existing.replaceWith(row);
+        } else {
+            tbody.appendChild(row);
+        }
+    });
+
+    // Summary figures are recomputed from the rows, as the template computes them
+    let totalSpent = 0, owed = 0, owing = 0;
+    tbody.querySelectorAll('tr[data-person]').forEach(row => {
+        const cells = row.querySelectorAll('td');
+        totalSpent += parseFloat(cells[1].textContent.replace('$', ''));
+        const balance = cells[3].textContent;
+        if (balance.startsWith('+')) {
+            owed += 1;
+        } else if (balance.startsWith('-')) {
+            owing += 1;
+        }
+    });
+    document.getElementById('totalSpent').textContent = `$${totalSpent.toFixed(2)}`;
+    document.getElementById('owedCount').textContent = owed;
+    document.getElementById('owingCount').textContent = owing;
+    return true;
+}
+
+function buildSettlementCard(settlement) {
+    const column = document.createElement('div');
+    column.className = 'col-md-4 mb-3';
+    column.innerHTML = `
+        <div class="card h-100">
+            <div class="card-body text-center">
+                <i class="fas fa-arrow-right fa-2x text-success mb-3"></i>
+                <h6 data-field="from"></h6>
+                <p class="text-muted">pays</p>
+                <h4 class="text-success" data-field="amount"></h4>
+                <p class="text-muted">to</p>
+                <h6 data-field="to"></h6>
+            </div>
+        </div>`;
+    column.querySelector('[data-field="from"]').textContent = settlement.from;
+    column.querySelector('[data-field="amount"]').textContent = `$${settlement.amount.toFixed(2)}`;
+    column.querySelector('[data-field="to"]').textContent = settlement.to;
+    return column;
+}
+
+// Settlements are always pushed whole, so the list is rebuilt
+function renderSettlements(settlements) {
+    const section = document.getElementById('settlementsSection');
+    if (!section) {
+        return;
+    }
+    document.getElementById('settlementList').replaceChildren(...settlements.map(buildSettlementCard));
+    document.getElementById('settlementCount').textContent = settlements.length;
+    document.getElementById('settlementPlural').textContent = settlements.length !== 1 ? 's' : '';
+    section.classList.toggle('d-none', settlements.length === 0);
+}
+
+// A snapshot carries every balance; a delta only the people whose balance moved
+// since previous_version, its base. Events no newer than the version already
+// shown are ignored; a delta based on an older version than the one shown means
+// events were missed, so the stream is reopened to get a fresh snapshot.
+function handleBalanceEvent(event) {
+    const payload = JSON.parse(event.data);
+    const isSnapshot = event.type === 'snapshot';
+    const stale = payload.version < lastLedgerVersion || (!isSnapshot && payload.version === lastLedgerVersion);
+    if (lastLedgerVersion !== null && stale) {
+        return;
+    }
+    if (!isSnapshot && payload.previous_version !== lastLedgerVersion) {
+        stopRealTimeUpdates();
+        startRealTimeUpdates();
+        return;
+    }
+    lastLedgerVersion = payload.version;
+
+    if (!renderBalances(payload.balances, isSnapshot, payload.removed || [])) {
+        // The page was rendered with no balances at all and has no table to fill in
+        if (payload.balances.length) {
+            location.reload();
+        }
+        return;
+    }
+    renderSettlements(payload.settlements);
+}
+
+function startRealTimeUpdates() {
+    // Only on settlements page
+    if (window.location.pathname !== '/settlements' || balanceStream || updateInterval) {
+        return;
+    }
+
+    if (window.EventSource) {
+        // The server pushes a snapshot on connect and a delta after every expense write
+        lastLedgerVersion = null;
+        balanceStream = new EventSource('/api/stream/balances');
+        balanceStream.addEventListener('snapshot', handleBalanceEvent);
+        balanceStream.addEventListener('delta', handleBalanceEvent);
+    } else {
+        // The first check on page load stores the validators; on returning to the
+        // tab it picks up anything that changed while it was hidden
+        refreshIfChanged();
+        updateInterval = setInterval(refreshIfChanged, 30000);
     }
 }
 
 function stopRealTimeUpdates() {
+    if (balanceStream) {
+        balanceStream.close();
+        balanceStream = null;
+    }
     if (updateInterval) {
         clearInterval(updateInterval);
         updateInterval = null;
@@ -0,0 +1,199 @@
+"""
+Server-Sent Events for Split App
+/api/stream/balances pushes balances and settlements when expenses change.
+One broadcaster thread per process watches the ledger version, computes each
+new state once and fans the same encoded event out to every subscriber.
+"""
+
+from flask import Blueprint, Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from balance_ledger import BalanceLedger
+from settlement_cache import SettlementCache
+from api_routes import create_response
+import json
+import logging
+import queue
+import threading
+import time
+
+stream = Blueprint('stream', __name__)
+
+# How often the broadcaster checks for writes made by other processes
+POLL_INTERVAL = 1.0  # seconds
+
+# Comment lines keep idle connections open through proxies
+KEEPALIVE_INTERVAL = 15.0  # seconds
+
+# Streams are closed after this long; EventSource reconnects with Last-Event-ID
+MAX_STREAM_SECONDS = 300
+
+# Client reconnect delay sent in the stream
+RETRY_MS = 2000
+
+# Events buffered per subscriber before a slow client is dropped
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+def _encode_event(event_name, version, payload):
+    """Encode one SSE message; the ledger version doubles as the event id"""
+    return f"id: {version}\nevent: {event_name}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _snapshot(version):
+    """Read the full balances and settlements at a ledger version through the cache"""
+    balances = SettlementCache.balances(None, version)
+    settlements = SettlementCache.settlements('greedy', None, version)['settlements']
+    return {'version': version, 'balances': list(balances.values()), 'settlements': settlements}
+
+
+def _delta(previous, current):
+    """
+    Describe how balances moved between two snapshots; settlements are sent whole.
+    previous_version is the base the delta applies to: clients holding a newer
+    version ignore it, clients holding an older one need a fresh snapshot.
+    """
+    old = {entry['name']: entry for entry in previous['balances']}
+    new = {entry['name']: entry for entry in current['balances']}
+    return {
+        'version': current['version'],
+        'previous_version': previous['version'],
+        'balances': [entry for name, entry in new.items() if old.get(name) != entry],
+        'removed': [name for name in old if name not in new],
+        'settlements': current['settlements'],
+    }
+
+
+class _Broadcaster:
+    """Computes each new ledger state once per process and fans it out to subscribers"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.snapshot = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, app, snapshot):
+        """
+        Register a subscriber that has been sent snapshot. If the broadcaster has
+        already moved past that version, the newer snapshot is queued for it first.
+        With no one else subscribed, the broadcaster's own snapshot may be left
+        over from its last audience, so a newer one from the subscriber replaces it
+        and the next delta follows on from what the subscriber holds.
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            others = bool(self.subscribers)
+            self.subscribers.add(subscriber)
+            if self.snapshot is None or (self.snapshot['version'] < snapshot['version'] and not others):
+                self.snapshot = snapshot
+            elif self.snapshot['version'] > snapshot['version']:
+                subscriber.put_nowait(_encode_event('snapshot', self.snapshot['version'], self.snapshot))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(app,), name='balance-stream', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def wake(self):
+        """Check for a new ledger version now instead of at the next poll"""
+        self._wake.set()
+
+    def publish(self, message, subscribers):
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Too far behind: end its stream so it reconnects and gets a fresh snapshot
+                self.unsubscribe(subscriber)
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _run(self, app):
+        while True:
+            with self._lock:
+                if not self.subscribers:
+                    self._thread = None
+                    return
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    self._check(BalanceLedger.version())
+            except Exception as e:
+                logging.error(f"Error broadcasting balances: {str(e)}")
+
+    def _check(self, version):
+        if self.snapshot is not None and self.snapshot['version'] == version:
+            return
+        current = _snapshot(version)
+        # Swap the snapshot and take the audience together, so a subscriber
+        # joining meanwhile either receives this delta or sees the new snapshot
+        with self._lock:
+            previous, self.snapshot = self.snapshot, current
+            subscribers = list(self.subscribers)
+        if previous is not None and previous['version'] < version:
+            self.publish(_encode_event('delta', version, _delta(previous, current)), subscribers)
+
+
+_broadcaster = _Broadcaster()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_on_ledger_write(session):
+    """Push writes made by this process without waiting for the next poll"""
+    if session.info.pop('ledger_written', False):
+        _broadcaster.wake()
+
+
+def _event_stream(subscriber, first_message):
+    """Yield the first event, then broadcast events and keepalives until the stream expires"""
+    deadline = time.monotonic() + MAX_STREAM_SECONDS
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if first_message:
+            yield first_message
+        while time.monotonic() < deadline:
+            try:
+                message = subscriber.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        _broadcaster.unsubscribe(subscriber)
+
+
+@stream.route('/balances', methods=['GET'])
+def stream_balances():
+    """
+    Stream balance updates as Server-Sent Events.
+    A new connection first receives a snapshot event with all balances and
+    settlements (skipped when Last-Event-ID is already current), then a delta
+    event with the changed balances and the new settlements after every write.
+    """
+    try:
+        version = BalanceLedger.version()
+        snapshot = _snapshot(version)
+        first_message = None
+        if request.headers.get('Last-Event-ID') != str(version):
+            first_message = _encode_event('snapshot', version, snapshot)
+
+        subscriber = _broadcaster.subscribe(current_app._get_current_object(), snapshot)
+        return Response(
+            _event_stream(subscriber, first_message),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception as e:
+        logging.error(f"Error opening balance stream: {str(e)}")
+        return create_response(False, None, f"Internal server error: {str(e)}", 500)
@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the Split App tests
+app.py configures the database when it is imported, so DATABASE_URL points at a
+throwaway SQLite file before anything imports it. Each test that touches the
+database starts from empty, migrated tables.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_database_dir = tempfile.mkdtemp(prefix='split-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+# test_balance_engines.py runs its checks under each engine in turn
+os.environ['BALANCE_ENGINE'] = 'sql'
+os.environ.pop('REDIS_URL', None)
+os.environ.pop('LEDGER_SNAPSHOT_PATH', None)
+
+# The app module wires up the database and blueprints the other modules import from
+import app as _app  # noqa: E402,F401
+
+
+@pytest.fixture
+def app():
+    """The Flask app inside an app context, on empty, migrated tables"""
+    from sqlalchemy import text
+
+    import migrations
+    from app import app as flask_app, db
+    from balance_ledger import BalanceLedger
+    from person_resolver import PersonResolver
+    from settlement_cache import SettlementCache
+
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+        db.create_all()
+        migrations.upgrade()
+        BalanceLedger.ensure_initialized()
+        PersonResolver.invalidate()
+        SettlementCache.clear()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def api(client):
+    """Call the JSON API and return the response body, failing on an unexpected status"""
+
+    def call(method, url, json=None, status=None):
+        response = client.open(f"/api{url}", method=method, json=json)
+        expected = status or (201 if method == 'POST' else 200)
+        assert response.status_code == expected, response.get_data(as_text=True)
+        return response.get_json()
+
+    return call
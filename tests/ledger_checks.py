@@ -0,0 +1,42 @@
+"""Assertions and data builders shared by the ledger and settlement tests"""
+
+from app import db
+from balance_ledger import BalanceLedger
+from settlement_calculator import SettlementCalculator
+
+
+def balances(api, url='/balances'):
+    """Each person's balance from a balances endpoint, by name"""
+    return {entry['name']: entry['balance'] for entry in api('GET', url)['data']}
+
+
+def assert_ledger_consistent():
+    """
+    The materialized ledger matches a recomputation, and everyone linked by an
+    expense or payment shares a component label. Labels are only merged on
+    writes, so stored components may be coarser than rebuilt ones, never finer.
+    """
+    assert BalanceLedger.drift() == []
+    stored = SettlementCalculator.component_labels()
+    BalanceLedger.rebuild_components()
+    rebuilt = SettlementCalculator.component_labels()
+    db.session.rollback()
+    for label in set(rebuilt.values()):
+        members = [name for name, rebuilt_label in rebuilt.items() if rebuilt_label == label]
+        assert len({stored[name] for name in members}) == 1, members
+
+
+def random_balances(rng, people):
+    """Integer-cent balances for people that sum to zero"""
+    cents = [rng.randint(-50000, 50000) for _ in range(people - 1)]
+    cents.append(-sum(cents))
+    return [(f"p{i}", amount) for i, amount in enumerate(cents)]
+
+
+def apply_transfers(balances, transfers):
+    """Balances left once every (from, to, amount) transfer is paid"""
+    remaining = dict(balances)
+    for debtor, creditor, amount in transfers:
+        remaining[debtor] += amount
+        remaining[creditor] -= amount
+    return remaining
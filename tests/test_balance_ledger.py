@@ -0,0 +1,22 @@
+from ledger_checks import assert_ledger_consistent, balances
+
+
+def test_writes_keep_the_ledger_in_step(api):
+    first = api('POST', '/expenses', {'amount': 90, 'description': 'dinner', 'paid_by': 'A',
+                                      'participants': ['A', 'B', 'C']})['data']
+    api('POST', '/expenses', {'amount': 40, 'description': 'taxi', 'paid_by': 'B',
+                              'split_method': 'exact',
+                              'splits': [{'person': 'B', 'amount': 10}, {'person': 'D', 'amount': 30}]})
+    third = api('POST', '/expenses', {'amount': 50, 'description': 'tickets', 'paid_by': 'E',
+                                      'split_method': 'percentage',
+                                      'splits': [{'person': 'E', 'percentage': 40},
+                                                 {'person': 'F', 'percentage': 60}]})['data']
+    assert_ledger_consistent()
+
+    api('PUT', f"/expenses/{first['id']}", {'amount': 120, 'paid_by': 'C', 'participants': ['A', 'B', 'C']})
+    assert_ledger_consistent()
+
+    api('DELETE', f"/expenses/{third['id']}")
+    assert_ledger_consistent()
+
+    assert balances(api) == {'A': -40.0, 'B': -10.0, 'C': 80.0, 'D': -30.0, 'E': 0.0, 'F': 0.0}
@@ -0,0 +1,39 @@
+from ledger_checks import assert_ledger_consistent, balances
+
+VALID = {'amount': 30, 'description': 'dinner', 'paid_by': 'A', 'participants': ['A', 'B', 'C']}
+INVALID = {'amount': -5, 'description': 'refund', 'paid_by': 'A'}
+
+
+def test_bulk_import_creates_every_row(api):
+    body = api('POST', '/expenses/bulk', [VALID, dict(VALID, paid_by='B')])
+
+    assert body['success'] is True
+    assert (body['data']['created'], body['data']['failed']) == (2, 0)
+    assert balances(api) == {'A': 10.0, 'B': 10.0, 'C': -20.0}
+    assert_ledger_consistent()
+
+
+def test_partial_bulk_import_is_multi_status(api):
+    body = api('POST', '/expenses/bulk', [VALID, INVALID], status=207)
+
+    assert body['success'] is False
+    assert (body['data']['created'], body['data']['failed']) == (1, 1)
+    assert [result['success'] for result in body['data']['results']] == [True, False]
+    assert balances(api) == {'A': 20.0, 'B': -10.0, 'C': -10.0}
+
+
+def test_bulk_import_without_a_valid_row_is_rejected(api):
+    body = api('POST', '/expenses/bulk', [INVALID], status=400)
+
+    assert body['success'] is False
+    assert body['data']['created'] == 0
+    assert api('GET', '/expenses')['data'] == []
+
+
+def test_bulk_import_reads_csv(client, api):
+    csv = "amount,description,paid_by,participants\n30,dinner,A,A;B;C\n"
+
+    response = client.post('/api/expenses/bulk', data=csv, content_type='text/csv')
+
+    assert response.status_code == 201
+    assert balances(api) == {'A': 20.0, 'B': -10.0, 'C': -10.0}
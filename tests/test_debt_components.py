@@ -0,0 +1,44 @@
+from ledger_checks import assert_ledger_consistent, balances
+from settlement_solver import UnionFind, split_components
+
+
+def test_split_components_pools_unlabelled_names():
+    balances = [('a', 100), ('b', -100), ('c', 50), ('d', -50), ('e', 0)]
+    labels = {'a': 1, 'b': 1, 'c': 2, 'd': 2}
+
+    assert split_components(balances, labels) == [
+        [('a', 100), ('b', -100)],
+        [('c', 50), ('d', -50)],
+        [('e', 0)],
+    ]
+
+
+def test_union_find_merges_sets():
+    sets = UnionFind()
+    sets.union(1, 2)
+    sets.union(3, 4)
+    sets.union(2, 4)
+    sets.union(5, 6)
+
+    assert sets.find(1) == sets.find(3)
+    assert sets.find(1) != sets.find(5)
+    assert sorted(sorted(members) for members in sets.sets()) == [[1, 2, 3, 4], [5, 6]]
+
+
+def test_union_find_union_all_registers_a_lone_item():
+    sets = UnionFind()
+    sets.union_all([7])
+    sets.union_all([])
+
+    assert sets.sets() == [[7]]
+
+
+def test_updating_an_expense_only_its_payer_shares(api):
+    # Regression: linking a lone participant used to issue an UPDATE with no parameters
+    expense = api('POST', '/expenses', {'amount': 25, 'description': 'solo', 'paid_by': 'A',
+                                        'participants': ['A']})['data']
+
+    api('PUT', f"/expenses/{expense['id']}", {'amount': 30})
+
+    assert_ledger_consistent()
+    assert balances(api) == {'A': 0.0}
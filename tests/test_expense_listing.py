@@ -0,0 +1,45 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from expense_listing import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    expense = SimpleNamespace(created_at=datetime(2024, 5, 1, 12, 30, 15, 123456), id=42)
+
+    cursor = encode_cursor(expense)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (expense.created_at, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', 'bm9waXBl', '%%%'])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='cursor is invalid'):
+        decode_cursor(cursor)
+
+
+def test_keyset_pages_cover_every_expense_once(api):
+    for i in range(7):
+        api('POST', '/expenses', {'amount': 10 + i, 'description': f"e{i}", 'paid_by': 'A',
+                                  'participants': ['A', 'B']})
+
+    seen, cursor = [], None
+    while True:
+        url = '/expenses?limit=3' + (f"&cursor={cursor}" if cursor else '')
+        body = api('GET', url)
+        seen.extend(expense['id'] for expense in body['data'])
+        cursor = body['meta']['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_listing_rejects_a_bad_cursor(api):
+    body = api('GET', '/expenses?cursor=bm9waXBl', status=400)
+
+    assert body['message'] == 'cursor is invalid'
@@ -0,0 +1,13 @@
+from ledger_checks import assert_ledger_consistent, balances
+
+
+def test_group_balances_cover_only_the_group(api):
+    group = api('POST', '/groups', {'name': 'trip'})['data']
+    api('POST', f"/groups/{group['id']}/expenses", {'amount': 60, 'description': 'fuel', 'paid_by': 'A',
+                                                    'participants': ['A', 'B']})
+    api('POST', '/expenses', {'amount': 10, 'description': 'coffee', 'paid_by': 'B',
+                              'participants': ['A', 'B']})
+
+    assert balances(api, f"/groups/{group['id']}/balances") == {'A': 30.0, 'B': -30.0}
+    assert balances(api) == {'A': 25.0, 'B': -25.0}
+    assert_ledger_consistent()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import explain_indexes  # noqa: E402
+
+# Splits seeded for the default run; raise it to check plans on a bigger ledger
+INDEX_TEST_SPLITS = int(os.environ.get('INDEX_TEST_SPLITS', '4000'))
+
+
+def seed(splits, people, groups):
+    explain_indexes.seed(explain_indexes.parse_args(
+        ['--splits', str(splits), '--people', str(people), '--groups', str(groups)]
+    ))
+    explain_indexes.analyze()
+
+
+def assert_hot_queries_use_indexes():
+    for label, query in explain_indexes.hot_queries():
+        plan = explain_indexes.explain(query)
+        assert explain_indexes.table_scans(plan) == [], f"{label}: {plan}"
+
+
+def test_hot_queries_use_indexes(app):
+    seed(INDEX_TEST_SPLITS, 100, 5)
+    assert_hot_queries_use_indexes()
+
+
+@pytest.mark.slow
+def test_hot_queries_use_indexes_at_a_million_splits(app):
+    # The scale explain_indexes.py checks by default, where a planner is most tempted to scan
+    seed(1000000, 1000, 50)
+    assert_hot_queries_use_indexes()
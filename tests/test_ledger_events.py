@@ -0,0 +1,49 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import ledger_events
+from ledger_events import LedgerEvents
+
+
+def balances_now(api, query=''):
+    return {entry['name']: entry['balance'] for entry in api('GET', f"/balances{query}")['data']}
+
+
+@pytest.mark.parametrize('interval', [10000, 2])
+def test_balances_as_of_replay_every_past_state(api, monkeypatch, interval):
+    # A small interval makes writes cross checkpoints, so replays start from several of them
+    monkeypatch.setattr(ledger_events, 'LEDGER_CHECKPOINT_INTERVAL', interval)
+    expected = []
+    writes = [
+        ('POST', '/expenses', {'amount': 30, 'description': 'a', 'paid_by': 'A', 'participants': ['A', 'B']}),
+        ('POST', '/expenses', {'amount': 12, 'description': 'b', 'paid_by': 'B', 'participants': ['B', 'C']}),
+        ('PUT', '/expenses/1', {'amount': 50}),
+        ('POST', '/payments', {'amount': 5, 'from': 'C', 'to': 'B'}),
+        ('DELETE', '/expenses/2', None),
+    ]
+    for method, url, body in writes:
+        api(method, url, body)
+        time.sleep(0.002)
+        expected.append((datetime.utcnow().isoformat(), balances_now(api)))
+        time.sleep(0.002)
+
+    for moment, state in expected:
+        as_of = balances_now(api, f"?as_of={moment}")
+        # People only appear once they have a ledger row; compare those that do
+        assert {name: balance for name, balance in as_of.items() if name in state} == state
+
+
+def test_as_of_before_history_starts_is_rejected(api):
+    body = api('GET', '/balances?as_of=2000-01-01', status=400)
+
+    assert body['message'].startswith('Balance history starts at')
+
+
+def test_parse_as_of_normalizes_to_naive_utc():
+    assert LedgerEvents.parse_as_of('2024-05-01T12:00:00+02:00') == datetime(2024, 5, 1, 10, 0)
+    assert LedgerEvents.parse_as_of('2024-05-01T10:00:00Z') == datetime(2024, 5, 1, 10, 0)
+    assert LedgerEvents.parse_as_of('2024-05-01') == datetime(2024, 5, 1)
+    with pytest.raises(ValueError):
+        LedgerEvents.parse_as_of('yesterday')
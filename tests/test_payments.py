@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from app import db
+from ledger_checks import assert_ledger_consistent, balances
+from ledger_compaction import LedgerCompaction
+
+
+def owed(api, url):
+    """The nonzero balances from a balances endpoint, by name"""
+    return {name: balance for name, balance in balances(api, url).items() if balance}
+
+
+def test_payments_settle_suggested_debts(api):
+    api('POST', '/expenses', {'amount': 90, 'description': 'dinner', 'paid_by': 'A',
+                              'participants': ['A', 'B', 'C']})
+    api('POST', '/expenses', {'amount': 30, 'description': 'snacks', 'paid_by': 'C',
+                              'participants': ['B', 'C']})
+
+    settlements = api('GET', '/settlements')['data']
+    payments = [api('POST', '/payments', {'amount': s['amount'], 'from': s['from'], 'to': s['to']})['data']
+                for s in settlements]
+    assert_ledger_consistent()
+    assert set(balances(api).values()) == {0.0}
+    assert api('GET', '/settlements')['data'] == []
+
+    api('DELETE', f"/payments/{payments[0]['id']}")
+    assert_ledger_consistent()
+    assert api('GET', '/settlements')['data'] == [settlements[0]]
+
+
+def test_compaction_keeps_balances(api, app):
+    api('POST', '/expenses', {'amount': 60, 'description': 'old', 'paid_by': 'A', 'participants': ['A', 'B']})
+    api('POST', '/payments', {'amount': 30, 'from': 'B', 'to': 'A'})
+    api('POST', '/expenses', {'amount': 20, 'description': 'open', 'paid_by': 'C', 'participants': ['C', 'D']})
+    before = balances(api)
+
+    result = LedgerCompaction.compact(datetime.utcnow() + timedelta(seconds=1))
+    db.session.commit()
+
+    assert (result.people, result.expenses, result.payments) == (2, 1, 1)
+    assert balances(api) == before
+    assert [expense['description'] for expense in api('GET', '/expenses')['data']] == ['open']
+    assert_ledger_consistent()
+
+
+def test_compaction_keeps_people_owed_within_a_group(api):
+    trip = api('POST', '/groups', {'name': 'trip'})['data']
+    flat = api('POST', '/groups', {'name': 'flat'})['data']
+    # A and B are settled overall, but each is owed within one group
+    api('POST', f"/groups/{trip['id']}/expenses", {'amount': 40, 'description': 'fuel', 'paid_by': 'A',
+                                                   'participants': ['A', 'B']})
+    api('POST', f"/groups/{flat['id']}/expenses", {'amount': 40, 'description': 'rent', 'paid_by': 'B',
+                                                   'participants': ['A', 'B']})
+    api('POST', f"/groups/{trip['id']}/expenses", {'amount': 30, 'description': 'hotel', 'paid_by': 'C',
+                                                   'participants': ['C', 'D']})
+    api('POST', f"/groups/{trip['id']}/payments", {'amount': 15, 'from': 'D', 'to': 'C'})
+    trip_balances = owed(api, f"/groups/{trip['id']}/balances")
+    trip_settlements = api('GET', f"/groups/{trip['id']}/settlements")['data']
+
+    result = LedgerCompaction.compact(datetime.utcnow() + timedelta(seconds=1))
+    db.session.commit()
+
+    assert (result.people, result.expenses, result.payments) == (2, 1, 1)
+    # Compacted people are settled, so they only drop out of the listing
+    assert owed(api, f"/groups/{trip['id']}/balances") == trip_balances
+    assert owed(api, f"/groups/{flat['id']}/balances") == {'A': -20.0, 'B': 20.0}
+    assert api('GET', f"/groups/{trip['id']}/settlements")['data'] == trip_settlements
+    assert_ledger_consistent()
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from ledger_checks import apply_transfers, balances, random_balances
+from settlement_solver import settle_cents
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_settle_cents_clears_every_balance(seed):
+    rng = random.Random(seed)
+    balances = random_balances(rng, rng.randint(2, 60))
+
+    transfers = settle_cents(balances)
+
+    assert all(cents > 0 for _, _, cents in transfers)
+    assert all(balance == 0 for balance in apply_transfers(balances, transfers).values())
+    nonzero = sum(1 for _, cents in balances if cents)
+    assert len(transfers) <= max(nonzero - 1, 0)
+
+
+def test_settle_cents_pays_debtors_to_creditors_only():
+    balances = [('a', 3000), ('b', -1000), ('c', -2000), ('d', 0)]
+
+    transfers = settle_cents(balances)
+
+    assert {debtor for debtor, _, _ in transfers} == {'b', 'c'}
+    assert {creditor for _, creditor, _ in transfers} == {'a'}
+
+
+def test_settle_cents_with_nothing_owed():
+    assert settle_cents([]) == []
+    assert settle_cents([('a', 0), ('b', 0)]) == []
+
+
+def test_greedy_settlements_clear_balances(api):
+    for i, (payer, people) in enumerate([('A', ['A', 'B', 'C']), ('B', ['B', 'D']), ('E', ['A', 'E', 'F']),
+                                         ('F', ['C', 'D', 'F'])]):
+        api('POST', '/expenses', {'amount': 17 + i * 13, 'description': f"e{i}", 'paid_by': payer,
+                                  'participants': people})
+
+    remaining = balances(api)
+    for settlement in api('GET', '/settlements?mode=greedy')['data']:
+        remaining[settlement['from']] += settlement['amount']
+        remaining[settlement['to']] -= settlement['amount']
+
+    assert all(abs(balance) < 0.005 for balance in remaining.values())
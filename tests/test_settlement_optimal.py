@@ -0,0 +1,70 @@
+import random
+import time
+
+import pytest
+
+from ledger_checks import apply_transfers, balances, random_balances
+from settlement_solver import settle_cents, solve_component, zero_sum_groups
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_zero_sum_groups_partition_balances(seed):
+    rng = random.Random(seed)
+    balances = random_balances(rng, rng.randint(2, 12))
+
+    groups = zero_sum_groups(balances, time.perf_counter() + 10)
+
+    assert sorted(entry for group in groups for entry in group) == sorted(balances)
+    assert all(sum(cents for _, cents in group) == 0 for group in groups)
+
+
+def test_zero_sum_groups_finds_the_most_groups():
+    balances = [('a', 500), ('b', -300), ('c', -200), ('d', 700), ('e', -400), ('f', -300)]
+
+    groups = zero_sum_groups(balances, time.perf_counter() + 10)
+
+    assert len(groups) == 2
+
+
+def test_zero_sum_groups_gives_up_at_the_deadline():
+    rng = random.Random(1)
+    balances = random_balances(rng, 18)
+
+    assert zero_sum_groups(balances, time.perf_counter() - 1) is None
+
+
+def test_optimal_mode_never_needs_more_transfers_than_greedy():
+    rng = random.Random(7)
+    for _ in range(20):
+        balances = random_balances(rng, rng.randint(2, 10))
+        # Pairs that cancel out exactly are where the exact solver beats greedy
+        balances += [('x', 1234), ('y', -1234)]
+
+        optimal, solver, fallback = solve_component(balances, 'optimal', time.time() + 10)
+
+        assert (solver, fallback) == ('optimal', None)
+        assert all(balance == 0 for balance in apply_transfers(balances, optimal).values())
+        assert len(optimal) <= len(settle_cents(balances))
+
+
+def test_optimal_mode_falls_back_to_greedy_beyond_the_size_budget():
+    balances = random_balances(random.Random(3), 40)
+
+    transfers, solver, fallback = solve_component(balances, 'optimal', time.time() + 10)
+
+    assert (solver, fallback) == ('greedy', 'size_budget')
+    assert transfers == settle_cents(balances)
+
+
+def test_optimal_settlements_clear_balances(api):
+    for i, (payer, people) in enumerate([('A', ['A', 'B', 'C']), ('B', ['B', 'D']), ('E', ['A', 'E', 'F']),
+                                         ('F', ['C', 'D', 'F'])]):
+        api('POST', '/expenses', {'amount': 17 + i * 13, 'description': f"e{i}", 'paid_by': payer,
+                                  'participants': people})
+
+    remaining = balances(api)
+    for settlement in api('GET', '/settlements?mode=optimal')['data']:
+        remaining[settlement['from']] += settlement['amount']
+        remaining[settlement['to']] -= settlement['amount']
+
+    assert all(abs(balance) < 0.005 for balance in remaining.values())
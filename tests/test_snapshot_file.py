@@ -0,0 +1,134 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from app import db
+from balance_ledger import BalanceLedger
+from columnar_ledger import LedgerSnapshot
+from ledger_checks import balances
+from models import Expense, ExpenseSplit
+from settlement_cache import SettlementCache
+from settlement_calculator import SettlementCalculator
+
+pytest.importorskip('numpy')
+snapshot_file = pytest.importorskip('snapshot_file')
+
+
+@pytest.fixture
+def path(app, tmp_path):
+    return str(tmp_path / 'ledger.snap')
+
+
+def expense(api, amount, paid_by, participants, group=None):
+    url = f"/groups/{group['id']}/expenses" if group else '/expenses'
+    return api('POST', url, {'amount': amount, 'description': 'x', 'paid_by': paid_by,
+                             'participants': participants})['data']
+
+
+def totals(rows):
+    """balance rows as {person_id: (paid cents, share cents)}, leaving out people with neither"""
+    return {person_id: (round(float(paid) * 100), round(float(share) * 100))
+            for person_id, _, paid, share in rows if paid or share}
+
+
+def assert_overlay_matches_database(path, *groups):
+    """The mapped snapshot with its overlay reads the same ledger as the database, whole and per group"""
+    mapped = snapshot_file.SnapshotFile(path)
+    for group_id in [None, *(group['id'] for group in groups)]:
+        from_file = mapped.ledger(group_id)
+        from_database = LedgerSnapshot.load(group_id)
+        assert totals(SettlementCalculator.columnar_balance_rows(group_id, snapshot=from_file)) == \
+            totals(db.session.execute(SettlementCalculator.balance_query(group_id)).all())
+        assert [column.tolist() for column in from_file.pairwise()] == \
+            [column.tolist() for column in from_database.pairwise()]
+
+
+def test_snapshot_without_writes_since(api, path):
+    trip = api('POST', '/groups', {'name': 'trip'})['data']
+    expense(api, 30, 'A', ['A', 'B', 'C'])
+    expense(api, 45, 'B', ['B', 'C'], trip)
+
+    header = snapshot_file.write_snapshot(path)
+
+    assert (header.people, header.expenses, header.splits) == (3, 2, 5)
+    assert_overlay_matches_database(path, trip)
+
+
+def test_overlay_applies_edits_deletes_and_new_rows(api, path):
+    trip = api('POST', '/groups', {'name': 'trip'})['data']
+    edited = expense(api, 30, 'A', ['A', 'B', 'C'])
+    deleted = expense(api, 45, 'B', ['B', 'C'], trip)
+    newest = expense(api, 12, 'C', ['A', 'C'], trip)
+    snapshot_file.write_snapshot(path)
+
+    api('PUT', f"/expenses/{edited['id']}", {'amount': 60, 'paid_by': 'D', 'participants': ['A', 'D']})
+    api('DELETE', f"/expenses/{deleted['id']}")
+    expense(api, 20, 'E', ['B', 'E'], trip)
+    api('POST', '/payments', {'amount': 5, 'from': 'B', 'to': 'A'})
+
+    edited_ids, deleted_ids = snapshot_file.SnapshotFile(path).changed_expense_ids()
+    # The newest expense sits at the updated_at watermark, so it is re-read as well
+    assert (edited_ids.tolist(), deleted_ids.tolist()) == ([edited['id'], newest['id']], [deleted['id']])
+    assert_overlay_matches_database(path, trip)
+
+
+def test_overlay_reads_a_late_commit_below_the_watermark(api, path):
+    expense(api, 30, 'A', ['A', 'B'])
+    gap = expense(api, 10, 'B', ['A', 'B'])
+    newest = expense(api, 20, 'C', ['B', 'C'])
+    split_ids = db.session.execute(select(ExpenseSplit.id).where(ExpenseSplit.expense_id == gap['id'])).scalars().all()
+    api('DELETE', f"/expenses/{gap['id']}")
+    header = snapshot_file.write_snapshot(path)
+
+    # A transaction that drew its ids and timestamps before the snapshot but committed after it
+    stamped = snapshot_file.EPOCH + timedelta(microseconds=header.updated_watermark - 1)
+    people = {entry['name']: entry['id'] for entry in api('GET', '/people')['data']}
+    db.session.add(Expense(id=gap['id'], amount=Decimal('8'), description='late', paid_by_id=people['C'],
+                           split_method='equal', created_at=stamped, updated_at=stamped))
+    db.session.add_all([ExpenseSplit(id=split_id, expense_id=gap['id'], person_id=people[name], amount=Decimal('4'))
+                        for split_id, name in zip(split_ids, ['A', 'C'])])
+    BalanceLedger.bump_version()
+    db.session.commit()
+
+    edited_ids, deleted_ids = snapshot_file.SnapshotFile(path).changed_expense_ids()
+    assert (edited_ids.tolist(), deleted_ids.tolist()) == ([gap['id'], newest['id']], [])
+    assert_overlay_matches_database(path)
+
+
+def test_overlay_rereads_an_edit_at_the_updated_watermark(api, path):
+    first = expense(api, 30, 'A', ['A', 'B'])
+    second = expense(api, 20, 'B', ['A', 'B'])
+    header = snapshot_file.write_snapshot(path)
+    watermark = snapshot_file.EPOCH + timedelta(microseconds=header.updated_watermark)
+    assert db.session.get(Expense, second['id']).updated_at == watermark
+
+    # Committed after the snapshot was cut, yet stamped in the same microsecond as its watermark
+    db.session.execute(update(Expense).where(Expense.id == first['id'])
+                       .values(paid_by_id=second['paid_by_id'], updated_at=watermark))
+    BalanceLedger.bump_version()
+    db.session.commit()
+
+    edited_ids, _ = snapshot_file.SnapshotFile(path).changed_expense_ids()
+    assert edited_ids.tolist() == [first['id'], second['id']]
+    assert_overlay_matches_database(path)
+
+
+def test_numpy_engine_serves_balances_from_the_snapshot(api, path, monkeypatch):
+    trip = api('POST', '/groups', {'name': 'trip'})['data']
+    first = expense(api, 30, 'A', ['A', 'B', 'C'], trip)
+    expense(api, 12, 'C', ['A', 'C'])
+    snapshot_file.write_snapshot(path)
+    api('PUT', f"/expenses/{first['id']}", {'amount': 45, 'paid_by': 'B', 'participants': ['A', 'B', 'C']})
+    expense(api, 20, 'D', ['A', 'D'], trip)
+    expected = balances(api, f"/groups/{trip['id']}/balances")
+    debts = api('GET', '/debts')['data']
+
+    monkeypatch.setenv('BALANCE_ENGINE', 'numpy')
+    monkeypatch.setenv('LEDGER_SNAPSHOT_PATH', path)
+    SettlementCache.clear()
+
+    assert snapshot_file.current() is not None
+    assert balances(api, f"/groups/{trip['id']}/balances") == expected
+    assert api('GET', '/debts')['data'] == debts
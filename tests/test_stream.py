@@ -0,0 +1,74 @@
+import json
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+from balance_ledger import BalanceLedger
+from stream_routes import _Broadcaster, _snapshot
+
+
+def running_broadcaster(snapshot):
+    """A broadcaster holding snapshot whose polling thread counts as already running"""
+    broadcaster = _Broadcaster()
+    broadcaster._thread = SimpleNamespace(is_alive=lambda: True)
+    broadcaster.snapshot = snapshot
+    return broadcaster
+
+
+def next_event(subscriber):
+    message = subscriber.get_nowait()
+    fields = dict(line.split(': ', 1) for line in message.strip().splitlines())
+    return fields['event'], json.loads(fields['data'])
+
+
+def expense(api, amount):
+    api('POST', '/expenses', {'amount': amount, 'description': 'x', 'paid_by': 'A', 'participants': ['A', 'B']})
+
+
+def test_first_subscriber_replaces_a_stale_snapshot(api):
+    expense(api, 10)
+    stale = _snapshot(BalanceLedger.version())
+    expense(api, 20)
+    held = _snapshot(BalanceLedger.version())
+    broadcaster = running_broadcaster(stale)
+
+    subscriber = broadcaster.subscribe(None, held)
+    expense(api, 30)
+    broadcaster._check(BalanceLedger.version())
+
+    kind, delta = next_event(subscriber)
+    assert kind == 'delta'
+    assert delta['previous_version'] == held['version']
+    assert {entry['name']: entry['balance'] for entry in delta['balances']} == {'A': 30.0, 'B': -30.0}
+
+
+def test_later_subscriber_keeps_the_shared_snapshot(api):
+    expense(api, 10)
+    shared = _snapshot(BalanceLedger.version())
+    broadcaster = running_broadcaster(shared)
+    broadcaster.subscribe(None, shared)
+    expense(api, 20)
+
+    newer = _snapshot(BalanceLedger.version())
+    subscriber = broadcaster.subscribe(None, newer)
+    broadcaster._check(BalanceLedger.version())
+
+    # Based on the shared version, which the newer subscriber ignores as already shown
+    kind, delta = next_event(subscriber)
+    assert (kind, delta['previous_version'], delta['version']) == ('delta', shared['version'], newer['version'])
+
+
+def test_subscriber_behind_the_broadcaster_gets_its_snapshot_first(api):
+    expense(api, 10)
+    old = _snapshot(BalanceLedger.version())
+    expense(api, 20)
+    current = _snapshot(BalanceLedger.version())
+    broadcaster = running_broadcaster(current)
+
+    subscriber = broadcaster.subscribe(None, old)
+
+    kind, snapshot = next_event(subscriber)
+    assert (kind, snapshot['version']) == ('snapshot', current['version'])
+    with pytest.raises(queue.Empty):
+        subscriber.get_nowait()
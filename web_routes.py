@@ -1,59 +1,65 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
-from models import Person, Expense, ExpenseSplit
-from settlement_calculator import SettlementCalculator
+from models import Person, Expense
+from settlement_cache import SettlementCache
+from expense_listing import fetch_expense_page, parse_listing_args
+from expense_service import ExpenseService
+from dashboard_summary import DashboardSummary
 from decimal import Decimal
 import logging
 
 web = Blueprint('web', __name__)
 
+EMPTY_SUMMARY = {
+    'total_people': 0,
+    'total_expenses': 0,
+    'total_spent': 0,
+    'top_creditors': [],
+    'top_debtors': [],
+    'recent_expenses': [],
+}
+
 @web.route('/')
 def index():
     """Homepage with overview"""
     try:
-        # Get summary statistics
-        total_expenses = Expense.query.count()
-        total_people = Person.query.count()
-        
-        # Get recent expenses
-        recent_expenses = Expense.query.order_by(Expense.created_at.desc()).limit(5).all()
+        # Counts, top balances and recent activity, cached by ledger version
+        summary = DashboardSummary.get()
         
-        # Get current balances
-        balances = SettlementCalculator.calculate_balances()
-        
-        return render_template('index.html', 
-                             total_expenses=total_expenses,
-                             total_people=total_people,
-                             recent_expenses=recent_expenses,
-                             balances=balances)
+        return render_template('index.html', summary=summary)
     except Exception as e:
         logging.error(f"Error loading homepage: {str(e)}")
         flash(f"Error loading data: {str(e)}", 'error')
-        return render_template('index.html', 
-                             total_expenses=0,
-                             total_people=0,
-                             recent_expenses=[],
-                             balances={})
+        return render_template('index.html', summary=EMPTY_SUMMARY)
 
 @web.route('/expenses')
 def expenses():
     """Expenses management page"""
     try:
-        expenses = Expense.query.order_by(Expense.created_at.desc()).all()
+        try:
+            options = parse_listing_args(request.args)
+        except ValueError as e:
+            flash(str(e), 'error')
+            options = {}
+        
+        expenses, next_cursor = fetch_expense_page(**options)
         people = Person.query.order_by(Person.name).all()
         
-        return render_template('expenses.html', expenses=expenses, people=people)
+        return render_template('expenses.html', expenses=expenses, people=people,
+                             next_cursor=next_cursor, is_paged=bool(options.get('cursor')))
     except Exception as e:
         logging.error(f"Error loading expenses: {str(e)}")
         flash(f"Error loading expenses: {str(e)}", 'error')
-        return render_template('expenses.html', expenses=[], people=[])
+        return render_template('expenses.html', expenses=[], people=[],
+                             next_cursor=None, is_paged=False)
 
 @web.route('/settlements')
 def settlements():
     """Settlements page"""
     try:
-        balances = SettlementCalculator.calculate_balances()
-        settlements = SettlementCalculator.calculate_settlements()
+        # Both read the same cached balance aggregates, so balances are read at most once
+        balances = SettlementCache.balances()
+        settlements = SettlementCache.settlements()['settlements']
         
         return render_template('settlements.html', 
                              balances=balances,
@@ -88,31 +94,16 @@ def add_expense():
             flash('Invalid amount', 'error')
             return redirect(url_for('web.expenses'))
         
-        # Get or create the person who paid
-        person = Person.query.filter_by(name=paid_by).first()
-        if not person:
-            person = Person(name=paid_by)
-            db.session.add(person)
-            db.session.flush()
-        
-        # Create the expense
-        expense = Expense(
-            amount=amount_decimal,
-            description=description,
-            paid_by_id=person.id
-        )
-        db.session.add(expense)
-        db.session.flush()
-        
         # Handle participants (default to all people if none selected)
         if not participants:
             participants = [p.name for p in Person.query.all()]
         
-        if paid_by not in participants:
-            participants.append(paid_by)
-        
-        # Create equal splits
-        SettlementCalculator.create_equal_splits(expense.id, participants)
+        ExpenseService.create_expense({
+            'amount': amount_decimal,
+            'description': description,
+            'paid_by': paid_by,
+            'participants': participants
+        })
         
         db.session.commit()
         flash('Expense added successfully', 'success')
@@ -132,7 +123,7 @@ def delete_expense(expense_id):
         if not expense:
             flash('Expense not found', 'error')
         else:
-            db.session.delete(expense)
+            ExpenseService.delete_expense(expense)
             db.session.commit()
             flash('Expense deleted successfully', 'success')
     except Exception as e: